@@ -1,22 +1,44 @@
 import os
-import re
-from groq import Groq
-from analyze_texts.embeddings import EmbeddingsManager
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from analyze_texts.answer_cache import SemanticAnswerCache
+from analyze_texts.context_packer import ContextPacker
+from analyze_texts.summarizer import MapReduceSummarizer, SummaryCache
 
-def clean_text(text):
-    text = re.sub(r'[^\x20-\x7EáéíóúÁÉÍÓÚñÑüÜ.,;:()\-–\[\]{}¿?¡!\\n ]+', '', text)
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'\s*\n\s*', '. ', text)
-    return text.strip()
+NO_RESULTS_MESSAGE = "No encontré información relevante en los documentos cargados."
+
+
+class StreamStats(dict):
+    """
+    Métricas de una respuesta en streaming. query_stream la genera como último
+    elemento, así cada petición recibe las suyas aunque haya varias a la vez.
+    """
 
 class ResponseAgent:
-    def __init__(self, faiss_index_path="faiss.index"):
+    def __init__(self, faiss_index_path="faiss.index", emb_manager=None, client=None):
         print("Inicializando ResponseAgent con Groq...")
 
-        # cargar embeddings / metadata
-        self.emb_manager = EmbeddingsManager(index_path=faiss_index_path)
-        self.index = self.emb_manager.index
-        self.metadata = self.emb_manager.metadata
+        # reutilizar el EmbeddingsManager del controlador si se pasa;
+        # si no, cargar embeddings / metadata desde disco
+        if emb_manager is None:
+            from analyze_texts.embeddings import EmbeddingsManager
+            emb_manager = EmbeddingsManager(index_path=faiss_index_path)
+        self.emb_manager = emb_manager
+
+        self.model_name = "llama-3.1-8b-instant"
+        # caché semántica de respuestas (ANSWER_CACHE=0 la desactiva)
+        self.answer_cache = SemanticAnswerCache() if os.environ.get("ANSWER_CACHE", "1") == "1" else None
+        # contexto dentro de un presupuesto de tokens (MMR + fusión de solapes);
+        # se recuperan fetch_factor * top_k candidatos para que MMR tenga dónde elegir
+        self.context_packer = ContextPacker()
+        self.fetch_factor = max(1, int(os.environ.get("CONTEXT_FETCH_FACTOR", 2)))
+        self._summarizer = None
+
+        # se puede inyectar un cliente con la misma interfaz (p. ej. un stub local)
+        if client is not None:
+            self.client = client
+            return
 
         # groq api key
         api_key = os.environ.get("GROQ_API_KEY")
@@ -24,22 +46,67 @@ class ResponseAgent:
             raise ValueError(
                 "No se encontró GROQ_API_KEY en el entorno."
             )
-        self.client = Groq(api_key=api_key)
-        self.model_name = "llama-3.1-8b-instant"
+        from groq import DefaultHttpxClient, Groq
+        import httpx
+        # un pool de conexiones keep-alive compartido por las llamadas en paralelo
+        # (query_many y el map-reduce del análisis)
+        pool_size = int(os.environ.get("LLM_POOL_SIZE", 16))
+        self.client = Groq(api_key=api_key, http_client=DefaultHttpxClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size,
+                                keepalive_expiry=60)
+        ))
+
+    # el índice y la metadata se leen siempre del EmbeddingsManager compartido,
+    # así un reset_index / create_embeddings se ve sin reconstruir el agente
+    @property
+    def index(self):
+        return self.emb_manager.index
+
+    @property
+    def metadata(self):
+        return self.emb_manager.metadata
 
     # ============================================================
     # 🔍 MÉTODO PRINCIPAL PARA RESPONDER PREGUNTAS
     # ============================================================
-    def query(self, question, top_k=5):
-        results = self.emb_manager.query(question, top_k=top_k)
+    @staticmethod
+    def _cache_key(top_k, sources=None, pages=None):
+        # una respuesta filtrada por documentos solo vale para ese mismo filtro
+        if sources is None and pages is None:
+            return top_k
+        return (top_k, tuple(sorted(sources or ())), tuple(sorted(pages or ())))
+
+    def _cached_answer(self, q_emb, top_k, version):
+        if self.answer_cache is None:
+            return None
+        return self.answer_cache.get(q_emb, version, top_k=top_k)
+
+    def _cache_answer(self, q_emb, top_k, answer, llm_ms, version):
+        # version: la del índice leída ANTES de recuperar; si hubo un swap o un
+        # reindexado durante la llamada al LLM, la respuesta no pasa por fresca
+        if self.answer_cache is not None and answer:
+            self.answer_cache.put(q_emb, answer, version, llm_ms=llm_ms, top_k=top_k)
+
+    def _build_prompt(self, question, top_k, q_emb=None, sources=None, pages=None):
+        """Devuelve (context, prompt, stats) o (None, None, None) si no hay resultados."""
+        if q_emb is None:
+            q_emb = self.emb_manager.encode_query(question)
+        results = self.emb_manager.search_many(
+            q_emb, top_k=top_k * self.fetch_factor, sources=sources, pages=pages
+        )[0]
+        return self._prompt_from_results(question, results, top_k)
 
+    def _prompt_from_results(self, question, results, top_k):
         if not results:
-            return "No encontré información relevante en los documentos cargados."
+            return None, None, None
 
-        context_parts = [clean_text(r["text"]) for r in results]
-        context = " ".join(context_parts)[:8000]
+        vectors = self.emb_manager.vectors(results) if len(results) > 1 else None
+        # los chunks se guardan ya normalizados (ver normalization.py)
+        context, stats = self.context_packer.pack(results, vectors, max_chunks=top_k)
 
         print("\n📝 Contexto recuperado:")
+        print(f"  {stats['blocks']} bloques, {stats['context_tokens']} tokens "
+              f"({stats['merged']} fusionados, {stats['candidates'] - stats['selected']} descartados por MMR)")
         print(context[:400], "...")
 
         prompt = f"""
@@ -53,58 +120,191 @@ Pregunta del usuario:
 
 Da la respuesta más clara posible usando SOLO el contexto.
 """
+        return context, prompt, stats
+
+    def query(self, question, top_k=5, sources=None, pages=None):
+        """
+        sources: lista de documentos a los que limitar la búsqueda (None = todos);
+        pages: lista opcional de páginas dentro de ellos (desde 0, como en el
+        índice; /query las recibe desde 1).
+        """
+        version = self.emb_manager.version
+        q_emb = self.emb_manager.encode_query(question)
+        cache_key = self._cache_key(top_k, sources, pages)
+        cached = self._cached_answer(q_emb, cache_key, version)
+        if cached is not None:
+            return cached
+
+        context, prompt, _ = self._build_prompt(question, top_k, q_emb=q_emb, sources=sources, pages=pages)
+        return self._complete(context, prompt, q_emb, cache_key, version)
+
+    def _complete(self, context, prompt, q_emb, cache_key, version):
+        if prompt is None:
+            return NO_RESULTS_MESSAGE
 
         try:
+            start = time.perf_counter()
             completion = self.client.chat.completions.create(
                 model=self.model_name,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.3,
                 max_completion_tokens=1200
             )
+            answer = completion.choices[0].message.content
+            self._cache_answer(q_emb, cache_key, answer, (time.perf_counter() - start) * 1000, version)
 
-            return completion.choices[0].message.content
+            return answer
 
         except Exception as e:
             print("❌ Error en la respuesta:", e)
             return context[:800]
 
-    # ============================================================
-    # 🧠 MÉTODO PARA ANALIZAR DOCUMENTOS
-    # ============================================================
-    def analyze_documents(self, max_chunks=50):
-        if self.index.ntotal == 0:
-            return "No hay documentos para analizar."
+    def query_many(self, questions, top_k=5, retrieval_only=False, max_concurrency=None,
+                   sources=None, pages=None):
+        """
+        Responde muchas preguntas en una pasada: un solo encode por lotes, una
+        búsqueda matricial en el índice y llamadas al LLM en paralelo (acotadas).
+        Devuelve una lista en el mismo orden que `questions`. Con
+        retrieval_only=True no se llama al LLM y se devuelven los chunks.
+        """
+        if not questions:
+            return []
+        if max_concurrency is None:
+            max_concurrency = int(os.environ.get("LLM_MAX_CONCURRENCY", 4))
 
-        total = len(self.metadata)
-        max_chunks = min(max_chunks, total)
+        version = self.emb_manager.version
+        q_embs = self.emb_manager.encode_queries(questions)
+        fetch_k = top_k if retrieval_only else top_k * self.fetch_factor
+        retrieved = self.emb_manager.search_many(q_embs, top_k=fetch_k, sources=sources, pages=pages)
 
-        combined = " ".join([m["text"] for m in self.metadata[:max_chunks]])
-        combined = clean_text(combined)
+        if retrieval_only:
+            return [
+                {"question": q, "chunks": chunks}
+                for q, chunks in zip(questions, retrieved)
+            ]
 
-        print(f"🔍 Analizando {max_chunks} chunks...")
+        cache_key = self._cache_key(top_k, sources, pages)
 
-        prompt = f"""
-Analiza el siguiente contenido extraído de varios documentos.
+        def answer(i):
+            q_emb = q_embs[i:i + 1]
+            cached = self._cached_answer(q_emb, cache_key, version)
+            if cached is not None:
+                return cached
+            context, prompt, _ = self._prompt_from_results(questions[i], retrieved[i], top_k)
+            return self._complete(context, prompt, q_emb, cache_key, version)
 
-Contenido:
-{combined}
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+            answers = list(pool.map(answer, range(len(questions))))
 
-Genera:
-1. Resumen general
-2. Temas principales
-3. Tipo de contenido
-4. Puntos relevantes
-"""
+        return [
+            {"question": q, "answer": a, "sources": sorted({c["source"] for c in chunks[:top_k]})}
+            for q, a, chunks in zip(questions, answers, retrieved)
+        ]
+
+    def query_stream(self, question, top_k=5, sources=None, pages=None):
+        """
+        Igual que query() pero genera la respuesta token a token (str) y, al
+        final, un StreamStats con el tiempo hasta el primer token y la latencia
+        total medidos por separado.
+        """
+        start = time.perf_counter()
+        version = self.emb_manager.version
+        q_emb = self.emb_manager.encode_query(question)
+        cache_key = self._cache_key(top_k, sources, pages)
+        cached = self._cached_answer(q_emb, cache_key, version)
+        if cached is not None:
+            elapsed = round((time.perf_counter() - start) * 1000, 1)
+            yield cached
+            yield StreamStats(retrieval_ms=elapsed, ttft_ms=elapsed, total_ms=elapsed, chunks=1, cached=True)
+            return
+
+        context, prompt, pack_stats = self._build_prompt(question, top_k, q_emb=q_emb, sources=sources,
+                                                         pages=pages)
+        retrieval_ms = (time.perf_counter() - start) * 1000
+        if prompt is None:
+            yield NO_RESULTS_MESSAGE
+            yield StreamStats(retrieval_ms=round(retrieval_ms, 1), ttft_ms=None,
+                              total_ms=round(retrieval_ms, 1), chunks=0, cached=False)
+            return
+        context_tokens = pack_stats["context_tokens"]
 
+        first_token_ms = None
+        tokens = 0
+        parts = []
+        completed = False
+        error = None
         try:
-            completion = self.client.chat.completions.create(
+            stream = self.client.chat.completions.create(
                 model=self.model_name,
                 messages=[{"role": "user", "content": prompt}],
-                temperature=0.4,
-                max_completion_tokens=1500
+                temperature=0.3,
+                max_completion_tokens=1200,
+                stream=True
             )
-            return completion.choices[0].message.content
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - start) * 1000
+                tokens += 1
+                parts.append(delta)
+                yield delta
+            completed = True
+
+        except Exception as e:
+            print("❌ Error en la respuesta:", e)
+            error = str(e)
+            if first_token_ms is None:
+                yield context[:800]
+
+        total_ms = (time.perf_counter() - start) * 1000
+        stats = StreamStats(
+            retrieval_ms=round(retrieval_ms, 1),
+            ttft_ms=round(first_token_ms, 1) if first_token_ms is not None else None,
+            total_ms=round(total_ms, 1),
+            chunks=tokens,
+            cached=False,
+            context_tokens=context_tokens,
+        )
+        if error is not None:
+            stats["error"] = error
+        # solo se cachean respuestas completas
+        if completed:
+            self._cache_answer(q_emb, cache_key, "".join(parts), total_ms - retrieval_ms, version)
+        print(f"⏱️ TTFT={stats['ttft_ms']}ms total={stats['total_ms']}ms")
+        yield stats
+
+    # ============================================================
+    # 🧠 MÉTODO PARA ANALIZAR DOCUMENTOS
+    # ============================================================
+    @property
+    def summarizer(self):
+        if self._summarizer is None:
+            cache = SummaryCache() if os.environ.get("ANALYSIS_CACHE", "1") == "1" else None
+            self._summarizer = MapReduceSummarizer(self.client, self.model_name, cache=cache)
+        return self._summarizer
+
+    def analyze_documents(self, max_chunks=None):
+        """
+        Análisis de todo el corpus con map-reduce (ver summarizer.py):
+        resúmenes por grupo de chunks en paralelo y luego un análisis final.
+        max_chunks limita los chunks analizados (None = todos).
+        """
+        if self.emb_manager.vector_count() == 0:
+            return "No hay documentos para analizar."
+
+        total = len(self.metadata)
+        max_chunks = min(max_chunks or total, total)
+        print(f"🔍 Analizando {max_chunks} chunks...")
+
+        try:
+            chunks = islice(self.metadata.values(), max_chunks)
+            return self.summarizer.summarize(chunks) or "No hay documentos para analizar."
 
         except Exception as e:
             print(f"❌ Error analizando documentos: {e}")
-            return f"Error analizando documentos: {e}\n\nContexto parcial:\n{combined[:800]}"
+            partial = " ".join(m["text"] for m in islice(self.metadata.values(), 5))
+            return f"Error analizando documentos: {e}\n\nContexto parcial:\n{partial[:800]}"
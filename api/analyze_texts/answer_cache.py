@@ -0,0 +1,94 @@
+# analyze_texts/answer_cache.py
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Caché de respuestas por similitud coseno del embedding de la pregunta.
+    Preguntas iguales o casi iguales (>= threshold) sobre el mismo índice
+    reutilizan la respuesta sin llamar al LLM. Expulsión por TTL y LRU; se
+    vacía sola cuando cambia la versión del índice.
+    """
+
+    def __init__(self, threshold=None, ttl_seconds=None, max_entries=None):
+        if threshold is None:
+            threshold = float(os.environ.get("ANSWER_CACHE_THRESHOLD", 0.95))
+        if ttl_seconds is None:
+            ttl_seconds = float(os.environ.get("ANSWER_CACHE_TTL", 3600))
+        if max_entries is None:
+            max_entries = int(os.environ.get("ANSWER_CACHE_SIZE", 1000))
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self._entries = OrderedDict()  # key -> (vector, answer, created_at, llm_ms, top_k)
+        self._next_key = 0
+        self._index_version = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.saved_llm_ms = 0.0
+
+    def _sync_version(self, index_version):
+        if index_version != self._index_version:
+            if self._entries:
+                print("🧽 Índice modificado: caché de respuestas invalidada")
+            self._entries.clear()
+            self._index_version = index_version
+
+    def _expire(self, now):
+        expired = [k for k, e in self._entries.items() if now - e[2] > self.ttl_seconds]
+        for k in expired:
+            del self._entries[k]
+
+    def get(self, q_emb, index_version, top_k=None):
+        """Devuelve la respuesta cacheada más similar o None."""
+        q = np.asarray(q_emb, dtype="float32").reshape(-1)
+        with self._lock:
+            self._sync_version(index_version)
+            self._expire(time.time())
+
+            candidates = [(k, e) for k, e in self._entries.items() if e[4] == top_k]
+            if candidates:
+                vectors = np.vstack([e[0] for _, e in candidates])
+                scores = vectors @ q
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self.saved_llm_ms += entry[3]
+                    print(f"⚡ Respuesta desde caché (similitud={scores[best]:.3f})")
+                    return entry[1]
+
+            self.misses += 1
+            return None
+
+    def put(self, q_emb, answer, index_version, llm_ms=0.0, top_k=None):
+        q = np.asarray(q_emb, dtype="float32").reshape(-1)
+        with self._lock:
+            self._sync_version(index_version)
+            self._entries[self._next_key] = (q, answer, time.time(), llm_ms, top_k)
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "saved_llm_ms": round(self.saved_llm_ms, 1),
+            "threshold": self.threshold,
+        }
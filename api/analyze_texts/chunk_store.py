@@ -0,0 +1,478 @@
+# analyze_texts/chunk_store.py
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import numpy as np
+
+# Un registro de tamaño fijo por chunk; el texto vive en text.bin
+RECORD_DTYPE = np.dtype([
+    ("chunk_id", "<i8"),
+    ("text_offset", "<i8"),
+    ("text_length", "<i4"),
+    ("source_id", "<i4"),
+    ("page", "<i4"),
+    ("char_offset", "<i8"),
+])
+
+
+def id_ranges(ids):
+    """Agrupa ids crecientes en rangos contiguos [inicio, fin)."""
+    ids = np.asarray(ids, dtype="int64")
+    if len(ids) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(ids) != 1) + 1
+    starts = np.concatenate([[0], breaks])
+    ends = np.concatenate([breaks, [len(ids)]])
+    return [(int(ids[s]), int(ids[e - 1]) + 1) for s, e in zip(starts, ends)]
+
+
+def document_id(source):
+    """Id estable de un documento a partir del nombre del archivo."""
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+
+
+def _copy_prefix(src, dst, length):
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        while length > 0:
+            block = fin.read(min(length, 1 << 20))
+            if not block:
+                break
+            fout.write(block)
+            length -= len(block)
+
+
+def link_store(src, dst):
+    """
+    Copia barata de un chunk store sellado (ver ChunkStore.seal): los archivos
+    se enlazan (hard link) en dst en lugar de copiarse, así el coste no depende
+    del tamaño del corpus. Solo se copia, hasta su longitud sellada, un archivo
+    que haya crecido después del sellado (restos de una escritura descartada).
+    Sin LENGTHS (stores anteriores) se copia todo.
+    """
+    try:
+        with open(os.path.join(src, ChunkStore.LENGTHS), "r", encoding="utf-8") as f:
+            lengths = json.load(f)
+    except (FileNotFoundError, ValueError):
+        shutil.copytree(src, dst)
+        return
+    os.makedirs(dst, exist_ok=True)
+    for name in os.listdir(src):
+        src_path, dst_path = os.path.join(src, name), os.path.join(dst, name)
+        if not os.path.isfile(src_path):
+            continue
+        length = lengths.get(name)
+        if length is not None and os.path.getsize(src_path) > length:
+            _copy_prefix(src_path, dst_path, length)
+            continue
+        try:
+            os.link(src_path, dst_path)
+        except OSError:
+            shutil.copy2(src_path, dst_path)
+
+
+class ChunkStore:
+    """
+    Almacén de chunks append-only y memory-mapped:
+
+    - text.bin:    todos los textos UTF-8 concatenados
+    - records.bin: un registro RECORD_DTYPE por chunk (ids crecientes)
+    - sources.txt: nombres de archivo internados, uno por línea (source_id = línea)
+    - deleted.bin: ids borrados (int64), también append-only
+    - duplicates.jsonl: procedencia de los casi duplicados fusionados en cada chunk
+
+    Se usa como un dict chunk_id -> {'text', 'source', 'doc_id', 'page', 'char_offset'}
+    pero solo lee del disco el chunk pedido.
+
+    read_only=True no crea ni modifica nada (p. ej. en el sistema de archivos
+    de solo lectura de Vercel); los archivos que falten cuentan como vacíos.
+
+    Los snapshots comparten los archivos con hard links (link_store): seal()
+    guarda en LENGTHS la longitud de cada archivo al publicar y al abrir solo
+    se lee hasta ella, así los appends de un snapshot posterior sobre el mismo
+    inode no se ven desde los anteriores. La primera escritura quita LENGTHS
+    del directorio propio (se vuelve a sellar al publicar) y clear() crea
+    archivos nuevos en lugar de truncar los compartidos.
+    """
+
+    LENGTHS = "lengths.json"
+
+    def __init__(self, path="chunkstore", read_only=False):
+        self.path = path
+        self.read_only = read_only
+        self._text_path = os.path.join(path, "text.bin")
+        self._records_path = os.path.join(path, "records.bin")
+        self._sources_path = os.path.join(path, "sources.txt")
+        self._deleted_path = os.path.join(path, "deleted.bin")
+        self._duplicates_path = os.path.join(path, "duplicates.jsonl")
+        self._lengths_path = os.path.join(path, self.LENGTHS)
+        if not read_only:
+            self._recover_compaction()
+            os.makedirs(path, exist_ok=True)
+            for p in (self._text_path, self._records_path, self._sources_path, self._deleted_path,
+                      self._duplicates_path):
+                if not os.path.exists(p):
+                    open(p, "wb").close()
+        self._open()
+
+    # ------------------------------------------------------------
+    # Apertura (memory-map) de los archivos
+    # ------------------------------------------------------------
+    def _size(self, path):
+        """Longitud visible de path: la sellada si el archivo es compartido."""
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        limit = self._lengths.get(os.path.basename(path))
+        return size if limit is None else min(size, limit)
+
+    def _read(self, path):
+        size = self._size(path)
+        if not size:
+            return b""
+        with open(path, "rb") as f:
+            return f.read(size)
+
+    def _open(self):
+        self._lengths = {}
+        if os.path.exists(self._lengths_path):
+            with open(self._lengths_path, "r", encoding="utf-8") as f:
+                self._lengths = json.load(f)
+
+        self._records = None
+        self._text = None
+        n_records = self._size(self._records_path) // RECORD_DTYPE.itemsize
+        if n_records:
+            self._records = np.memmap(self._records_path, dtype=RECORD_DTYPE, mode="r", shape=(n_records,))
+        if self._size(self._text_path) > 0:
+            with open(self._text_path, "rb") as f:
+                self._text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.sources = self._read(self._sources_path).decode("utf-8").split("\n")[:-1]
+        self._source_ids = {s: i for i, s in enumerate(self.sources)}
+        self._ranges = None
+
+        self._deleted = set(np.frombuffer(self._read(self._deleted_path), dtype="<i8").tolist())
+
+        self._duplicates = {}
+        for line in self._read(self._duplicates_path).decode("utf-8").splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                self._duplicates.setdefault(entry["id"], []).extend(entry["duplicates"])
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError(f"ChunkStore de solo lectura: {self.path}")
+        if self._lengths:
+            # link_store deja cada archivo con su longitud sellada: desde aquí
+            # se escribe al final y lo visible es el archivo entero
+            os.remove(self._lengths_path)
+            self._lengths = {}
+
+    def seal(self):
+        """Guarda la longitud actual de cada archivo del directorio (al publicar el snapshot)."""
+        self._check_writable()
+        lengths = {
+            name: os.path.getsize(os.path.join(self.path, name))
+            for name in os.listdir(self.path)
+            if name != self.LENGTHS and os.path.isfile(os.path.join(self.path, name))
+        }
+        tmp = f"{self._lengths_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(lengths, f)
+        os.replace(tmp, self._lengths_path)
+        self._lengths = lengths
+
+    def close(self):
+        if self._text is not None:
+            self._text.close()
+        self._records = None
+        self._text = None
+
+    @property
+    def _n_records(self):
+        return 0 if self._records is None else len(self._records)
+
+    @property
+    def next_id(self):
+        if not self._n_records:
+            return 0
+        return int(self._records["chunk_id"][-1]) + 1
+
+    # ------------------------------------------------------------
+    # Escritura append-only
+    # ------------------------------------------------------------
+    def _intern(self, source, new_sources):
+        sid = self._source_ids.get(source)
+        if sid is None:
+            sid = len(self.sources)
+            self.sources.append(source)
+            self._source_ids[source] = sid
+            new_sources.append(source)
+        return sid
+
+    def append(self, chunk_ids, chunks):
+        """Agrega chunks con sus ids (crecientes y mayores que los existentes)."""
+        self._check_writable()
+        if not chunks:
+            return
+        if chunk_ids[0] < self.next_id:
+            raise ValueError("Los ids del ChunkStore deben ser crecientes")
+
+        records = np.zeros(len(chunks), dtype=RECORD_DTYPE)
+        new_sources = []
+        blobs = []
+        offset = self._size(self._text_path)
+        for i, (chunk_id, chunk) in enumerate(zip(chunk_ids, chunks)):
+            data = chunk["text"].encode("utf-8")
+            blobs.append(data)
+            records[i] = (
+                chunk_id,
+                offset,
+                len(data),
+                self._intern(chunk.get("source", ""), new_sources),
+                chunk.get("page", -1),
+                chunk.get("char_offset", -1),
+            )
+            offset += len(data)
+
+        # texto primero: un registro nunca apunta a texto que no existe
+        with open(self._text_path, "ab") as f:
+            f.write(b"".join(blobs))
+        if new_sources:
+            with open(self._sources_path, "a", encoding="utf-8") as f:
+                f.write("".join(s.replace("\n", " ") + "\n" for s in new_sources))
+        with open(self._records_path, "ab") as f:
+            f.write(records.tobytes())
+        dups = [
+            (int(chunk_id), chunk["duplicates"])
+            for chunk_id, chunk in zip(chunk_ids, chunks) if chunk.get("duplicates")
+        ]
+        if dups:
+            self._write_duplicates(dups)
+
+        self.close()
+        self._open()
+
+    def _write_duplicates(self, entries):
+        self._check_writable()
+        with open(self._duplicates_path, "a", encoding="utf-8") as f:
+            for chunk_id, locations in entries:
+                f.write(json.dumps({"id": chunk_id, "duplicates": locations}, ensure_ascii=False) + "\n")
+
+    def add_duplicates(self, chunk_id, locations):
+        """Registra la procedencia de casi duplicados fusionados en chunk_id."""
+        if not locations:
+            return
+        self._write_duplicates([(int(chunk_id), locations)])
+        self._duplicates.setdefault(int(chunk_id), []).extend(locations)
+
+    def delete(self, chunk_ids):
+        self._check_writable()
+        ids = [int(i) for i in chunk_ids if int(i) not in self._deleted]
+        if not ids:
+            return
+        with open(self._deleted_path, "ab") as f:
+            f.write(np.asarray(ids, dtype="<i8").tobytes())
+        self._deleted.update(ids)
+
+    def pop(self, chunk_id, default=None):
+        chunk = self.get(chunk_id)
+        if chunk is None:
+            return default
+        self.delete([chunk_id])
+        return chunk
+
+    def clear(self):
+        self._check_writable()
+        self.close()
+        for p in (self._text_path, self._records_path, self._sources_path, self._deleted_path,
+                  self._duplicates_path):
+            # archivo nuevo: truncar uno enlazado vaciaría también los otros snapshots
+            os.remove(p)
+            open(p, "wb").close()
+        self._open()
+
+    def _recover_compaction(self):
+        """
+        Termina o descarta una compactación interrumpida. El directorio viejo
+        solo se aparta cuando la copia .compact ya está completa, así que si
+        falta `path` la copia es válida; si no, es un resto a medio escribir.
+        """
+        tmp_path, old_path = self.path + ".compact", self.path + ".old"
+        if os.path.isdir(tmp_path):
+            if os.path.isdir(self.path):
+                shutil.rmtree(tmp_path)
+            else:
+                os.replace(tmp_path, self.path)
+        if os.path.isdir(old_path) and os.path.isdir(self.path):
+            shutil.rmtree(old_path)
+
+    def compact(self):
+        """
+        Reescribe el almacén sin los chunks borrados (mismos ids). La copia se
+        escribe en un directorio aparte y se cambia por el actual con
+        os.replace: un fallo a mitad deja intacto el almacén original.
+        """
+        if not self._deleted:
+            return
+        self._check_writable()
+        tmp_path, old_path = self.path + ".compact", self.path + ".old"
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path)
+        compacted = ChunkStore(tmp_path)
+        ids = list(self)
+        for i in range(0, len(ids), 10_000):
+            batch = ids[i:i + 10_000]
+            compacted.append(batch, [self[cid] for cid in batch])
+        compacted.close()
+        # otros archivos del directorio (vectors.f32) pasan tal cual a la copia
+        for name in os.listdir(self.path):
+            src, dst = os.path.join(self.path, name), os.path.join(tmp_path, name)
+            if os.path.isfile(src) and not os.path.exists(dst):
+                try:
+                    os.link(src, dst)
+                except OSError:
+                    shutil.copy2(src, dst)
+        for name in os.listdir(tmp_path):
+            with open(os.path.join(tmp_path, name), "rb") as f:
+                os.fsync(f.fileno())
+
+        self.close()
+        os.replace(self.path, old_path)
+        os.replace(tmp_path, self.path)
+        shutil.rmtree(old_path)
+        self._open()
+
+    # ------------------------------------------------------------
+    # Lectura por id (sin cargar el resto)
+    # ------------------------------------------------------------
+    def _row(self, chunk_id):
+        if not self._n_records:
+            return None
+        ids = self._records["chunk_id"]
+        pos = int(np.searchsorted(ids, chunk_id))
+        if pos < len(ids) and ids[pos] == chunk_id:
+            return self._records[pos]
+        return None
+
+    def get(self, chunk_id, default=None):
+        chunk_id = int(chunk_id)
+        if chunk_id in self._deleted:
+            return default
+        row = self._row(chunk_id)
+        if row is None:
+            return default
+        start = int(row["text_offset"])
+        text = self._text[start:start + int(row["text_length"])].decode("utf-8")
+        source = self.sources[int(row["source_id"])]
+        chunk = {
+            "text": text,
+            "source": source,
+            "doc_id": document_id(source),
+            "page": int(row["page"]),
+            "char_offset": int(row["char_offset"]),
+        }
+        if chunk_id in self._duplicates:
+            chunk["duplicates"] = list(self._duplicates[chunk_id])
+        return chunk
+
+    def __getitem__(self, chunk_id):
+        chunk = self.get(chunk_id)
+        if chunk is None:
+            raise KeyError(chunk_id)
+        return chunk
+
+    def __contains__(self, chunk_id):
+        chunk_id = int(chunk_id)
+        return chunk_id not in self._deleted and self._row(chunk_id) is not None
+
+    @property
+    def deleted_count(self):
+        return len(self._deleted)
+
+    def __len__(self):
+        return self._n_records - len(self._deleted)
+
+    def __iter__(self):
+        if not self._n_records:
+            return iter(())
+        ids = self._records["chunk_id"].tolist()
+        return iter([i for i in ids if i not in self._deleted])
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return (self[cid] for cid in self)
+
+    # ------------------------------------------------------------
+    # Vista por documento (derivada de los registros)
+    # ------------------------------------------------------------
+    def document_chunk_ids(self, source):
+        sid = self._source_ids.get(source)
+        if sid is None or not self._n_records:
+            return []
+        rows = self._records[self._records["source_id"] == sid]
+        return [int(i) for i in rows["chunk_id"] if int(i) not in self._deleted]
+
+    def source_ranges(self, source):
+        """
+        Rangos [inicio, fin) de chunk_ids de `source`. La ingesta escribe cada
+        documento de una vez, así que suele ser un único rango (uno más por
+        cada reemplazo). Puede incluir ids borrados, que ya no están en el índice.
+        """
+        if self._ranges is None:
+            ranges = {}
+            if self._n_records:
+                sids = self._records["source_id"]
+                ids = self._records["chunk_id"]
+                breaks = np.flatnonzero(np.diff(sids) != 0) + 1
+                for rows_ids, sid in zip(np.split(ids, breaks), sids[np.concatenate([[0], breaks])]):
+                    ranges.setdefault(int(sid), []).extend(id_ranges(rows_ids))
+            self._ranges = ranges
+        sid = self._source_ids.get(source)
+        return [] if sid is None else self._ranges.get(sid, [])
+
+    def select(self, sources=None, pages=None):
+        """
+        Rangos de ids de los chunks de `sources` (todos si es None) y, si se
+        indica, solo de esas páginas. Lista vacía si nada coincide.
+        """
+        if pages is None:
+            if sources is None:
+                return id_ranges(list(self))
+            ranges = [r for source in sources for r in self.source_ranges(source)]
+            return sorted(ranges)
+        if not self._n_records:
+            return []
+        mask = np.isin(self._records["page"], np.asarray(list(pages), dtype="int32"))
+        if sources is not None:
+            sids = [self._source_ids[s] for s in sources if s in self._source_ids]
+            mask &= np.isin(self._records["source_id"], np.asarray(sids, dtype="int32"))
+        return id_ranges(self._records["chunk_id"][mask])
+
+    def live_ids(self, ranges):
+        """Ids vivos (crecientes) dentro de los rangos de select()."""
+        if not ranges:
+            return np.zeros(0, dtype="int64")
+        ids = np.concatenate([np.arange(lo, hi, dtype="int64") for lo, hi in ranges])
+        if self._deleted:
+            ids = ids[~np.isin(ids, np.fromiter(self._deleted, dtype="int64"))]
+        return ids
+
+    def documents(self):
+        """{source: número de chunks vivos}"""
+        if not self._n_records:
+            return {}
+        counts = {}
+        for cid, sid in zip(self._records["chunk_id"].tolist(), self._records["source_id"].tolist()):
+            if cid not in self._deleted:
+                source = self.sources[sid]
+                counts[source] = counts.get(source, 0) + 1
+        return counts
+
+    def size_bytes(self):
+        return sum(self._size(p) for p in (
+            self._text_path, self._records_path, self._sources_path, self._deleted_path,
+            self._duplicates_path
+        ))
@@ -1,3 +1,6 @@
+from collections import deque
+
+
 class Chunker:
     def __init__(self, chunk_size=2000, overlap=400):
         self.chunk_size = chunk_size
@@ -12,3 +15,44 @@ class Chunker:
             chunks.append(text[start:end])
             start += self.chunk_size - self.overlap
         return chunks
+
+    def iter_chunks(self, segments):
+        """
+        Versión en streaming de chunk_text sobre segmentos (page, texto) que se
+        unen con un espacio. Genera (chunk, char_offset, page) con los mismos
+        cortes que chunk_text(" ".join(textos)); un chunk que cruza páginas se
+        asigna a la página donde empieza. Solo mantiene en memoria un chunk_size
+        de texto más el segmento actual.
+        """
+        step = self.chunk_size - self.overlap
+        buf = ""
+        pos = 0                # inicio del chunk actual dentro de buf
+        buf_start = 0          # offset global de buf[pos]
+        boundaries = deque()   # (offset global, page) de cada segmento en buf
+        total = 0
+
+        def page_at(offset):
+            while len(boundaries) > 1 and boundaries[1][0] <= offset:
+                boundaries.popleft()
+            return boundaries[0][1] if boundaries else -1
+
+        for page, text in segments:
+            if not text:
+                continue
+            if total:
+                text = " " + text
+            boundaries.append((total + (1 if total else 0), page))
+            # una copia por segmento (resto pendiente + segmento); dentro del
+            # segmento se avanza un índice en vez de recortar buf en cada chunk
+            buf = buf[pos:] + text
+            pos = 0
+            total += len(text)
+            while len(buf) - pos >= self.chunk_size:
+                yield buf[pos:pos + self.chunk_size], buf_start, page_at(buf_start)
+                pos += step
+                buf_start += step
+
+        while pos < len(buf):
+            yield buf[pos:pos + self.chunk_size], buf_start, page_at(buf_start)
+            pos += step
+            buf_start += step
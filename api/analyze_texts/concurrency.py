@@ -0,0 +1,112 @@
+# analyze_texts/concurrency.py
+import os
+import threading
+from contextlib import contextmanager
+
+
+class RWLock:
+    """
+    Lock de lectores-escritor: muchas búsquedas a la vez, las escrituras
+    (add, remove, save, reset) en exclusiva. Da preferencia al escritor para
+    que un flujo continuo de consultas no bloquee la ingesta. El escritor
+    puede volver a tomar el lock (y leer) desde el mismo hilo.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writers_waiting = 0
+        self._writer = None
+        self._writer_depth = 0
+
+    @contextmanager
+    def read(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            # el escritor ya tiene acceso exclusivo
+            yield
+            return
+        with self._cond:
+            while self._writer is not None or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+            else:
+                self._writers_waiting += 1
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+                self._writers_waiting -= 1
+                self._writer = me
+                self._writer_depth = 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer_depth -= 1
+                if self._writer_depth == 0:
+                    self._writer = None
+                    self._cond.notify_all()
+
+
+# ------------------------------------------------------------
+# Presupuesto de hilos de FAISS / torch por worker
+# ------------------------------------------------------------
+def thread_budget():
+    """
+    Hilos de cómputo por proceso. SERVING_THREADS manda; si no, se reparten
+    los núcleos entre los workers de gunicorn (WEB_CONCURRENCY) para no
+    sobresuscribir la CPU.
+    """
+    configured = os.environ.get("SERVING_THREADS")
+    if configured:
+        return max(1, int(configured))
+    workers = max(1, int(os.environ.get("WEB_CONCURRENCY", 1)))
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+_applied = {}
+
+
+def apply_thread_budget(n_threads=None):
+    """
+    Fija los hilos de OpenMP (FAISS) y de torch. Se puede llamar varias
+    veces: solo configura las librerías ya importadas que falten.
+    """
+    n = n_threads or thread_budget()
+    os.environ.setdefault("OMP_NUM_THREADS", str(n))
+
+    import sys
+    if "faiss" in sys.modules and _applied.get("faiss") != n:
+        sys.modules["faiss"].omp_set_num_threads(n)
+        _applied["faiss"] = n
+    if "torch" in sys.modules and _applied.get("torch") != n:
+        sys.modules["torch"].set_num_threads(n)
+        _applied["torch"] = n
+    return n
+
+
+def ocr_thread_budget(processes=1):
+    """
+    Llamadas simultáneas a Tesseract por proceso de extracción: el total
+    OCR_THREADS (por defecto los núcleos) repartido entre los procesos, para
+    que cpu_count workers no lancen cpu_count * hilos subprocesos a la vez.
+    """
+    total = int(os.environ.get("OCR_THREADS", 0)) or (os.cpu_count() or 1)
+    return max(1, total // max(1, processes))
+
+
+def thread_stats():
+    return {"budget": thread_budget(), "ocr_budget": ocr_thread_budget(), "applied": dict(_applied)}
@@ -0,0 +1,191 @@
+# analyze_texts/context_packer.py
+import os
+import re
+import numpy as np
+
+_SENTENCE_END = re.compile(r"[.!?¿¡](\s|$)")
+
+
+class TokenCounter:
+    """
+    Cuenta tokens con tiktoken si está instalado (cl100k_base es una buena
+    aproximación para Llama 3); si no, estima ~4 caracteres por token.
+    """
+
+    def __init__(self, encoding="cl100k_base"):
+        self.encoding_name = encoding
+        self._encoding = None
+        self.exact = False
+        try:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(encoding)
+            self.exact = True
+        except Exception:
+            pass
+
+    def count(self, text):
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return max(1, (len(text) + 3) // 4)
+
+
+class ContextPacker:
+    """
+    Arma el contexto del prompt dentro de un presupuesto de tokens:
+    1. MMR sobre los candidatos: relevancia sin hits redundantes.
+    2. Fusión de chunks contiguos o solapados del mismo documento
+       (el Chunker solapa 150 caracteres: no se paga dos veces ese texto).
+    3. Relleno en orden de relevancia; un chunk que no cabe entero se salta,
+       y solo el primero se recorta, en un final de frase.
+    """
+
+    def __init__(self, token_budget=None, mmr_lambda=None, counter=None):
+        if token_budget is None:
+            token_budget = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 1500))
+        if mmr_lambda is None:
+            mmr_lambda = float(os.environ.get("CONTEXT_MMR_LAMBDA", 0.7))
+        self.token_budget = token_budget
+        self.mmr_lambda = mmr_lambda
+        self.counter = counter or TokenCounter()
+
+    # ------------------------------------------------------------
+    # MMR
+    # ------------------------------------------------------------
+    def mmr(self, hits, vectors, k):
+        """
+        Reordena `hits` (con 'score' = similitud con la pregunta) por Maximal
+        Marginal Relevance y devuelve como mucho k. vectors: (n, dim) normalizados.
+        """
+        if len(hits) <= 1 or vectors is None:
+            return hits[:k]
+        relevance = np.array([h["score"] for h in hits], dtype="float32")
+        sims = vectors @ vectors.T
+
+        selected = [int(np.argmax(relevance))]
+        remaining = [i for i in range(len(hits)) if i != selected[0]]
+        while remaining and len(selected) < k:
+            redundancy = sims[np.ix_(remaining, selected)].max(axis=1)
+            scores = self.mmr_lambda * relevance[remaining] - (1 - self.mmr_lambda) * redundancy
+            best = remaining[int(np.argmax(scores))]
+            selected.append(best)
+            remaining.remove(best)
+        return [hits[i] for i in selected]
+
+    # ------------------------------------------------------------
+    # Fusión de chunks contiguos / solapados
+    # ------------------------------------------------------------
+    @staticmethod
+    def _overlap(prev_text, next_text, expected):
+        """Caracteres de next_text que ya están al final de prev_text."""
+        if 0 < expected <= min(len(prev_text), len(next_text)) and prev_text.endswith(next_text[:expected]):
+            return expected
+        probe = next_text[:50]
+        pos = prev_text.find(probe, max(0, len(prev_text) - len(next_text)))
+        while probe and pos != -1:
+            size = len(prev_text) - pos
+            if next_text.startswith(prev_text[pos:]):
+                return size
+            pos = prev_text.find(probe, pos + 1)
+        return 0
+
+    def merge(self, hits):
+        """
+        Fusiona hits del mismo documento que se solapan o son contiguos.
+        El bloque fusionado ocupa el puesto del hit más relevante.
+        """
+        groups = {}
+        for rank, hit in enumerate(hits):
+            groups.setdefault(hit["source"], []).append((rank, hit))
+
+        merged = []
+        n_merged = 0
+        for items in groups.values():
+            items.sort(key=lambda x: x[1].get("char_offset", 0))
+            block_rank, block = items[0][0], dict(items[0][1])
+            block_end = block.get("char_offset", 0) + len(block["text"])
+            for rank, hit in items[1:]:
+                start = hit.get("char_offset", 0)
+                if start <= block_end + 1:
+                    overlap = self._overlap(block["text"], hit["text"], block_end - start)
+                    tail = hit["text"][overlap:]
+                    if tail:
+                        sep = "" if overlap or block["text"].endswith(" ") else " "
+                        block["text"] += sep + tail
+                    block_end = max(block_end, start + len(hit["text"]))
+                    block["score"] = max(block.get("score", 0.0), hit.get("score", 0.0))
+                    block_rank = min(block_rank, rank)
+                    n_merged += 1
+                else:
+                    merged.append((block_rank, block))
+                    block_rank, block = rank, dict(hit)
+                    block_end = start + len(hit["text"])
+            merged.append((block_rank, block))
+
+        merged.sort(key=lambda x: x[0])
+        return [block for _, block in merged], n_merged
+
+    # ------------------------------------------------------------
+    # Relleno del presupuesto
+    # ------------------------------------------------------------
+    @staticmethod
+    def _label(hit):
+        # las páginas se guardan desde 0 (fitz); la cita se muestra desde 1
+        page = hit.get("page", -1)
+        return f"[{hit['source']}, pág. {page + 1}]" if page is not None and page >= 0 else f"[{hit['source']}]"
+
+    def _truncate(self, text, budget):
+        """Recorta text a `budget` tokens terminando en un final de frase si se puede."""
+        approx = text[:max(1, budget * 4)]
+        while approx and self.counter.count(approx) > budget:
+            approx = approx[:int(len(approx) * 0.9)]
+        ends = [m.end() for m in _SENTENCE_END.finditer(approx)]
+        if ends and ends[-1] > len(approx) // 2:
+            return approx[:ends[-1]].strip()
+        return approx.strip()
+
+    def pack(self, hits, vectors=None, max_chunks=None, clean=None):
+        """
+        hits: chunks recuperados en orden de relevancia (con 'score').
+        vectors: sus embeddings para MMR (opcional). clean: función de limpieza.
+        Devuelve (contexto, stats). Sin estado compartido: query_many empaqueta
+        varias preguntas a la vez con el mismo ContextPacker.
+        """
+        max_chunks = max_chunks or len(hits)
+        candidates = len(hits)
+        hits = self.mmr(hits, vectors, max_chunks)
+        # fusionar antes de limpiar: los offsets se refieren al texto guardado
+        blocks, n_merged = self.merge(hits)
+        if clean is not None:
+            blocks = [{**b, "text": clean(b["text"])} for b in blocks]
+
+        parts = []
+        used_tokens = 0
+        skipped = 0
+        for block in blocks:
+            part = f"{self._label(block)}\n{block['text']}"
+            tokens = self.counter.count(part) + (1 if parts else 0)
+            if used_tokens + tokens <= self.token_budget:
+                parts.append(part)
+                used_tokens += tokens
+            elif not parts:
+                # ni el más relevante cabe: recortarlo en una frase
+                part = self._truncate(part, self.token_budget)
+                parts.append(part)
+                used_tokens += self.counter.count(part)
+            else:
+                skipped += 1
+
+        context = "\n\n".join(parts)
+        stats = {
+            "candidates": candidates,
+            "selected": len(hits),
+            "merged": n_merged,
+            "blocks": len(parts),
+            "skipped": skipped,
+            "context_tokens": used_tokens,
+            "token_budget": self.token_budget,
+            "exact_tokens": self.counter.exact,
+        }
+        return context, stats
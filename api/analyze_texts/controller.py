@@ -1,103 +1,363 @@
-import re
 import os
+import shutil
+import threading
+import time
 from analyze_texts.extractor import Extractor
 from analyze_texts.chunker import Chunker
-from analyze_texts.embeddings import EmbeddingsManager
-from analyze_texts.agent_response import ResponseAgent
-
-
-def clean_text(text):
-    text = re.sub(r'[^\x20-\x7EáéíóúÁÉÍÓÚñÑüÜ.,;:()\-–\[\]{}¿?¡!\\n ]+', '', text)
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'\s*\n\s*', '. ', text)
-    return text.strip()
+from analyze_texts.normalization import normalize_text
+from analyze_texts.pipeline import IngestionPipeline
+from analyze_texts.snapshots import SnapshotStore
 
 
 class MultiAgentController:
-    def __init__(self, auto_reset=False):
-        self.extractor = Extractor()
+    def __init__(self, auto_reset=False, data_dir=None, extractor=None):
+        # Construcción barata: el modelo de embeddings, FAISS y el cliente de
+        # Groq se crean la primera vez que se usan (o en warmup()).
+        # data_dir: carpeta propia de la colección (índice, chunks y subidas);
+        # None mantiene las rutas de siempre en el directorio actual.
+        self.data_dir = data_dir
+        self.upload_dir = self._path("temp")
+        self.extractor = extractor or Extractor()
         self.chunker = Chunker(chunk_size=800, overlap=150)
+        # chunks por lote de embeddings: fija el pico de memoria de la ingesta
+        self.batch_size = int(os.environ.get("INGEST_BATCH_SIZE", 64))
+        self.auto_reset = auto_reset
+        # los reindexados completos se construyen en un snapshot nuevo y se
+        # publican con un rename atómico (ver snapshots.SnapshotStore)
+        self.snapshots = SnapshotStore(self._path("snapshots"))
+        # cada cuánto mirar si otro worker publicó un snapshot nuevo
+        self.snapshot_poll_seconds = float(os.environ.get("SNAPSHOT_POLL_SECONDS", 2))
+        # SLIM_RUNTIME=1: solo consultas, sin torch ni FAISS (ver slim.SlimRetriever);
+        # el chunk store y static_model.npz vienen de slim_bundle/
+        self.slim = os.environ.get("SLIM_RUNTIME", "0") == "1"
+        self._snapshot_path = None
+        self._snapshot_checked_at = 0.0
 
-        # SIEMPRE resetear FAISS cada vez que inicializa el controlador
-        self.emb_manager = EmbeddingsManager(index_path="faiss.index")
-        self.emb_manager.reset_index()
+        self._emb_manager = None
+        self._response_agent = None
+        self._init_lock = threading.RLock()
+        self._warmup_thread = None
+        self._warmup_error = None
+        self._warmup_seconds = None
+        # trabajos de indexado en curso: una colección ocupada no se descarga
+        self._busy = 0
+        self.last_used = time.time()
 
-        self.response_agent = ResponseAgent(faiss_index_path="faiss.index")
+    def _path(self, name):
+        return os.path.join(self.data_dir, name) if self.data_dir else name
 
+    # ------------------------------------------------------------
+    # Componentes pesados, creados bajo demanda
+    # ------------------------------------------------------------
+    @property
+    def emb_manager(self):
+        if self._emb_manager is None:
+            with self._init_lock:
+                if self._emb_manager is None:
+                    # El índice persiste entre reinicios para poder indexar de forma
+                    # incremental; auto_reset=True vuelve al comportamiento anterior
+                    snapshot = self.snapshots.current()
+                    emb_manager = self._open_emb_manager(snapshot)
+                    if self.auto_reset:
+                        emb_manager.reset_index()
+                    self._snapshot_path = snapshot
+                    self._snapshot_checked_at = time.time()
+                    self._emb_manager = emb_manager
+        else:
+            self._check_snapshot()
+        return self._emb_manager
 
-    def process_files(self, file_paths):
-        print(f"\n{'='*60}")
-        print(f"📂 Procesando {len(file_paths)} archivos...")
-        print(f"{'='*60}")
+    def _open_emb_manager(self, snapshot=None):
+        if self.slim:
+            from analyze_texts.slim import SLIM_STORE_PATH, SlimRetriever
+            # la colección por defecto sirve el bundle del build (slim_bundle/)
+            if self.data_dir is None and os.path.isdir(SLIM_STORE_PATH):
+                return SlimRetriever(SLIM_STORE_PATH)
+            return SlimRetriever(os.path.join(snapshot, "chunkstore") if snapshot else self._path("chunkstore"))
 
-        # Reinicia FAISS **cada vez que subes archivos**
-        self.emb_manager.reset_index()
+        from analyze_texts.embeddings import EmbeddingsManager
 
-        all_chunks = []
-        processed_files = []
+        if snapshot is None:
+            # sin snapshots publicados: rutas de versiones anteriores
+            return EmbeddingsManager(
+                index_path=self._path("faiss.index"),
+                meta_path=self._path("metadata.pkl"),
+                store_path=self._path("chunkstore")
+            )
+        return EmbeddingsManager(
+            index_path=os.path.join(snapshot, "faiss.index"),
+            meta_path=os.path.join(snapshot, "metadata.pkl"),
+            store_path=os.path.join(snapshot, "chunkstore")
+        )
 
-        for i, fp in enumerate(file_paths, 1):
+    def _check_snapshot(self):
+        """Adopta el snapshot publicado por otro worker (como mucho cada N segundos)."""
+        now = time.time()
+        if now - self._snapshot_checked_at < self.snapshot_poll_seconds:
+            return
+        self._snapshot_checked_at = now
+        snapshot = self.snapshots.current()
+        if snapshot is None or snapshot == self._snapshot_path:
+            return
+        with self._init_lock:
+            if snapshot != self._snapshot_path and not self.busy:
+                print(f"🔀 Cargando snapshot publicado: {os.path.basename(snapshot)}")
+                self._swap(self._open_emb_manager(snapshot), snapshot)
+
+    def _swap(self, emb_manager, snapshot):
+        """Cambia el índice que sirve las consultas; las que están en curso terminan con el anterior."""
+        with self._init_lock:
+            self._emb_manager = emb_manager
+            self._snapshot_path = snapshot
+            if self._response_agent is not None:
+                self._response_agent.emb_manager = emb_manager
+
+    @property
+    def response_agent(self):
+        if self._emb_manager is not None:
+            self._check_snapshot()
+        if self._response_agent is None:
+            with self._init_lock:
+                if self._response_agent is None:
+                    from analyze_texts.agent_response import ResponseAgent
+                    self._response_agent = ResponseAgent(emb_manager=self.emb_manager)
+        return self._response_agent
+
+    def warmup(self, background=True):
+        """Carga el modelo y el índice (en un hilo aparte por defecto)."""
+        def run():
+            start = time.perf_counter()
             try:
-                print(f"\n📄 Archivo {i}/{len(file_paths)}: {os.path.basename(fp)}")
+                # una codificación de prueba deja el modelo listo para la primera consulta
+                self.emb_manager.model.encode(["warmup"])
+                self.response_agent
+                self._warmup_seconds = round(time.perf_counter() - start, 2)
+                print(f"🔥 Warmup completo en {self._warmup_seconds}s")
+            except Exception as e:
+                self._warmup_error = str(e)
+                print(f"❌ Error en warmup: {e}")
+
+        if not background:
+            run()
+            return
+        if self._warmup_thread is None:
+            self._warmup_thread = threading.Thread(target=run, name="warmup", daemon=True)
+            self._warmup_thread.start()
 
-                text = self.extractor.extract(fp)
-                cleaned_text = clean_text(text)
+    # ------------------------------------------------------------
+    # Memoria / descarga (ver namespaces.NamespaceRegistry)
+    # ------------------------------------------------------------
+    def memory_bytes(self):
+        """Memoria aproximada de la colección cargada (el modelo es compartido)."""
+        if self._emb_manager is None:
+            return 0
+        return self._emb_manager.memory_bytes()
 
-                if not cleaned_text or len(cleaned_text) < 10:
-                    print(f"⚠️ Archivo vacío o muy corto: {fp}")
-                    continue
+    @property
+    def busy(self):
+        return self._busy > 0
 
-                print(f"  ✅ Texto extraído: {len(cleaned_text)} caracteres")
+    def unload(self):
+        """
+        Libera el índice y el agente; todo está ya guardado en disco y se
+        vuelve a cargar bajo demanda en el siguiente uso.
+        """
+        with self._init_lock:
+            if self.busy:
+                return False
+            self._emb_manager = None
+            self._response_agent = None
+        return True
 
-                raw_chunks = self.chunker.chunk_text(cleaned_text)
-                print(f"  ✅ {len(raw_chunks)} chunks creados")
+    def readiness(self):
+        """Estado de los componentes sin forzar su carga."""
+        return {
+            "ready": self._emb_manager is not None and self._response_agent is not None,
+            "embeddings_loaded": self._emb_manager is not None,
+            "llm_client_ready": self._response_agent is not None,
+            "warming_up": self._warmup_thread is not None and self._warmup_thread.is_alive(),
+            "warmup_seconds": self._warmup_seconds,
+            "warmup_error": self._warmup_error,
+        }
 
-                for chunk in raw_chunks:
-                    cleaned_chunk = clean_text(chunk)
-                    if cleaned_chunk and len(cleaned_chunk) > 20:
-                        all_chunks.append({
-                            "text": cleaned_chunk,
-                            "source": os.path.basename(fp)
-                        })
 
-                processed_files.append(os.path.basename(fp))
+    def process_files(self, file_paths, reset=True, progress=None, analyze=True):
+        """
+        Extrae, trocea e indexa los archivos en streaming (ver IngestionPipeline).
+        reset=True reconstruye el índice desde cero; reset=False agrega los
+        archivos a una copia del índice actual (reemplazando los que ya
+        estaban indexados) y la publica como snapshot nuevo.
+        progress(evento) recibe el avance tras cada lote de embeddings.
+        analyze=False omite el análisis con el LLM (se puede pedir luego con analyze()).
+        """
+        if self.slim:
+            raise RuntimeError("Modo ligero (SLIM_RUNTIME=1): la indexación se hace en el build")
 
-            except Exception as e:
-                print(f"❌ Error procesando {fp}: {e}")
-                continue
+        print(f"\n{'='*60}")
+        print(f"📂 Procesando {len(file_paths)} archivos...")
+        print(f"{'='*60}")
+
+        # una sola escritura a la vez en la colección, también entre workers
+        with self.snapshots.write_lock():
+            stats = self._ingest(file_paths, reset, progress)
+
+        extraction_stats = stats["extraction"]
+        print(f"⚡ Extracción: {extraction_stats['pages']} páginas en "
+              f"{extraction_stats['seconds']}s ({extraction_stats['pages_per_second']} pág/s); "
+              f"embeddings: {stats['embedding_seconds']}s; total: {stats['seconds']}s")
 
-        if not all_chunks:
+        if not stats["total_chunks"]:
             return {
                 "status": "error",
                 "message": "❌ No se pudieron extraer chunks válidos",
-                "analysis": None
+                "analysis": None,
+                "extraction": extraction_stats
             }
 
-        print(f"\n📊 Total de chunks válidos: {len(all_chunks)}")
-
-        self.emb_manager.create_embeddings(all_chunks)
-
-        # Recargar ResponseAgent con FAISS actualizado
-        self.response_agent = ResponseAgent(faiss_index_path="faiss.index")
+        print(f"\n📊 Total de chunks válidos: {stats['total_chunks']}")
 
         # Análisis automático del contenido
-        print("\n🤖 Analizando contenido...")
-        analysis = self.response_agent.analyze_documents()
+        analysis = self.analyze() if analyze else None
 
         return {
             "status": "success",
-            "message": f"✅ {len(all_chunks)} chunks procesados",
-            "files_processed": processed_files,
-            "total_chunks": len(all_chunks),
+            "message": f"✅ {stats['total_chunks']} chunks procesados",
+            "files_processed": stats["files_processed"],
+            "total_chunks": stats["total_chunks"],
+            "batches": stats["batches"],
+            "documents": self.emb_manager.list_documents(),
+            "extraction": extraction_stats,
+            "embedding_seconds": stats["embedding_seconds"],
+            "ingestion_seconds": stats["seconds"],
+            "embedding_cache": stats["embedding_cache"],
+            "dedup": stats["dedup"],
             "analysis": analysis
         }
 
 
+    def _fork_snapshot(self):
+        """
+        Snapshot nuevo a partir del publicado (o de las rutas anteriores a los
+        snapshots). Los archivos se comparten con hard links en lugar de
+        copiarse (ver chunk_store.link_store): el chunk store crece por append
+        y el índice se reescribe con un rename, así un cambio incremental
+        cuesta lo que ocupa el cambio y no el corpus entero. El snapshot
+        publicado solo lee hasta sus longitudes selladas, así que nunca ve lo
+        que se escribe en el nuevo; los otros workers lo adoptan al cambiar CURRENT.
+        """
+        from analyze_texts.chunk_store import link_store
+
+        snapshot = self.snapshots.create()
+        current = self.snapshots.current()
+        for name in ("faiss.index", "metadata.pkl", "chunkstore"):
+            src = os.path.join(current, name) if current else self._path(name)
+            dst = os.path.join(snapshot, name)
+            if os.path.isdir(src):
+                link_store(src, dst)
+            elif os.path.isfile(src):
+                try:
+                    os.link(src, dst)
+                except OSError:
+                    shutil.copy2(src, dst)
+        return snapshot
+
+    def _ingest(self, file_paths, reset, progress):
+        with self._init_lock:
+            self._busy += 1
+        try:
+            # el índice actual sigue respondiendo mientras se construye el nuevo:
+            # desde cero (reset) o sobre una copia del publicado (incremental)
+            snapshot = self.snapshots.create() if reset else self._fork_snapshot()
+            target = self._open_emb_manager(snapshot)
+
+            pipeline = IngestionPipeline(
+                self.extractor, self.chunker, target,
+                normalize=normalize_text, batch_size=self.batch_size
+            )
+            try:
+                stats = pipeline.run(file_paths, replace=not reset, progress=progress)
+            except Exception:
+                self.snapshots.discard(snapshot)
+                raise
+
+            if stats["total_chunks"] or not reset:
+                # incremental: se publica aunque no haya chunks nuevos (pudo
+                # reemplazar un documento por uno vacío)
+                self._publish(target, snapshot)
+            else:
+                # nada que publicar: se conserva el índice anterior
+                self.snapshots.discard(snapshot)
+        finally:
+            with self._init_lock:
+                self._busy -= 1
+
+        return stats
+
+    def _publish(self, emb_manager, snapshot):
+        # longitudes selladas: los appends del próximo fork no se verán aquí
+        emb_manager.metadata.seal()
+        self.snapshots.publish(snapshot)
+        self._swap(emb_manager, snapshot)
+        self.snapshots.gc()
+
+    def analyze(self):
+        """Análisis del contenido indexado con el LLM."""
+        print("\n🤖 Analizando contenido...")
+        return self.response_agent.analyze_documents()
+
+    def add_files(self, file_paths, **kwargs):
+        """Agrega o reemplaza archivos sin tocar el resto del índice."""
+        return self.process_files(file_paths, reset=False, **kwargs)
+
+    def remove_file(self, source):
+        """Elimina un archivo del índice. Devuelve cuántos chunks se borraron."""
+        with self.snapshots.write_lock():
+            snapshot = self._fork_snapshot()
+            try:
+                target = self._open_emb_manager(snapshot)
+                removed = target.remove_document(os.path.basename(source))
+            except Exception:
+                self.snapshots.discard(snapshot)
+                raise
+            if removed:
+                self._publish(target, snapshot)
+            else:
+                self.snapshots.discard(snapshot)
+            return removed
+
+    def list_files(self):
+        return self.emb_manager.list_documents()
+
     # -------------- AQUI ESTABA TU ERROR --------------
-    def answer_question(self, question):
+    def answer_question(self, question, sources=None, pages=None):
         """Método usado por /query en app.py"""
-        question_cleaned = clean_text(question)
+        question_cleaned = normalize_text(question)
         if not question_cleaned:
             return "❌ La pregunta está vacía."
 
-        return self.response_agent.query(question_cleaned)
+        return self.response_agent.query(question_cleaned, sources=sources, pages=pages)
+
+    def answer_questions(self, questions, top_k=5, retrieval_only=False, sources=None, pages=None):
+        """Método usado por /query-batch en app.py"""
+        cleaned = [normalize_text(q) for q in questions]
+        valid = [q for q in cleaned if q]
+        results = iter(self.response_agent.query_many(
+            valid, top_k=top_k, retrieval_only=retrieval_only, sources=sources, pages=pages
+        ))
+        # mantener el orden de entrada, también para preguntas vacías
+        return [
+            next(results) if q else {"question": q, "error": "❌ La pregunta está vacía."}
+            for q in cleaned
+        ]
+
+    def answer_question_stream(self, question, sources=None, pages=None):
+        """
+        Versión en streaming de answer_question: genera fragmentos de texto y,
+        al final, las métricas de la respuesta (StreamStats).
+        """
+        question_cleaned = normalize_text(question)
+        if not question_cleaned:
+            yield "❌ La pregunta está vacía."
+            return
+
+        yield from self.response_agent.query_stream(question_cleaned, sources=sources, pages=pages)
@@ -0,0 +1,131 @@
+# analyze_texts/dedup.py
+import hashlib
+import os
+import re
+import numpy as np
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def shingles(text, size=5):
+    """Conjunto de n-gramas de palabras (en minúsculas) del texto."""
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """Firmas MinHash de num_perm permutaciones (hash universal a*x+b mod p)."""
+
+    def __init__(self, num_perm=64, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self._a = rng.randint(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 31, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set):
+        if not shingle_set:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+             for s in shingle_set],
+            dtype=np.uint64,
+        )
+        # (n_shingles, num_perm) -> mínimo por permutación
+        permuted = ((np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME) & _MAX_HASH
+        return permuted.min(axis=0)
+
+
+class NearDuplicateFilter:
+    """
+    Detecta chunks casi duplicados (cabeceras, pies, avisos legales repetidos
+    en cada página) antes de calcular sus embeddings. La ingesta usa un
+    filtro por documento.
+
+    MinHash sobre 5-gramas de palabras + LSH por bandas para encontrar
+    candidatos sin comparar todos contra todos; un candidato es duplicado si
+    su Jaccard estimado >= threshold. El primer chunk visto se conserva y
+    acumula la procedencia (source, page, char_offset) de sus duplicados.
+
+    Del chunk conservado solo se guarda la firma y el sha1; el dict (con el
+    texto) se retiene solo hasta que embedded() da su chunk_id, así la memoria
+    no crece con el texto del documento sino con el número de chunks.
+    """
+
+    def __init__(self, threshold=None, num_perm=64, bands=16, shingle_size=5):
+        if threshold is None:
+            threshold = float(os.environ.get("DEDUP_THRESHOLD", 0.9))
+        if num_perm % bands:
+            raise ValueError("num_perm debe ser múltiplo de bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.hasher = MinHasher(num_perm)
+
+        self._exact = {}       # sha1 del texto -> índice en _kept
+        self._buckets = {}     # (banda, hash de la banda) -> [índices en _kept]
+        self._kept = []        # [firma, chunk pendiente o su chunk_id]
+        self._pending = {}     # id(chunk) -> índice en _kept, hasta embedded()
+        self.seen = 0
+        self.removed = 0
+
+    def check(self, chunk):
+        """
+        Devuelve None si el chunk es nuevo (queda registrado) o el original
+        del que es casi duplicado: su chunk_id si ya está en el índice o, si
+        todavía no, el propio dict del chunk conservado.
+        """
+        self.seen += 1
+        text = chunk["text"]
+        digest = hashlib.sha1(text.encode("utf-8")).digest()
+        index = self._exact.get(digest)
+        if index is not None:
+            self.removed += 1
+            return self._kept[index][1]
+
+        sig = self.hasher.signature(shingles(text, self.shingle_size))
+        keys = [(b, sig[b * self.rows:(b + 1) * self.rows].tobytes()) for b in range(self.bands)]
+
+        candidates = set()
+        for key in keys:
+            candidates.update(self._buckets.get(key, ()))
+        for i in sorted(candidates):
+            kept_sig, kept = self._kept[i]
+            if float(np.mean(kept_sig == sig)) >= self.threshold:
+                self.removed += 1
+                return kept
+
+        index = len(self._kept)
+        self._kept.append([sig, chunk])
+        self._pending[id(chunk)] = index
+        self._exact[digest] = index
+        for key in keys:
+            self._buckets.setdefault(key, []).append(index)
+        return None
+
+    def embedded(self, chunk, chunk_id):
+        """El chunk conservado ya está en el índice: se guarda su id y se suelta el dict."""
+        index = self._pending.pop(id(chunk), None)
+        if index is not None:
+            self._kept[index][1] = chunk_id
+
+    def stats(self):
+        return {
+            "chunks_seen": self.seen,
+            "duplicates_removed": self.removed,
+            "removed_fraction": round(self.removed / self.seen, 4) if self.seen else 0.0,
+            "threshold": self.threshold,
+        }
+
+
+def provenance(chunk):
+    """Ubicación de un chunk para guardarla en el que lo sustituye."""
+    return {
+        "source": chunk.get("source", ""),
+        "page": chunk.get("page", -1),
+        "char_offset": chunk.get("char_offset", -1),
+    }
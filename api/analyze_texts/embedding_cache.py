@@ -0,0 +1,113 @@
+# analyze_texts/embedding_cache.py
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+
+
+def _normalize(text):
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def chunk_hash(text):
+    """Hash del chunk normalizado (espacios colapsados)."""
+    return hashlib.sha256(_normalize(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Caché persistente hash(chunk normalizado) -> vector float32, separada por
+    modelo (un archivo SQLite por modelo) y con expulsión LRU por tamaño.
+    """
+
+    def __init__(self, model_name, dim=384, cache_dir=None, max_entries=None):
+        if cache_dir is None:
+            cache_dir = os.environ.get("EMBEDDING_CACHE_DIR", "embedding_cache")
+        if max_entries is None:
+            max_entries = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", 200_000))
+        self.model_name = model_name
+        self.dim = dim
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.path = os.path.join(cache_dir, f"{safe_name}.sqlite")
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)"
+        )
+        self._conn.commit()
+
+    def get_many(self, texts):
+        """
+        Devuelve (vectores, faltantes): vectores es una lista alineada con texts
+        (None en los que no estaban en caché) y faltantes los índices sin vector.
+        """
+        keys = [chunk_hash(t) for t in texts]
+        found = {}
+        with self._lock:
+            unique = list(set(keys))
+            # SQLite limita el número de parámetros por consulta
+            for i in range(0, len(unique), 500):
+                batch = unique[i:i + 500]
+                marks = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype="float32")
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, k) for k in found],
+                )
+                self._conn.commit()
+
+        vectors = [found.get(k) for k in keys]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        return vectors, missing
+
+    def put_many(self, texts, vectors):
+        now = time.time()
+        rows = [
+            (chunk_hash(t), np.asarray(v, dtype="float32").tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                rows,
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                " SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (excess,),
+            )
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
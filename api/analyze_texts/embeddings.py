@@ -1,69 +1,386 @@
 # analyze_texts/embeddings.py
-from sentence_transformers import SentenceTransformer
 import faiss
+import functools
+import itertools
 import numpy as np
 import pickle
 import os
+import threading
+import time
+from analyze_texts.model_registry import DEFAULT_MODEL_NAME, default_backend, get_model, get_query_encoder
+from analyze_texts.embedding_cache import EmbeddingCache
+from analyze_texts import index_factory
+from analyze_texts.index_factory import normalize
+from analyze_texts.chunk_store import ChunkStore, document_id
+from analyze_texts.concurrency import RWLock, apply_thread_budget
+from analyze_texts.vector_file import FullVectorFile
+
+# versiones únicas en el proceso: un índice nuevo (p. ej. otro snapshot)
+# nunca repite la versión de uno anterior
+_versions = itertools.count(1)
+
+
+def _writes(method):
+    """Ejecuta el método con el lock de escritura del índice."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock.write():
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 class EmbeddingsManager:
-    def __init__(self, model_name="sentence-transformers/all-MiniLM-L6-v2", index_path="faiss.index", meta_path="metadata.pkl"):
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, model_name=DEFAULT_MODEL_NAME, index_path="faiss.index", meta_path="metadata.pkl", device=None, use_cache=True,
+                 index_type=None, ef_search=None, nprobe=None, store_path="chunkstore",
+                 mmap_index=None, lazy_load=None, rerank_factor=None, backend=None):
+        # el modelo se comparte entre todas las instancias del proceso
+        self.model_name = model_name
+        self.backend = backend or default_backend()
+        self.model = get_model(model_name, device=device, backend=self.backend)
+        # las preguntas sueltas se agrupan en micro-batches entre hilos
+        self.query_encoder = get_query_encoder(model_name, device=device, backend=self.backend)
+        # hilos de FAISS/torch acotados por worker (SERVING_THREADS / WEB_CONCURRENCY)
+        apply_thread_budget()
+        # búsquedas concurrentes; add/remove/save/reset en exclusiva
+        self.lock = RWLock()
+        self._load_lock = threading.Lock()
+        # los vectores int8 difieren un poco de los fp32: caché separada por backend
+        cache_name = model_name if self.backend == "torch" else f"{model_name}-{self.backend}"
+        self.cache = EmbeddingCache(cache_name) if use_cache else None
+        self.last_cache_stats = {"hits": 0, "misses": 0}
         self.index_path = index_path
+        # meta_path: metadata.pkl de versiones anteriores, solo para migrar
         self.meta_path = meta_path
+        # metadata: chunk_id -> {'text', 'source', 'doc_id', 'page', 'char_offset'}
+        self.metadata = ChunkStore(store_path)
+        # vectores float32 completos en disco: re-rank exacto de los índices
+        # comprimidos (sq8 / pq / ivfpq) y reconstrucciones sin pérdida
+        self.full_vectors = FullVectorFile(os.path.join(store_path, "vectors.f32"), index_factory.EMBEDDING_DIM)
+        if rerank_factor is None:
+            rerank_factor = int(os.environ.get("RERANK_FACTOR", 4))
+        self.rerank_factor = rerank_factor
+        # búsquedas filtradas por documento: hasta este número de chunks
+        # seleccionados se calcula el producto interno exacto solo sobre ellos
+        self.filter_exact_max = int(os.environ.get("FILTER_EXACT_MAX", 50_000))
+
+        # "auto" elige flat / hnsw / ivfpq según el tamaño del corpus
+        self.index_type = index_type or os.environ.get("INDEX_TYPE", "auto")
+        if self.index_type != "auto" and self.index_type not in index_factory.INDEX_KINDS:
+            raise ValueError(f"Tipo de índice no soportado: {self.index_type}")
+        self.ef_search = ef_search
+        self.nprobe = nprobe
 
-        if os.path.exists(self.index_path) and os.path.exists(self.meta_path):
-            self.load_index()
-            print(f"✅ Índice cargado: {self.index.ntotal} vectores, {len(self.metadata)} metadatos")
+        # mmap_index: abrir el índice guardado en solo lectura y memory-mapped,
+        # para que varios workers compartan las páginas vía la caché del SO.
+        # lazy_load: no leer el índice hasta la primera consulta.
+        if mmap_index is None:
+            mmap_index = os.environ.get("FAISS_MMAP", "0") == "1"
+        if lazy_load is None:
+            lazy_load = os.environ.get("FAISS_LAZY_LOAD", "0") == "1"
+        self.mmap_index = mmap_index
+        self._index = None
+        self._index_mmapped = False
+        self.load_stats = {"index_load_ms": None, "first_query_ms": None}
+        # se incrementa con cada cambio del índice (invalida cachés de respuestas)
+        self.version = next(_versions)
+
+        has_meta = len(self.metadata) > 0 or os.path.exists(self.meta_path)
+        if os.path.exists(self.index_path) and has_meta:
+            if lazy_load:
+                print(f"⏳ Índice diferido hasta la primera consulta ({len(self.metadata)} metadatos)")
+            else:
+                self.load_index()
+                print(f"✅ Índice cargado: {self.index.ntotal} vectores, {len(self.metadata)} metadatos")
         else:
-            # índice plano L2 (funciona bien y simple)
-            self.index = faiss.IndexFlatL2(384)
-            self.metadata = []
+            self._reset_state()
             print("ℹ️ Índice nuevo creado (vacío)")
 
-    def create_embeddings(self, chunks):
+    # ------------------------------------------------------------
+    # Carga diferida / memory-mapped del índice
+    # ------------------------------------------------------------
+    @property
+    def index(self):
+        if self._index is None:
+            with self._load_lock:
+                if self._index is None:
+                    self.load_index()
+        return self._index
+
+    @index.setter
+    def index(self, value):
+        self._index = value
+        self._index_mmapped = False
+
+    @property
+    def index_loaded(self):
+        return self._index is not None
+
+    def vector_count(self):
+        """Número de vectores sin forzar la carga del índice."""
+        return self._index.ntotal if self._index is not None else len(self.metadata)
+
+    def _ensure_writable(self):
+        # un índice memory-mapped es de solo lectura: cargarlo completo antes de modificarlo
+        if self._index_mmapped:
+            self._index = faiss.read_index(self.index_path)
+            self._index_mmapped = False
+            index_factory.set_search_params(self._index, self.ef_search, self.nprobe)
+
+    def _read_index(self):
+        if self.mmap_index:
+            try:
+                index = faiss.read_index(self.index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+                return index, True
+            except Exception as e:
+                print(f"⚠️ El índice no admite mmap, se carga en memoria: {e}")
+        return faiss.read_index(self.index_path), False
+
+    def _reset_state(self):
+        # producto interno sobre vectores normalizados (= similitud coseno);
+        # los IVF se entrenan cuando hay suficientes vectores
+        self.index = index_factory.build_index("flat")
+        self.metadata.clear()
+        self.full_vectors.clear()
+        self.version = next(_versions)
+
+    @_writes
+    def create_embeddings(self, chunks, save=True):
         """
         chunks: lista de dicts {'text': '...', 'source': 'file.pdf'}
+        Devuelve la lista de ids asignados.
         """
         if not chunks:
             print("⚠️ No hay chunks para crear embeddings")
-            return
+            return []
 
-        texts = [c["text"] for c in chunks if c.get("text")]
-        if not texts:
+        chunks = [c for c in chunks if c.get("text")]
+        if not chunks:
             print("⚠️ No hay textos válidos en los chunks")
-            return
+            return []
 
+        texts = [c["text"] for c in chunks]
         print(f"📊 Creando embeddings para {len(texts)} chunks...")
-        embeddings = self.model.encode(texts, show_progress_bar=True)
-        embeddings = np.array(embeddings).astype("float32")
-        self.index.add(embeddings)
-        self.metadata.extend(chunks)
-        self.save_index()
+        embeddings = self.encode_cached(texts)
+
+        next_id = self.metadata.next_id
+        ids = np.arange(next_id, next_id + len(chunks), dtype="int64")
+        self._ensure_writable()
+        self.index.add_with_ids(embeddings, ids)
+        # el chunk store se escribe en modo append: no se reescribe el corpus
+        self.metadata.append(ids.tolist(), chunks)
+        self.full_vectors.append(ids, embeddings)
+        self.version = next(_versions)
+
+        # al crecer el corpus puede tocar pasar a HNSW / IVF-PQ
+        self._maybe_rebuild()
+
+        if save:
+            self.save_index()
         print(f"✅ {len(texts)} embeddings creados. Total en índice: {self.index.ntotal}")
+        return ids.tolist()
+
+    # ------------------------------------------------------------
+    # Operaciones incrementales por documento
+    # ------------------------------------------------------------
+    @_writes
+    def add_document(self, source, chunks):
+        """Agrega (o reemplaza si ya existe) un documento completo. Devuelve su doc_id."""
+        self.remove_document(source, save=False)
+        chunks = [{**c, "source": source} for c in chunks]
+        self.create_embeddings(chunks, save=False)
+        self.save_index()
+        return document_id(source)
+
+    replace_document = add_document
+
+    @_writes
+    def remove_document(self, source, save=True):
+        """Elimina todos los chunks de un documento. Devuelve cuántos se borraron."""
+        chunk_ids = self.metadata.document_chunk_ids(source)
+        if not chunk_ids:
+            return 0
+
+        self.metadata.delete(chunk_ids)
+        self.version = next(_versions)
+        self._ensure_writable()
+
+        if index_factory.supports_remove(self.index):
+            removed = self.index.remove_ids(np.array(chunk_ids, dtype="int64"))
+            self._maybe_rebuild()
+        else:
+            removed = len(chunk_ids)
+            self._rebuild(self.target_kind())
+
+        if save:
+            self.save_index()
+        print(f"🗑️ Documento {source} eliminado ({removed} vectores)")
+        return int(removed)
+
+    # ------------------------------------------------------------
+    # Selección / reconstrucción del tipo de índice
+    # ------------------------------------------------------------
+    def target_kind(self):
+        n = len(self.metadata)
+        kind = index_factory.choose_kind(n) if self.index_type == "auto" else self.index_type
+        # sin vectores suficientes para entrenar un IVF: HNSW en modo auto,
+        # o seguir con el índice actual si el tipo es fijo
+        if n < index_factory.min_train_vectors(kind, n):
+            return "hnsw" if self.index_type == "auto" else index_factory.index_kind(self.index)
+        return kind
+
+    def _rebuild(self, kind):
+        start = time.perf_counter()
+        ids = list(self.metadata)
+        vectors = self.full_vectors.get(ids) if ids and self.full_vectors.covers(ids) else None
+        self.index = index_factory.rebuild_index(
+            self.index, ids, kind,
+            ef_search=self.ef_search, nprobe=self.nprobe, vectors=vectors
+        )
+        print(f"🔁 Índice reconstruido como {kind} en {time.perf_counter() - start:.2f}s")
+
+    def _maybe_rebuild(self):
+        kind = self.target_kind()
+        if kind != index_factory.index_kind(self.index):
+            self._rebuild(kind)
+
+    def index_info(self):
+        """Estado del índice; no fuerza la carga diferida."""
+        info = {
+            "configured": self.index_type,
+            "loaded": self.index_loaded,
+            "mmap": self._index_mmapped,
+            "vectors": self.vector_count(),
+            "rerank_factor": self.rerank_factor,
+            "full_vectors_mb": round(self.full_vectors.size_bytes() / (1024 * 1024), 2),
+            **self.load_stats,
+        }
+        if self.index_loaded:
+            info["index_type"] = index_factory.index_kind(self._index)
+        return info
+
+    @_writes
+    def add_duplicates(self, chunk_id, locations):
+        """Procedencia de casi duplicados fusionados en un chunk ya indexado."""
+        self.metadata.add_duplicates(chunk_id, locations)
+
+    def memory_bytes(self):
+        """Memoria aproximada del índice cargado (0 si no está cargado o es mmap)."""
+        if not self.index_loaded or self._index_mmapped:
+            return 0
+        if os.path.exists(self.index_path):
+            # el índice serializado ocupa lo mismo que en memoria, a grandes rasgos
+            return os.path.getsize(self.index_path)
+        return self._index.ntotal * self._index.d * 4
+
+    def list_documents(self):
+        with self.lock.read():
+            documents = self.metadata.documents()
+        return [
+            {"doc_id": document_id(source), "source": source, "chunks": count}
+            for source, count in documents.items()
+        ]
+
+    def encode_cached(self, texts):
+        """Codifica solo los textos que no están en la caché, en un único batch."""
+        if self.cache is None:
+            self.last_cache_stats = {"hits": 0, "misses": len(texts)}
+            return normalize(np.array(self.model.encode(texts, show_progress_bar=True)))
 
+        vectors, missing = self.cache.get_many(texts)
+        if missing:
+            miss_texts = [texts[i] for i in missing]
+            new_vectors = normalize(np.array(
+                self.model.encode(miss_texts, show_progress_bar=True)
+            ))
+            for i, vec in zip(missing, new_vectors):
+                vectors[i] = vec
+            self.cache.put_many(miss_texts, new_vectors)
+
+        self.last_cache_stats = {"hits": len(texts) - len(missing), "misses": len(missing)}
+        print(f"🗃️ Caché de embeddings: {self.last_cache_stats['hits']} hits, "
+              f"{self.last_cache_stats['misses']} misses")
+        return normalize(np.vstack(vectors))
+
+    @_writes
     def save_index(self):
         try:
-            faiss.write_index(self.index, self.index_path)
-            with open(self.meta_path, "wb") as f:
-                pickle.dump(self.metadata, f)
+            # escribir a un temporal y renombrar: los procesos que tengan el
+            # archivo anterior memory-mapped siguen leyendo una copia válida
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            faiss.write_index(self.index, tmp_path)
+            os.replace(tmp_path, self.index_path)
+            # los chunks ya están en disco (append); compactar si hay muchos borrados
+            if self.metadata.deleted_count > len(self.metadata):
+                self.metadata.compact()
             print(f"💾 Índice guardado: {self.index.ntotal} vectores")
         except Exception as e:
             print("❌ Error guardando índice:", e)
 
     def load_index(self):
+        start = time.perf_counter()
         try:
-            self.index = faiss.read_index(self.index_path)
-            with open(self.meta_path, "rb") as f:
-                self.metadata = pickle.load(f)
+            index, mmapped = self._read_index()
+            if len(self.metadata) == 0 and os.path.exists(self.meta_path):
+                # migrar metadata.pkl de versiones anteriores al chunk store
+                with open(self.meta_path, "rb") as f:
+                    self._load_legacy(index, pickle.load(f))
+            else:
+                self.index = index
+                self._index_mmapped = mmapped
+                if not index_factory.is_inner_product(self.index):
+                    # índices L2 antiguos: renormalizar y pasar a producto interno
+                    self._rebuild(self.target_kind())
+                self._backfill_full_vectors()
+            index_factory.set_search_params(self.index, self.ef_search, self.nprobe)
         except Exception as e:
             print("❌ Error cargando índice:", e)
-            self.index = faiss.IndexFlatL2(384)
-            self.metadata = []
+            # índice vacío en memoria; el chunk store en disco no se toca
+            self.index = index_factory.build_index("flat")
+        self.load_stats["index_load_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    def _backfill_full_vectors(self):
+        """Índices guardados antes de existir vectors.f32: recuperar los vectores del índice."""
+        missing = [i for i in self.metadata if i >= self.full_vectors.n_rows]
+        if not missing:
+            return
+        try:
+            vectors = index_factory.reconstruct_ids(self._index, missing)
+            self.full_vectors.append(missing, normalize(vectors))
+            print(f"📐 Vectores completos recuperados del índice: {len(missing)}")
+        except Exception as e:
+            print(f"⚠️ No se pudieron recuperar los vectores completos: {e}")
+
+    def _load_legacy(self, index, data):
+        """
+        Migra un metadata.pkl antiguo al chunk store: la lista de dicts
+        original (IndexFlatL2 sin ids) o el dict {chunk_id: chunk} con IndexIDMap2.
+        """
+        self._reset_state()
+        if index.ntotal == 0:
+            return
 
+        if isinstance(data, list):
+            ids = list(range(min(index.ntotal, len(data))))
+            chunks = data[:len(ids)]
+            vectors = index.reconstruct_n(0, len(ids))
+        else:
+            chunk_map = data["metadata"]
+            ids = sorted(chunk_map)
+            chunks = [chunk_map[i] for i in ids]
+            vectors = index_factory.reconstruct_ids(index, ids)
+
+        vectors = normalize(vectors)
+        self.index.add_with_ids(vectors, np.array(ids, dtype="int64"))
+        self.metadata.append(ids, chunks)
+        self.full_vectors.append(ids, vectors)
+        self._maybe_rebuild()
+        self.save_index()
+        print(f"📦 metadata.pkl migrado al chunk store ({len(ids)} chunks)")
+
+    @_writes
     def reset_index(self):
-        """Borra índice y metadata en memoria y en disco (reset limpio)."""
-        self.index = faiss.IndexFlatL2(384)
-        self.metadata = []
+        """Borra índice y chunk store en memoria y en disco (reset limpio)."""
+        self._reset_state()
         try:
             if os.path.exists(self.index_path):
                 os.remove(self.index_path)
@@ -73,18 +390,128 @@ class EmbeddingsManager:
         except Exception as e:
             print("❌ Error reiniciando archivos de índice:", e)
 
-    def query(self, question, top_k=3):
-        if self.index.ntotal == 0:
+    def encode_query(self, question):
+        """Embedding normalizado (1, dim) de una pregunta."""
+        return normalize(np.array(self.query_encoder.encode([question])))
+
+    def encode_queries(self, questions, batch_size=64):
+        """Embeddings normalizados (n, dim) de varias preguntas en un solo encode."""
+        return normalize(np.array(self.model.encode(questions, batch_size=batch_size)))
+
+    def search_many(self, q_embs, top_k=3, sources=None, pages=None):
+        """
+        Una sola búsqueda matricial para varias preguntas.
+        Devuelve, por pregunta, la lista de chunks con su 'score'.
+        sources / pages restringen la búsqueda a esos documentos / páginas.
+        """
+        start = time.perf_counter()
+        try:
+            return self._search_many(q_embs, top_k, sources, pages)
+        finally:
+            self._record_first_query(start)
+
+    def _search_many(self, q_embs, top_k, sources, pages):
+        self.index  # carga diferida fuera del lock de lectura
+        with self.lock.read():
+            index = self._index
+            if index.ntotal == 0 or len(q_embs) == 0:
+                return [[] for _ in range(len(q_embs))]
+
+            k = min(top_k, index.ntotal)
+            D, I = self._search(index, np.ascontiguousarray(q_embs, dtype="float32"), k,
+                                self._selection(sources, pages))
+
+            results = []
+            for ids, scores in zip(I.tolist(), D.tolist()):
+                hits = []
+                for idx, score in zip(ids, scores):
+                    chunk = self.metadata.get(idx)
+                    if chunk is not None:
+                        hits.append({**chunk, "id": int(idx), "score": round(float(score), 4)})
+                results.append(hits)
+        return results
+
+    def _selection(self, sources, pages):
+        """Rangos de ids del filtro (None = sin filtro) a partir del ChunkStore."""
+        if sources is None and pages is None:
+            return None
+        return self.metadata.select(sources, pages)
+
+    def _search(self, index, q_embs, k, ranges=None):
+        """
+        Búsqueda en el índice; si guarda códigos comprimidos, trae
+        rerank_factor * k candidatos y los re-ordena con los vectores completos.
+        ranges: rangos de ids permitidos (búsqueda filtrada con IDSelector).
+        """
+        params = None
+        if ranges is not None:
+            n_selected = sum(hi - lo for lo, hi in ranges)
+            if n_selected <= self.filter_exact_max:
+                # pocos chunks: producto interno exacto solo sobre ellos
+                ids = self.metadata.live_ids(ranges)
+                if self.full_vectors.covers(ids):
+                    return index_factory.exact_search(q_embs, ids, self.full_vectors.get(ids), k)
+            params = index_factory.search_params(
+                index, index_factory.id_selector(ranges), self.ef_search, self.nprobe,
+                selectivity=n_selected / max(1, index.ntotal)
+            )
+
+        if self.rerank_factor > 1 and index_factory.index_kind(index) in index_factory.COMPRESSED_KINDS:
+            D, I = index.search(q_embs, min(k * self.rerank_factor, index.ntotal), params=params)
+            if self.full_vectors.covers(I[I >= 0]):
+                return index_factory.rerank(q_embs, I, self.full_vectors.get, k)
+            return D[:, :k], I[:, :k]
+        return index.search(q_embs, k, params=params)
+
+    def vectors(self, hits):
+        """
+        Embeddings normalizados de chunks recuperados (dicts con 'id' y 'text').
+        Se reconstruyen del índice; si el índice no lo permite, salen de la caché.
+        """
+        if not hits:
+            return np.zeros((0, index_factory.EMBEDDING_DIM), dtype="float32")
+        ids = [h["id"] for h in hits]
+        try:
+            with self.lock.read():
+                if self.full_vectors.covers(ids):
+                    return self.full_vectors.get(ids)
+                return normalize(index_factory.reconstruct_ids(self._index, ids))
+        except Exception:
+            return self.encode_cached([h["text"] for h in hits])
+
+    def query(self, question, top_k=3, q_emb=None, sources=None, pages=None):
+        start = time.perf_counter()
+        try:
+            return self._query(question, top_k, q_emb, sources, pages)
+        finally:
+            self._record_first_query(start)
+
+    def _record_first_query(self, start):
+        # /health: latencia de la primera consulta (query o search_many, el de ResponseAgent)
+        if self.load_stats["first_query_ms"] is None:
+            self.load_stats["first_query_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    def _query(self, question, top_k, q_emb=None, sources=None, pages=None):
+        if self.vector_count() == 0:
             print("⚠️ El índice está vacío.")
             return []
 
-        k = min(top_k, self.index.ntotal)
-        q_emb = self.model.encode([question])
-        D, I = self.index.search(np.array(q_emb).astype("float32"), k)
+        # el encode va fuera del lock: no bloquea a los escritores
+        if q_emb is None:
+            q_emb = self.encode_query(question)
+
+        self.index  # carga diferida fuera del lock de lectura
+        with self.lock.read():
+            index = self._index
+            if index.ntotal == 0:
+                return []
+            k = min(top_k, index.ntotal)
+            D, I = self._search(index, q_emb, k, self._selection(sources, pages))
 
-        results = []
-        for idx, dist in zip(I[0], D[0]):
-            if 0 <= idx < len(self.metadata):
-                results.append(self.metadata[idx])
-                print(f"  📄 Resultado distancia={dist:.4f}")
+            results = []
+            for idx, score in zip(I[0].tolist(), D[0]):
+                chunk = self.metadata.get(idx)
+                if chunk is not None:
+                    results.append(chunk)
+                    print(f"  📄 Resultado similitud={score:.4f}")
         return results
@@ -0,0 +1,273 @@
+# analyze_texts/encoders.py
+"""
+Backends de codificación alternativos a SentenceTransformer (fp32 PyTorch):
+
+- OnnxEncoder: MiniLM exportado a ONNX y cuantizado a int8 (ONNX Runtime),
+  con la misma interfaz encode(texts) -> np.ndarray que SentenceTransformer.
+- MicroBatcher: junta las codificaciones concurrentes de preguntas sueltas
+  en un solo batch, esperando como mucho max_wait_ms.
+
+Los dos son opcionales (EMBEDDING_BACKEND=onnx, QUERY_MICROBATCH=1): el
+speedup del int8, su acuerdo con fp32 y el balance latencia/throughput del
+micro-batching no se han medido aún; `benchmark` da esas cifras.
+
+    python -m analyze_texts.encoders export       # genera onnx_models/<modelo>/
+    python -m analyze_texts.encoders benchmark    # frases/s y acuerdo coseno vs fp32
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from analyze_texts.concurrency import thread_budget
+from analyze_texts.model_registry import DEFAULT_MODEL_NAME
+
+BACKENDS = ("torch", "onnx")
+
+
+def onnx_model_dir(model_name):
+    root = os.environ.get("ONNX_MODEL_DIR", "onnx_models")
+    return os.path.join(root, model_name.replace("/", "__"))
+
+
+def export_onnx(model_name=DEFAULT_MODEL_NAME, out_dir=None, quantize=True, opset=14):
+    """
+    Exporta el transformer a ONNX (y su versión int8 con cuantización dinámica).
+    Paso de build: necesita torch y transformers; el runtime solo onnxruntime.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    out_dir = out_dir or onnx_model_dir(model_name)
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    tokenizer.save_pretrained(out_dir)  # deja tokenizer.json para `tokenizers`
+    model = AutoModel.from_pretrained(model_name).eval()
+
+    dummy = tokenizer(["hola mundo"], return_tensors="pt")
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in dummy]
+    axes = {n: {0: "batch", 1: "seq"} for n in names}
+    axes["last_hidden_state"] = {0: "batch", 1: "seq"}
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(dummy[n] for n in names), fp32_path,
+            input_names=names, output_names=["last_hidden_state"],
+            dynamic_axes=axes, opset_version=opset, dynamo=False,
+        )
+    print(f"📦 Modelo ONNX exportado: {fp32_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        int8_path = os.path.join(out_dir, "model.int8.onnx")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        print(f"📦 Modelo int8 cuantizado: {int8_path}")
+    return out_dir
+
+
+class OnnxEncoder:
+    """
+    MiniLM en ONNX Runtime: tokenizers + sesión ONNX + mean pooling + L2,
+    equivalente al pipeline de sentence-transformers para all-MiniLM-L6-v2.
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL_NAME, model_dir=None, quantized=True,
+                 max_length=256, threads=None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        self.quantized = quantized
+        self.device = "cpu"
+        model_dir = model_dir or onnx_model_dir(model_name)
+        path = os.path.join(model_dir, "model.int8.onnx" if quantized else "model.onnx")
+        if not os.path.exists(path):
+            print(f"⏳ No existe {path}: exportando el modelo a ONNX...")
+            export_onnx(model_name, model_dir, quantize=quantized)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads or thread_budget()
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.enable_padding()
+
+    def _encode_batch(self, texts):
+        encoded = self.tokenizer.encode_batch(texts)
+        ids = np.array([e.ids for e in encoded], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+        feeds = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encoded], dtype=np.int64)
+        hidden = self.session.run(None, feeds)[0]
+
+        weights = mask[..., None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def encode(self, texts, batch_size=64, show_progress_bar=False, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+        if not texts:
+            return np.zeros((0, 384), dtype=np.float32)
+        # ordenar por longitud reduce el padding dentro de cada batch
+        order = np.argsort([len(t) for t in texts])
+        parts = []
+        for i in range(0, len(texts), batch_size):
+            parts.append(self._encode_batch([texts[j] for j in order[i:i + batch_size]]))
+        out = np.vstack(parts)
+        result = np.empty_like(out)
+        result[order] = out
+        return result.astype(np.float32)
+
+
+class MicroBatcher:
+    """
+    Junta encodes pequeños y concurrentes (una pregunta por petición) en un
+    único forward: el primero espera como mucho max_wait_ms a que lleguen
+    más, hasta max_batch textos. Los encodes grandes pasan directos.
+    """
+
+    def __init__(self, encoder, max_batch=None, max_wait_ms=None):
+        if max_batch is None:
+            max_batch = int(os.environ.get("QUERY_BATCH_SIZE", 32))
+        if max_wait_ms is None:
+            max_wait_ms = float(os.environ.get("QUERY_BATCH_WAIT_MS", 2))
+        self.encoder = encoder
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    @property
+    def device(self):
+        return getattr(self.encoder, "device", "cpu")
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="query-microbatch", daemon=True)
+                    self._thread.start()
+
+    def encode(self, texts, **kwargs):
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        if len(texts) >= self.max_batch:
+            return self.encoder.encode(texts, **kwargs)
+        future = Future()
+        self._ensure_thread()
+        self._queue.put((texts, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            texts, future = self._queue.get()
+            pending = [(texts, future)]
+            size = len(texts)
+            deadline = time.perf_counter() + self.max_wait
+            while size < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    texts, future = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                pending.append((texts, future))
+                size += len(texts)
+
+            batch = [t for texts, _ in pending for t in texts]
+            try:
+                vectors = np.asarray(self.encoder.encode(batch))
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            pos = 0
+            for texts, future in pending:
+                future.set_result(vectors[pos:pos + len(texts)])
+                pos += len(texts)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+
+# ------------------------------------------------------------
+# Benchmark: frases/s y acuerdo coseno con el modelo fp32
+# ------------------------------------------------------------
+def _throughput(encoder, texts, batch_size=64):
+    encoder.encode(texts[:8])  # calentamiento
+    start = time.perf_counter()
+    vectors = np.asarray(encoder.encode(texts, batch_size=batch_size))
+    return vectors, len(texts) / (time.perf_counter() - start)
+
+
+def _concurrent_queries(encoder, texts, threads=16):
+    from concurrent.futures import ThreadPoolExecutor
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda t: encoder.encode([t]), texts))
+    return len(texts) / (time.perf_counter() - start)
+
+
+def benchmark(texts=None, model_name=DEFAULT_MODEL_NAME, n=512):
+    from analyze_texts.model_registry import get_model
+
+    if texts is None:
+        rng = np.random.default_rng(0)
+        words = ("contrato factura cliente proveedor fecha importe pago documento informe "
+                 "resultado análisis riesgo empresa producto servicio anual trimestre").split()
+        texts = [" ".join(rng.choice(words, size=rng.integers(5, 120))) for _ in range(n)]
+
+    baseline = get_model(model_name, backend="torch")
+    base_vectors, base_rate = _throughput(baseline, texts)
+    base_vectors = base_vectors / np.linalg.norm(base_vectors, axis=1, keepdims=True)
+    report = [{"backend": "torch-fp32", "sentences_per_second": round(base_rate, 1)}]
+
+    for quantized in (False, True):
+        encoder = OnnxEncoder(model_name, quantized=quantized)
+        vectors, rate = _throughput(encoder, texts)
+        cosine = (vectors * base_vectors).sum(axis=1)
+        report.append({
+            "backend": "onnx-int8" if quantized else "onnx-fp32",
+            "sentences_per_second": round(rate, 1),
+            "speedup": round(rate / base_rate, 2),
+            "cosine_mean": round(float(cosine.mean()), 5),
+            "cosine_min": round(float(cosine.min()), 5),
+        })
+
+    queries = texts[:256]
+    for name, encoder in (("torch-fp32", baseline), ("onnx-int8", OnnxEncoder(model_name))):
+        report.append({
+            "backend": name,
+            "concurrent_single_queries_per_second": round(_concurrent_queries(encoder, queries), 1),
+            "microbatched_queries_per_second": round(_concurrent_queries(MicroBatcher(encoder), queries), 1),
+        })
+    return report
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "benchmark"
+    if command == "export":
+        export_onnx()
+    else:
+        for row in benchmark():
+            print(json.dumps(row))
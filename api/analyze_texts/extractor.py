@@ -1,59 +1,206 @@
-import fitz  # pip install pymupdf
-import io
-from PIL import Image
-import pytesseract
+import codecs
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from analyze_texts.concurrency import ocr_thread_budget
+from analyze_texts.ocr import OCREngine
+
+IMAGE_EXTENSIONS = ["png", "jpg", "jpeg", "bmp", "tiff"]
+
+
+# Páginas con menos caracteres que esto se consideran imagen y van a OCR
+OCR_MIN_CHARS = 50
+
+# Los .txt se leen en bloques de este tamaño (caracteres), cortados en un espacio
+TXT_BLOCK_CHARS = int(os.environ.get("TXT_BLOCK_CHARS", 1 << 20))
+TXT_ENCODINGS = ["utf-8", "latin-1", "iso-8859-1", "cp1252"]
+
+
+def _extract_page_range(file_path, start, end, ocr_config=None):
+    """
+    Worker: abre su propio documento fitz y extrae las páginas [start, end).
+    Las páginas con poco texto se pasan juntas por OCR concurrente.
+    Devuelve ([(page_num, texto)], stats_ocr). Una página que falla queda
+    vacía sin tumbar el resto del rango.
+    """
+    import fitz  # pip install pymupdf
+    # cada Tesseract con un solo hilo: el paralelismo ya lo dan los procesos
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    ocr = OCREngine(**(ocr_config or {}))
+    pages = {}
+    ocr_pages = []
+    ocr_images = []
+    doc = fitz.open(file_path)
+    try:
+        for page_num in range(start, end):
+            try:
+                page = doc.load_page(page_num)
+                # First try to extract text directly
+                page_text = page.get_text("text").strip()
+                pages[page_num] = page_text
+
+                # If no text or very little text, queue the page image for OCR
+                if not page_text or len(page_text) < OCR_MIN_CHARS:
+                    ocr_pages.append(page_num)
+                    ocr_images.append(ocr.render_page(page))
+            except Exception as e:
+                print(f"Error extrayendo página {page_num + 1} de {file_path}: {e}")
+                pages.setdefault(page_num, "")
+    finally:
+        doc.close()
+
+    for page_num, ocr_text in zip(ocr_pages, ocr.ocr_many(ocr_images)):
+        if ocr_text.strip():
+            pages[page_num] = ocr_text
+
+    return [(n, pages.get(n, "")) for n in range(start, end)], ocr.stats()
+
+
+def _extract_single_file(file_path, ocr_config=None):
+    """Worker para formatos que no se dividen por páginas (imágenes)."""
+    extractor = Extractor(max_workers=1, ocr=OCREngine(**(ocr_config or {})))
+    return extractor.extract(file_path), extractor.ocr.stats()
+
 
 class Extractor:
-    def __init__(self):
+    def __init__(self, max_workers=None, pages_per_task=16, ocr=None):
         # Initialize Tesseract path if needed (uncomment and set your path if necessary)
         # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-        pass
-
-    def extract_pdf(self, file_path):
-        text = ""
-        doc = fitz.open(file_path)
-        
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            
-            # First try to extract text directly
-            page_text = page.get_text("text").strip()
-            
-            # If no text or very little text, try OCR on the page image
-            if not page_text or len(page_text) < 50:  # Threshold for considering a page as image-based
-                try:
-                    # Render page to an image
-                    pix = page.get_pixmap()
-                    img = Image.open(io.BytesIO(pix.tobytes()))
-                    # Use Tesseract to do OCR on the image
-                    page_text = pytesseract.image_to_string(img, lang='spa+eng')
-                except Exception as e:
-                    print(f"Error during OCR on page {page_num + 1}: {e}")
-            
-            if page_text:
-                text += page_text + "\n\n"
-        
-        return text.strip()
+        if max_workers is None:
+            max_workers = int(os.environ.get("EXTRACTOR_WORKERS", os.cpu_count() or 1))
+        self.max_workers = max(1, max_workers)
+        self.pages_per_task = max(1, pages_per_task)
+        # max_workers del OCR = hilos en este proceso; los workers del pool
+        # reciben su parte de OCR_THREADS (ver _ocr_config)
+        self.ocr = ocr or OCREngine(
+            dpi=int(os.environ.get("OCR_DPI", 200)),
+            max_workers=ocr_thread_budget(),
+        )
+        self._pool = None
+
+    # ------------------------------------------------------------
+    # Pool de procesos (se crea una vez y se reutiliza)
+    # ------------------------------------------------------------
+    def _get_pool(self):
+        if self._pool is None:
+            # spawn: los workers no heredan el estado de torch/faiss del padre
+            ctx = multiprocessing.get_context("spawn")
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx)
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def _ocr_config(self, processes):
+        """Config del OCR para `processes` procesos a la vez, con el presupuesto repartido."""
+        config = self.ocr.config()
+        config["max_workers"] = max(1, min(config["max_workers"], ocr_thread_budget(processes)))
+        return config
+
+    def _page_ranges(self, page_count):
+        for start in range(0, page_count, self.pages_per_task):
+            yield start, min(start + self.pages_per_task, page_count)
+
+    def iter_pages(self, file_path, stats=None):
+        """
+        Genera (page_num, texto) en orden sin tener el documento entero en memoria.
+        Los PDF se extraen por rangos de páginas en el pool, con como mucho
+        2 * max_workers rangos en vuelo. Los .txt son una sola página (0) que
+        llega en bloques de TXT_BLOCK_CHARS; las imágenes, una sola página.
+        `stats` (dict) acumula páginas y aciertos de la caché OCR.
+        """
+        if stats is None:
+            stats = {}
+        for key in ("pages", "ocr_cache_hits", "ocr_cache_misses"):
+            stats.setdefault(key, 0)
+        def collect(result):
+            pages, ocr_stats = result
+            stats["ocr_cache_hits"] += ocr_stats["ocr_cache_hits"]
+            stats["ocr_cache_misses"] += ocr_stats["ocr_cache_misses"]
+            stats["pages"] += len(pages)
+            return pages
+
+        ext = file_path.split('.')[-1].lower()
+        if ext == "txt":
+            stats["pages"] += 1
+            for block in self.iter_txt(file_path):
+                yield 0, block
+            return
+        if ext != "pdf":
+            text, ocr_stats = _extract_single_file(file_path, self._ocr_config(1))
+            yield from collect(([(0, text)], ocr_stats))
+            return
+
+        import fitz  # pip install pymupdf
+        with fitz.open(file_path) as doc:
+            page_count = len(doc)
+        ranges = list(self._page_ranges(page_count))
+
+        if self.max_workers == 1 or len(ranges) <= 1:
+            ocr_config = self._ocr_config(1)
+            for start, end in ranges:
+                yield from collect(_extract_page_range(file_path, start, end, ocr_config))
+            return
+
+        ocr_config = self._ocr_config(min(self.max_workers, len(ranges)))
+        pool = self._get_pool()
+        window = deque()
+        pending = iter(ranges)
+        for start, end in islice(pending, 2 * self.max_workers):
+            window.append(pool.submit(_extract_page_range, file_path, start, end, ocr_config))
+        while window:
+            pages = collect(window.popleft().result())
+            for start, end in islice(pending, 1):
+                window.append(pool.submit(_extract_page_range, file_path, start, end, ocr_config))
+            yield from pages
+
+    def _txt_encoding(self, file_path):
+        """Primera codificación de TXT_ENCODINGS que decodifica el archivo entero (leído por bloques)."""
+        for encoding in TXT_ENCODINGS:
+            decoder = codecs.getincrementaldecoder(encoding)()
+            try:
+                with open(file_path, "rb") as f:
+                    for block in iter(lambda: f.read(TXT_BLOCK_CHARS), b""):
+                        decoder.decode(block)
+                decoder.decode(b"", final=True)
+                return encoding
+            except UnicodeDecodeError:
+                continue
+        raise ValueError(f"No se pudo leer el archivo con ningun encoding: {file_path}")
+
+    def iter_txt(self, file_path, block_chars=TXT_BLOCK_CHARS):
+        """
+        Genera el texto de un .txt en bloques de ~block_chars. Cada corte se
+        hace en el último espacio del bloque, así normalizar los bloques y
+        unirlos con un espacio (como hace el Chunker) da el mismo texto que
+        normalizar el archivo entero.
+        """
+        encoding = self._txt_encoding(file_path)
+        tail = ""
+        with open(file_path, "r", encoding=encoding) as f:
+            for block in iter(lambda: f.read(block_chars), ""):
+                text = tail + block
+                cut = max(text.rfind(c) for c in " \n\t\r")
+                if cut <= 0:
+                    # bloque sin espacios: se corta donde cae
+                    cut = len(text)
+                tail = text[cut:]
+                yield text[:cut]
+        if tail:
+            yield tail
 
     def extract_txt(self, file_path):
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                return f.read()
-        except UnicodeDecodeError:
-            # Try with different encodings if UTF-8 fails
-            encodings = ['latin-1', 'iso-8859-1', 'cp1252']
-            for encoding in encodings:
-                try:
-                    with open(file_path, "r", encoding=encoding) as f:
-                        return f.read()
-                except:
-                    continue
-            raise ValueError(f"No se pudo leer el archivo con ningun encoding: {file_path}")
+        return "".join(self.iter_txt(file_path))
 
     def extract_image(self, file_path):
+        from PIL import Image
         try:
             img = Image.open(file_path)
-            return pytesseract.image_to_string(img, lang='spa+eng')
+            return self.ocr.ocr_image(img)
         except Exception as e:
             print(f"Error al procesar imagen {file_path}: {e}")
             return ""
@@ -62,10 +209,11 @@ class Extractor:
         try:
             ext = file_path.split('.')[-1].lower()
             if ext == "pdf":
-                return self.extract_pdf(file_path)
+                pages = self.iter_pages(file_path)
+                return "".join(text + "\n\n" for _, text in pages if text).strip()
             elif ext == "txt":
                 return self.extract_txt(file_path)
-            elif ext in ["png", "jpg", "jpeg", "bmp", "tiff"]:
+            elif ext in IMAGE_EXTENSIONS:
                 return self.extract_image(file_path)
             else:
                 raise ValueError(f"Formato no soportado: {ext}")
@@ -0,0 +1,66 @@
+# analyze_texts/import_budget.py
+"""
+Mide el tiempo de import en frío de los módulos de la app y falla (exit 1)
+si se pasa del presupuesto o si alguno arrastra dependencias pesadas.
+
+    python -m analyze_texts.import_budget            # desde api/
+    IMPORT_BUDGET_SECONDS=0.8 python -m analyze_texts.import_budget app
+    python -m pytest tests/test_import_budget.py     # desde la raíz, como test
+"""
+import json
+import os
+import subprocess
+import sys
+
+DEFAULT_MODULES = ["analyze_texts.controller", "app"]
+DEFAULT_BUDGET_SECONDS = float(os.environ.get("IMPORT_BUDGET_SECONDS", 1.5))
+
+# Solo deben importarse cuando se usa la etapa correspondiente
+HEAVY_MODULES = ["torch", "sentence_transformers", "faiss", "fitz", "pytesseract", "PIL", "groq"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"seconds": elapsed, "heavy": heavy}}))
+"""
+
+
+def measure(module, cwd=None):
+    """Importa `module` en un intérprete nuevo (import en frío)."""
+    env = dict(os.environ, EMBEDDINGS_WARMUP="0")
+    proc = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=cwd, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {module}: {proc.stderr.strip()}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def check(modules=DEFAULT_MODULES, budget=DEFAULT_BUDGET_SECONDS, cwd=None):
+    """Devuelve (ok, reporte) para los módulos indicados."""
+    report = []
+    ok = True
+    for module in modules:
+        result = measure(module, cwd=cwd)
+        within = result["seconds"] <= budget and not result["heavy"]
+        ok = ok and within
+        report.append({
+            "module": module,
+            "seconds": round(result["seconds"], 3),
+            "budget": budget,
+            "heavy_imported": result["heavy"],
+            "ok": within,
+        })
+    return ok, report
+
+
+if __name__ == "__main__":
+    api_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ok, report = check(sys.argv[1:] or DEFAULT_MODULES, cwd=api_dir)
+    for row in report:
+        print(json.dumps(row))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,390 @@
+# analyze_texts/index_factory.py
+import os
+import time
+import faiss
+import numpy as np
+
+EMBEDDING_DIM = 384
+INDEX_KINDS = ("flat", "hnsw", "ivf", "ivfpq", "sq8", "pq")
+# guardan códigos comprimidos: conviene re-rankear con los vectores completos
+COMPRESSED_KINDS = ("ivfpq", "sq8", "pq")
+
+# Umbrales de selección automática por tamaño del corpus
+HNSW_MIN_VECTORS = int(os.environ.get("HNSW_MIN_VECTORS", 20_000))
+IVFPQ_MIN_VECTORS = int(os.environ.get("IVFPQ_MIN_VECTORS", 500_000))
+
+# Parámetros de construcción / búsqueda
+HNSW_M = 32
+PQ_M = 48  # subcuantizadores (384 / 48 = 8 dims por código)
+# sq8 ajusta el rango de cada dimensión a los vectores de entrenamiento y
+# recorta lo que cae fuera: con un solo lote de la ingesta el rango es estrecho
+SQ8_MIN_TRAIN_VECTORS = int(os.environ.get("SQ8_MIN_TRAIN_VECTORS", 5_000))
+DEFAULT_EF_SEARCH = int(os.environ.get("FAISS_EF_SEARCH", 64))
+DEFAULT_NPROBE = int(os.environ.get("FAISS_NPROBE", 16))
+
+
+def normalize(vectors):
+    """L2-normaliza en el sitio para que el producto interno sea similitud coseno."""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def choose_kind(n_vectors):
+    if n_vectors >= IVFPQ_MIN_VECTORS:
+        return "ivfpq"
+    if n_vectors >= HNSW_MIN_VECTORS:
+        return "hnsw"
+    return "flat"
+
+
+def suggest_nlist(n_vectors):
+    # regla habitual: ~4*sqrt(N) listas, acotado
+    return int(min(65536, max(16, 4 * np.sqrt(max(n_vectors, 1)))))
+
+
+def min_train_vectors(kind, n_vectors):
+    if kind in ("ivf", "ivfpq"):
+        # faiss recomienda al menos ~39 puntos por centroide
+        return suggest_nlist(n_vectors) * 39
+    if kind == "pq":
+        # 256 centroides por subcuantizador
+        return 256 * 39
+    if kind == "sq8":
+        return SQ8_MIN_TRAIN_VECTORS
+    return 0
+
+
+def _sq8_range_vectors(dim):
+    # sin datos: rango fijo [-1, 1], válido para cualquier vector normalizado
+    return np.vstack([-np.ones(dim), np.ones(dim)]).astype("float32")
+
+
+def build_index(kind="flat", dim=EMBEDDING_DIM, train_vectors=None):
+    """
+    Crea un índice de producto interno (vectores normalizados) con ids propios.
+    Los índices IVF necesitan train_vectors.
+    """
+    if kind == "flat":
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+
+    if kind == "hnsw":
+        return faiss.IndexIDMap2(
+            faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        )
+
+    if kind == "sq8":
+        # int8 por componente: 4x menos memoria que float32
+        base = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+        if train_vectors is None or len(train_vectors) == 0:
+            train_vectors = _sq8_range_vectors(dim)
+        base.train(np.ascontiguousarray(train_vectors, dtype="float32"))
+        return faiss.IndexIDMap2(base)
+
+    if kind == "pq":
+        if train_vectors is None or len(train_vectors) == 0:
+            raise ValueError("El índice pq necesita vectores de entrenamiento")
+        # PQ_M bytes por vector (48 frente a 1536 en float32)
+        base = faiss.IndexPQ(dim, PQ_M, 8, faiss.METRIC_INNER_PRODUCT)
+        base.train(np.ascontiguousarray(train_vectors, dtype="float32"))
+        return faiss.IndexIDMap2(base)
+
+    if kind in ("ivf", "ivfpq"):
+        if train_vectors is None or len(train_vectors) == 0:
+            raise ValueError(f"El índice {kind} necesita vectores de entrenamiento")
+        nlist = suggest_nlist(len(train_vectors))
+        quantizer = faiss.IndexFlatIP(dim)
+        if kind == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, PQ_M, 8, faiss.METRIC_INNER_PRODUCT)
+        index.train(np.ascontiguousarray(train_vectors, dtype="float32"))
+        # los IVF manejan ids de forma nativa; el mapa directo permite reconstruct()
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return index
+
+    raise ValueError(f"Tipo de índice no soportado: {kind}")
+
+
+def index_kind(index):
+    base = index.index if isinstance(index, faiss.IndexIDMap2) else index
+    base = faiss.downcast_index(base)
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(base, faiss.IndexIVF):
+        return "ivf"
+    if isinstance(base, faiss.IndexScalarQuantizer):
+        return "sq8"
+    if isinstance(base, faiss.IndexPQ):
+        return "pq"
+    return "flat"
+
+
+def index_bytes(index):
+    """Tamaño serializado del índice (≈ memoria que ocupa cargado)."""
+    return int(faiss.serialize_index(index).size)
+
+
+def is_inner_product(index):
+    return index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+
+def supports_remove(index):
+    # HNSW no permite borrar vectores: hay que reconstruir el índice
+    return index_kind(index) != "hnsw"
+
+
+def set_search_params(index, ef_search=None, nprobe=None):
+    kind = index_kind(index)
+    if kind == "hnsw":
+        base = faiss.downcast_index(index.index)
+        base.hnsw.efSearch = ef_search or DEFAULT_EF_SEARCH
+    elif kind in ("ivf", "ivfpq"):
+        faiss.extract_index_ivf(index).nprobe = nprobe or DEFAULT_NPROBE
+
+
+def id_selector(ranges):
+    """
+    IDSelector de FAISS para rangos de ids [inicio, fin): un IDSelectorRange
+    si es uno solo (lo habitual con un documento), si no un IDSelectorBatch.
+    """
+    if len(ranges) == 1:
+        return faiss.IDSelectorRange(*ranges[0])
+    ids = np.concatenate([np.arange(lo, hi, dtype="int64") for lo, hi in ranges])
+    return faiss.IDSelectorBatch(ids)
+
+
+def search_params(index, selector, ef_search=None, nprobe=None, selectivity=1.0):
+    """
+    SearchParameters del tipo que espera cada índice, con el selector.
+    HNSW e IVF recorren el grafo / las listas igual pero solo cuentan los ids
+    del filtro: efSearch y nprobe crecen con la inversa de la fracción
+    seleccionada (efSearch hasta 1024, nprobe hasta todas las listas).
+    """
+    boost = 1 / max(selectivity, 1e-6)
+    kind = index_kind(index)
+    if kind == "hnsw":
+        ef = ef_search or DEFAULT_EF_SEARCH
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=int(min(1024, ef * boost)))
+    if kind in ("ivf", "ivfpq"):
+        nlist = faiss.extract_index_ivf(index).nlist
+        nprobe = nprobe or DEFAULT_NPROBE
+        return faiss.SearchParametersIVF(sel=selector, nprobe=int(min(nlist, nprobe * boost)))
+    return faiss.SearchParameters(sel=selector)
+
+
+def rerank(query_vectors, candidate_ids, full_vectors, k):
+    """
+    Re-ordena candidatos de un índice comprimido con el producto interno exacto.
+    full_vectors(ids) -> (n, dim) float32. Devuelve (D, I) de forma (nq, k).
+    """
+    nq = len(query_vectors)
+    D = np.full((nq, k), -np.inf, dtype="float32")
+    I = np.full((nq, k), -1, dtype="int64")
+    for q in range(nq):
+        ids = candidate_ids[q][candidate_ids[q] >= 0]
+        if len(ids) == 0:
+            continue
+        scores = full_vectors(ids) @ query_vectors[q]
+        order = np.argsort(-scores)[:k]
+        D[q, :len(order)] = scores[order]
+        I[q, :len(order)] = ids[order]
+    return D, I
+
+
+def exact_search(query_vectors, ids, vectors, k):
+    """Top-k por producto interno exacto entre las filas `vectors` (con ids `ids`)."""
+    nq = len(query_vectors)
+    D = np.full((nq, k), -np.inf, dtype="float32")
+    I = np.full((nq, k), -1, dtype="int64")
+    if len(ids) == 0:
+        return D, I
+    scores = query_vectors @ vectors.T
+    n = min(k, len(ids))
+    top = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+    for q in range(nq):
+        order = top[q][np.argsort(-scores[q, top[q]])]
+        D[q, :n] = scores[q, order]
+        I[q, :n] = ids[order]
+    return D, I
+
+
+def reconstruct_ids(index, ids):
+    """Recupera los vectores (aproximados en PQ) de una lista de ids."""
+    if len(ids) == 0:
+        return np.zeros((0, index.d), dtype="float32")
+    return np.vstack([index.reconstruct(int(i)) for i in ids]).astype("float32")
+
+
+def rebuild_index(index, ids, kind, ef_search=None, nprobe=None, vectors=None):
+    """
+    Construye un índice nuevo del tipo pedido con los vectores de `ids`.
+    vectors: los vectores completos si se tienen (reconstruir desde un índice
+    comprimido pierde precisión).
+    """
+    ids = np.asarray(ids, dtype="int64")
+    if vectors is None:
+        vectors = reconstruct_ids(index, ids)
+    vectors = normalize(vectors)
+    needs_training = kind in ("ivf", "ivfpq", "sq8", "pq")
+    new_index = build_index(kind, index.d, train_vectors=vectors if needs_training else None)
+    if len(ids):
+        new_index.add_with_ids(vectors, ids)
+    set_search_params(new_index, ef_search, nprobe)
+    return new_index
+
+
+# ------------------------------------------------------------
+# Reporte recall vs latencia contra el índice plano exacto
+# ------------------------------------------------------------
+def benchmark_indexes(vectors, queries=None, kinds=INDEX_KINDS, k=10,
+                      ef_search_values=(16, 64, 256), nprobe_values=(1, 8, 32), rerank_factor=4):
+    """
+    Compara cada tipo de índice con el plano exacto sobre los mismos vectores.
+    Devuelve una lista de dicts con recall@k, latencia media por consulta y
+    bytes por vector; los índices comprimidos se miden también con re-rank
+    exacto de rerank_factor * k candidatos.
+    """
+    vectors = normalize(vectors)
+    if queries is None:
+        rng = np.random.default_rng(0)
+        take = min(200, len(vectors))
+        queries = vectors[rng.choice(len(vectors), take, replace=False)]
+    queries = normalize(queries)
+    ids = np.arange(len(vectors), dtype="int64")
+    k = min(k, len(vectors))
+
+    exact = build_index("flat", vectors.shape[1])
+    exact.add_with_ids(vectors, ids)
+    _, truth = exact.search(queries, k)
+
+    report = []
+    for kind in kinds:
+        if len(vectors) < min_train_vectors(kind, len(vectors)):
+            report.append({"index": kind, "skipped": "pocos vectores para entrenar"})
+            continue
+
+        start = time.perf_counter()
+        index = build_index(kind, vectors.shape[1], train_vectors=vectors)
+        index.add_with_ids(vectors, ids)
+        build_seconds = time.perf_counter() - start
+        bytes_per_vector = round(index_bytes(index) / len(vectors), 1)
+
+        if kind == "hnsw":
+            settings = [{"ef_search": v} for v in ef_search_values]
+        elif kind in ("ivf", "ivfpq"):
+            settings = [{"nprobe": v} for v in nprobe_values]
+        else:
+            settings = [{}]
+
+        rerank_options = [1, rerank_factor] if kind in COMPRESSED_KINDS and rerank_factor > 1 else [1]
+        for params in settings:
+            set_search_params(index, **params)
+            for factor in rerank_options:
+                start = time.perf_counter()
+                _, found = index.search(queries, min(k * factor, len(vectors)))
+                if factor > 1:
+                    _, found = rerank(queries, found, lambda i: vectors[i], k)
+                elapsed = time.perf_counter() - start
+
+                hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+                report.append({
+                    "index": kind,
+                    **params,
+                    "rerank": factor if factor > 1 else None,
+                    "recall_at_k": round(hits / (len(queries) * k), 4),
+                    "ms_per_query": round(elapsed * 1000 / len(queries), 4),
+                    "bytes_per_vector": bytes_per_vector,
+                    "build_seconds": round(build_seconds, 3),
+                })
+    return report
+
+
+def benchmark_filtered(vectors, n_docs=500, kinds=("flat", "hnsw", "ivf"), k=10, n_queries=200):
+    """
+    Búsqueda limitada a un documento frente a la búsqueda sin filtro, con los
+    ids repartidos en n_docs documentos contiguos (como en el ChunkStore).
+    Compara el IDSelector de cada índice, el producto interno exacto sobre los
+    vectores del documento y filtrar el top-k global a posteriori.
+    """
+    vectors = normalize(vectors)
+    n = len(vectors)
+    ids = np.arange(n, dtype="int64")
+    bounds = np.linspace(0, n, n_docs + 1).astype("int64")
+    rng = np.random.default_rng(0)
+    docs = rng.integers(0, n_docs, size=n_queries)
+    queries = normalize(vectors[rng.choice(n, n_queries, replace=False)] +
+                        0.1 * rng.standard_normal((n_queries, vectors.shape[1])).astype("float32"))
+
+    truth = []
+    start = time.perf_counter()
+    for q, d in zip(queries, docs):
+        lo, hi = int(bounds[d]), int(bounds[d + 1])
+        _, found = exact_search(q[None], ids[lo:hi], vectors[lo:hi], k)
+        truth.append(set(found[0][found[0] >= 0].tolist()))
+    exact_ms = (time.perf_counter() - start) * 1000 / n_queries
+
+    report = [{"index": "exact-subset", "docs": n_docs, "ms_per_query": round(exact_ms, 4), "recall_at_k": 1.0}]
+    for kind in kinds:
+        if n < min_train_vectors(kind, n):
+            report.append({"index": kind, "skipped": "pocos vectores para entrenar"})
+            continue
+        index = build_index(kind, vectors.shape[1], train_vectors=vectors)
+        index.add_with_ids(vectors, ids)
+        set_search_params(index)
+
+        start = time.perf_counter()
+        _, unfiltered = index.search(queries, k)
+        unfiltered_ms = (time.perf_counter() - start) * 1000 / n_queries
+
+        found = []
+        start = time.perf_counter()
+        for q, d in zip(queries, docs):
+            lo, hi = int(bounds[d]), int(bounds[d + 1])
+            params = search_params(index, id_selector([(lo, hi)]), selectivity=(hi - lo) / n)
+            found.append(index.search(q[None], k, params=params)[1][0])
+        filtered_ms = (time.perf_counter() - start) * 1000 / n_queries
+
+        filtered_hits = sum(len(set(f.tolist()) & t) for f, t in zip(found, truth))
+        post_hits = sum(len(set(row.tolist()) & t) for row, t in zip(unfiltered, truth))
+
+        total = sum(len(t) for t in truth)
+        report.append({
+            "index": kind,
+            "docs": n_docs,
+            "unfiltered_ms_per_query": round(unfiltered_ms, 4),
+            "filtered_ms_per_query": round(filtered_ms, 4),
+            "filtered_recall_at_k": round(filtered_hits / total, 4),
+            "post_filter_recall_at_k": round(post_hits / total, 4),
+        })
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Recall vs latencia de los tipos de índice FAISS")
+    parser.add_argument("--index", default="faiss.index", help="índice guardado a evaluar")
+    parser.add_argument("--synthetic", type=int, default=0, help="usar N vectores aleatorios")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--filtered", type=int, default=0, help="comparar búsqueda filtrada en N documentos")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        data = np.random.default_rng(0).standard_normal((args.synthetic, EMBEDDING_DIM)).astype("float32")
+    else:
+        saved = faiss.read_index(args.index)
+        if isinstance(saved, faiss.IndexIDMap2):
+            data = saved.index.reconstruct_n(0, saved.ntotal)
+        else:
+            data = saved.reconstruct_n(0, saved.ntotal)
+
+    if args.filtered:
+        rows = benchmark_filtered(data, n_docs=args.filtered, k=args.k)
+    else:
+        rows = benchmark_indexes(data, k=args.k)
+    for row in rows:
+        print(json.dumps(row))
@@ -0,0 +1,213 @@
+# analyze_texts/jobs.py
+import json
+import os
+import re
+import socket
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+
+class JobManager:
+    """
+    Trabajos de indexado en segundo plano sobre un executor acotado.
+    Cada trabajo guarda su estado y el avance por etapa para poder
+    consultarlo (polling) mientras se ejecuta.
+
+    El estado se escribe también en jobs_dir/<id>.json: con varios workers de
+    gunicorn, GET /jobs/<id> puede llegar a un worker que no lanzó el trabajo.
+
+    Cada trabajo pertenece a una colección (namespace): get() y list() solo
+    devuelven los de la colección pedida, así una sesión no ve los resultados
+    de otra aunque tenga el id.
+    """
+
+    def __init__(self, max_workers=None, max_jobs=200, jobs_dir=None):
+        if max_workers is None:
+            max_workers = int(os.environ.get("INDEX_JOB_WORKERS", 1))
+        if jobs_dir is None:
+            jobs_dir = os.environ.get("JOBS_DIR", "jobs")
+        self.max_jobs = max_jobs
+        self.jobs_dir = jobs_dir
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="index-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def submit(self, kind, fn, *args, namespace=None, **kwargs):
+        """
+        Encola fn(job, *args, **kwargs) en la colección `namespace` y devuelve
+        el id del trabajo. fn recibe el propio job para poder llamar a job.update(...).
+        """
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        job = Job(kind, namespace=namespace)
+        job.path = self._path(job.id)
+        job.save()
+        with self._lock:
+            self._jobs[job.id] = job
+            # olvidar los trabajos terminados más antiguos
+            while len(self._jobs) > self.max_jobs:
+                oldest_id, oldest = next(iter(self._jobs.items()))
+                if oldest.status in ("queued", "running"):
+                    break
+                del self._jobs[oldest_id]
+        self._prune()
+        self._executor.submit(job.run, fn, *args, **kwargs)
+        return job.id
+
+    def _prune(self):
+        """Borra del disco los trabajos terminados más antiguos por encima de max_jobs."""
+        stored = self._stored()
+        for job in stored[:max(0, len(stored) - self.max_jobs)]:
+            if job.status not in ("queued", "running"):
+                try:
+                    os.remove(self._path(job.id))
+                except OSError:
+                    pass
+
+    def _stored(self):
+        """Trabajos guardados en disco (de cualquier worker), del más antiguo al más nuevo."""
+        jobs = []
+        if not os.path.isdir(self.jobs_dir):
+            return jobs
+        for name in os.listdir(self.jobs_dir):
+            job_id, ext = os.path.splitext(name)
+            if ext == ".json" and _JOB_ID.fullmatch(job_id):
+                job = Job.load(self._path(job_id))
+                if job is not None:
+                    jobs.append(job)
+        return sorted(jobs, key=lambda j: j.created_at)
+
+    def get(self, job_id, namespace=None):
+        """Trabajo de la colección `namespace` (None si no existe o es de otra)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and _JOB_ID.fullmatch(job_id or ""):
+            job = Job.load(self._path(job_id))
+        if job is None or job.namespace != namespace:
+            return None
+        return job
+
+    def list(self, namespace=None):
+        with self._lock:
+            local = {job_id: job for job_id, job in self._jobs.items()}
+        jobs = [local.pop(j.id, j) for j in self._stored()] + list(local.values())
+        return [
+            job.to_dict(include_result=False) for job in jobs if job.namespace == namespace
+        ][-self.max_jobs:]
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+class Job:
+    def __init__(self, kind, namespace=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        # colección dueña del trabajo (no se devuelve en to_dict)
+        self.namespace = namespace
+        self.status = "queued"
+        self.stage = None
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # worker que lo ejecuta: un trabajo "running" de un proceso muerto es un error
+        self.host = socket.gethostname()
+        self.pid = os.getpid()
+        self.path = None
+        self._lock = threading.Lock()
+
+    def update(self, stage=None, **progress):
+        with self._lock:
+            if stage:
+                self.stage = stage
+            self.progress.update(progress)
+        self.save()
+
+    def run(self, fn, *args, **kwargs):
+        self.status = "running"
+        self.started_at = time.time()
+        self.save()
+        try:
+            self.result = fn(self, *args, **kwargs)
+            self.status = "done"
+        except Exception as e:
+            print(f"❌ Error en trabajo {self.id}: {e}")
+            traceback.print_exc()
+            self.error = str(e)
+            self.status = "error"
+        finally:
+            self.finished_at = time.time()
+            self.save()
+
+    # ------------------------------------------------------------
+    # Persistencia (JSON con escritura atómica)
+    # ------------------------------------------------------------
+    def save(self):
+        if self.path is None:
+            return
+        data = self.to_dict()
+        data.update(host=self.host, pid=self.pid, namespace=self.namespace)
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+        os.replace(tmp, self.path)
+
+    @classmethod
+    def load(cls, path):
+        """Job de solo lectura desde el JSON de otro worker (None si no existe)."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        job = cls(data["kind"], namespace=data.get("namespace"))
+        job.id = data["job_id"]
+        for key in ("status", "stage", "progress", "result", "error", "created_at", "started_at",
+                    "finished_at", "host", "pid"):
+            setattr(job, key, data.get(key))
+        if job.status in ("queued", "running") and not job._worker_alive():
+            job.status = "error"
+            job.error = "El worker que ejecutaba el trabajo terminó antes de acabarlo"
+        return job
+
+    def _worker_alive(self):
+        if self.host != socket.gethostname():
+            return True
+        try:
+            os.kill(self.pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            pass
+        return True
+
+    def to_dict(self, include_result=True):
+        with self._lock:
+            data = {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": dict(self.progress),
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+        if self.started_at:
+            end = self.finished_at or time.time()
+            data["elapsed_seconds"] = round(end - self.started_at, 2)
+        if include_result:
+            data["result"] = self.result
+        return data
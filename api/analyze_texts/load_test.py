@@ -0,0 +1,88 @@
+# analyze_texts/load_test.py
+"""
+Prueba de carga de la recuperación (sin LLM) contra un servidor en marcha.
+Lanza peticiones a /query-batch con retrieval_only para cada nivel de
+concurrencia y reporta consultas/s y latencias p50/p95.
+
+    gunicorn -c gunicorn.conf.py app:app                 # desde api/
+    python -m analyze_texts.load_test --url http://127.0.0.1:8000 --concurrency 1,2,4,8
+
+Para ver cómo escala con los workers, repetir con WEB_CONCURRENCY=1,2,4.
+"""
+import argparse
+import json
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_QUESTIONS = [
+    "¿De qué trata el documento?",
+    "¿Cuáles son las conclusiones principales?",
+    "¿Qué fechas se mencionan?",
+    "¿Quiénes son los autores?",
+    "¿Qué cifras o importes aparecen?",
+]
+
+
+def _post(url, payload, namespace=None, timeout=60):
+    headers = {"Content-Type": "application/json"}
+    if namespace:
+        headers["X-Namespace"] = namespace
+    req = urllib.request.Request(
+        url, data=json.dumps(payload).encode("utf-8"), headers=headers, method="POST"
+    )
+    start = time.perf_counter()
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        resp.read()
+        ok = resp.status == 200
+    return ok, time.perf_counter() - start
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run(url, concurrency, n_requests, questions=DEFAULT_QUESTIONS, top_k=5, namespace=None):
+    endpoint = url.rstrip("/") + "/query-batch"
+
+    def one(i):
+        payload = {"questions": [questions[i % len(questions)]], "top_k": top_k, "retrieval_only": True}
+        try:
+            return _post(endpoint, payload, namespace=namespace)
+        except Exception as e:
+            print(f"⚠️ Petición {i} fallida: {e}")
+            return False, None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(n_requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [lat for ok, lat in results if ok]
+    return {
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "errors": n_requests - len(latencies),
+        "seconds": round(elapsed, 3),
+        "qps": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 1) if latencies else None,
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", default="1,2,4,8")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--namespace", default=None)
+    args = parser.parse_args()
+
+    # calentar el modelo y el índice antes de medir
+    run(args.url, 1, 3, top_k=args.top_k, namespace=args.namespace)
+    for c in [int(x) for x in args.concurrency.split(",")]:
+        print(json.dumps(run(args.url, c, args.requests, top_k=args.top_k, namespace=args.namespace)))
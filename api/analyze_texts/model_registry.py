@@ -0,0 +1,137 @@
+# analyze_texts/model_registry.py
+import os
+import threading
+import time
+
+DEFAULT_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Registro global del proceso: (model_name, device, backend) -> encoder
+_models = {}
+_load_stats = {}
+_query_encoders = {}
+_lock = threading.Lock()
+
+
+def default_backend():
+    """
+    EMBEDDING_BACKEND: "torch" (SentenceTransformer fp32, por defecto) u "onnx"
+    (int8, opcional). La velocidad y el acuerdo coseno del int8 frente al fp32
+    no están medidos todavía: antes de activarlo, `python -m analyze_texts.encoders benchmark`.
+    """
+    return os.environ.get("EMBEDDING_BACKEND", "torch")
+
+
+def rss_mb():
+    """Memoria residente actual del proceso en MB (psutil; None si no está instalado)."""
+    try:
+        import psutil
+        return psutil.Process(os.getpid()).memory_info().rss / (1024 * 1024)
+    except Exception:
+        return None
+
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso en MB: no baja al liberar memoria."""
+    try:
+        import resource
+        # ru_maxrss viene en KB en Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except Exception:
+        return None
+
+
+def memory_stats(prefix=""):
+    """{"rss_mb", "peak_rss_mb"} redondeados; rss_mb es None sin psutil."""
+    rss, peak = rss_mb(), peak_rss_mb()
+    return {
+        f"{prefix}rss_mb": round(rss, 1) if rss is not None else None,
+        f"{prefix}peak_rss_mb": round(peak, 1) if peak is not None else None,
+    }
+
+
+def get_model(model_name=DEFAULT_MODEL_NAME, device=None, backend=None):
+    """
+    Devuelve el encoder compartido para (model_name, device, backend).
+    El modelo se carga una sola vez por proceso.
+    """
+    backend = backend or default_backend()
+    key = (model_name, device, backend)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        model = _models.get(key)
+        if model is not None:
+            return model
+
+        rss_before = rss_mb()
+        start = time.perf_counter()
+        if backend == "onnx":
+            # int8 en ONNX Runtime, sin torch en el camino de inferencia
+            from analyze_texts.encoders import OnnxEncoder
+            model = OnnxEncoder(model_name)
+        elif backend == "torch":
+            # import diferido: sentence_transformers arrastra torch
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(model_name, device=device)
+        else:
+            raise ValueError(f"Backend de embeddings no soportado: {backend}")
+        load_seconds = time.perf_counter() - start
+        rss_after = rss_mb()
+
+        _models[key] = model
+        _load_stats[key] = {
+            "model_name": model_name,
+            "backend": backend,
+            "device": device or str(model.device),
+            "load_seconds": round(load_seconds, 3),
+            "rss_mb": round(rss_after, 1) if rss_after is not None else None,
+            "rss_delta_mb": (
+                round(rss_after - rss_before, 1)
+                if rss_before is not None and rss_after is not None else None
+            ),
+        }
+        print(f"🧠 Modelo {model_name} ({backend}) cargado en {load_seconds:.2f}s")
+        return model
+
+
+def get_query_encoder(model_name=DEFAULT_MODEL_NAME, device=None, backend=None):
+    """
+    Encoder de preguntas. Con QUERY_MICROBATCH=1 (opcional) es el mismo modelo
+    detrás de un MicroBatcher compartido: las consultas concurrentes se
+    codifican en un solo forward, a cambio de que cada pregunta espere hasta
+    QUERY_BATCH_WAIT_MS a sus vecinas (también cuando llega sola). La ganancia
+    solo aparece con carga concurrente y aún no está medida.
+    """
+    model = get_model(model_name, device=device, backend=backend)
+    if os.environ.get("QUERY_MICROBATCH", "0") != "1":
+        return model
+    key = (model_name, device, backend or default_backend())
+    with _lock:
+        batcher = _query_encoders.get(key)
+        if batcher is None:
+            from analyze_texts.encoders import MicroBatcher
+            batcher = _query_encoders[key] = MicroBatcher(model)
+    return batcher
+
+
+def model_stats():
+    """Tiempo de carga y memoria de cada modelo cargado en este proceso."""
+    return {
+        "loaded_models": len(_models),
+        **memory_stats("process_"),
+        "models": list(_load_stats.values()),
+        "query_microbatching": {
+            f"{name}:{backend}": batcher.stats()
+            for (name, _, backend), batcher in _query_encoders.items()
+        },
+    }
+
+
+def clear_models():
+    """Libera los modelos registrados (útil en pruebas)."""
+    with _lock:
+        _models.clear()
+        _load_stats.clear()
+        _query_encoders.clear()
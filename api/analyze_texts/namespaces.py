@@ -0,0 +1,197 @@
+# analyze_texts/namespaces.py
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from analyze_texts.controller import MultiAgentController
+from analyze_texts.extractor import Extractor
+
+DEFAULT_NAMESPACE = "default"
+
+# prefijos de las colecciones que crea el servidor: API keys y sesiones de Streamlit
+RESERVED_PREFIXES = ("key-", "st-")
+
+
+class InvalidNamespace(ValueError):
+    pass
+
+
+def _safe_name(raw):
+    name = re.sub(r"[^A-Za-z0-9_-]+", "-", str(raw)).strip("-")[:64]
+    return name or DEFAULT_NAMESPACE
+
+
+def namespace_name(raw=None, api_key=None):
+    """
+    Nombre de carpeta seguro para la colección que pide un cliente. Las API
+    keys se hashean para no escribirlas en disco; sin nada se usa la colección
+    por defecto. Un nombre con prefijo reservado se rechaza: permitiría leer
+    la colección de otra API key o sesión.
+    """
+    if api_key:
+        return "key-" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    if not raw:
+        return DEFAULT_NAMESPACE
+    name = _safe_name(raw)
+    if name.lower().startswith(RESERVED_PREFIXES):
+        raise InvalidNamespace(f"Nombre de colección reservado: {name}")
+    return name
+
+
+class NamespaceRegistry:
+    """
+    Colecciones aisladas (índice, chunk store y carpeta de subidas propios)
+    por sesión o API key. Las activas viven en un LRU en memoria con un techo
+    de memoria configurable; las inactivas se descargan (ya están en disco)
+    y se recargan bajo demanda. El modelo de embeddings y el extractor se
+    comparten entre todas.
+
+    Las colecciones de sesión (st-*) se borran del disco tras ttl_seconds sin
+    uso; la última vez que se usaron es el mtime de su carpeta, así lo ven
+    todos los workers.
+    """
+
+    # prefijos de las colecciones que caducan y cada cuánto se buscan
+    EXPIRING_PREFIXES = ("st-",)
+    CLEANUP_INTERVAL = 600
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, base_dir=None, max_memory_mb=None, max_active=None, default_dir=None,
+                 ttl_seconds=None):
+        if base_dir is None:
+            base_dir = os.environ.get("NAMESPACE_DIR", "namespaces")
+        if max_memory_mb is None:
+            max_memory_mb = float(os.environ.get("NAMESPACE_MAX_MEMORY_MB", 1024))
+        if max_active is None:
+            max_active = int(os.environ.get("NAMESPACE_MAX_ACTIVE", 16))
+        if ttl_seconds is None:
+            ttl_seconds = float(os.environ.get("NAMESPACE_TTL", 24 * 3600))
+        self.base_dir = base_dir
+        self.max_memory_bytes = max_memory_mb * 1024 * 1024
+        self.max_active = max(1, max_active)
+        # la colección por defecto conserva las rutas de siempre (faiss.index, temp/)
+        self.default_dir = default_dir
+        self.ttl_seconds = ttl_seconds
+
+        self.extractor = Extractor()
+        self._controllers = OrderedDict()  # nombre -> MultiAgentController (orden LRU)
+        self._touched = {}                 # nombre -> último os.utime de su carpeta
+        self._lock = threading.Lock()
+        self._last_cleanup = time.time()
+        self.evictions = 0
+        self.expired = 0
+
+    def _data_dir(self, name):
+        if name == DEFAULT_NAMESPACE:
+            return self.default_dir
+        return os.path.join(self.base_dir, name)
+
+    def get(self, name=DEFAULT_NAMESPACE):
+        """Controlador de la colección `name` (se crea si no existe)."""
+        name = _safe_name(name)
+        with self._lock:
+            now = time.time()
+            if now - self._last_cleanup > self.CLEANUP_INTERVAL:
+                self._expire(now)
+            data_dir = self._data_dir(name)
+            controller = self._controllers.get(name)
+            if controller is not None and data_dir and not controller.slim and not os.path.isdir(data_dir):
+                # otro worker la borró por caducada: se empieza de cero
+                controller.unload()
+                del self._controllers[name]
+                controller = None
+            if controller is None:
+                controller = MultiAgentController(data_dir=data_dir, extractor=self.extractor)
+                # modo ligero: sistema de archivos de solo lectura, no se crea nada
+                if not controller.slim:
+                    if data_dir:
+                        os.makedirs(data_dir, exist_ok=True)
+                    os.makedirs(controller.upload_dir, exist_ok=True)
+                self._controllers[name] = controller
+            self._controllers.move_to_end(name)
+            controller.last_used = now
+            if data_dir and not controller.slim and now - self._touched.get(name, 0) > self.TOUCH_INTERVAL:
+                os.utime(data_dir)
+                self._touched[name] = now
+            self._evict(keep=name)
+        return controller
+
+    def _expire(self, now):
+        """Borra las colecciones de sesión sin uso desde hace más de ttl_seconds."""
+        self._last_cleanup = now
+        if not os.path.isdir(self.base_dir):
+            return
+        for name in os.listdir(self.base_dir):
+            data_dir = os.path.join(self.base_dir, name)
+            if not name.startswith(self.EXPIRING_PREFIXES) or not os.path.isdir(data_dir):
+                continue
+            controller = self._controllers.get(name)
+            last_used = max(os.path.getmtime(data_dir), controller.last_used if controller else 0)
+            if now - last_used < self.ttl_seconds:
+                continue
+            if controller is not None:
+                if not controller.unload():
+                    continue
+                del self._controllers[name]
+            self._touched.pop(name, None)
+            shutil.rmtree(data_dir, ignore_errors=True)
+            self.expired += 1
+            print(f"🗑️ Colección {name} borrada tras {self.ttl_seconds:.0f}s sin uso")
+
+    def cleanup(self):
+        """Fuerza la búsqueda de colecciones caducadas."""
+        with self._lock:
+            self._expire(time.time())
+
+    def _evict(self, keep=None):
+        """Descarga las colecciones menos usadas hasta respetar los límites."""
+        def over_limit():
+            loaded = [c for c in self._controllers.values() if c.readiness()["embeddings_loaded"]]
+            used = sum(c.memory_bytes() for c in loaded)
+            return len(loaded) > self.max_active or used > self.max_memory_bytes
+
+        for name, controller in list(self._controllers.items()):
+            if not over_limit():
+                break
+            if name == keep or controller.busy or not controller.readiness()["embeddings_loaded"]:
+                continue
+            if controller.unload():
+                self.evictions += 1
+                print(f"📤 Colección {name} descargada de memoria")
+
+    def enforce_limits(self):
+        """Para llamar tras una ingesta: el índice pudo crecer por encima del techo."""
+        with self._lock:
+            self._evict()
+
+    def names(self):
+        """Colecciones conocidas: en memoria y guardadas en disco."""
+        names = set(self._controllers)
+        if os.path.isdir(self.base_dir):
+            names.update(
+                n for n in os.listdir(self.base_dir)
+                if os.path.isdir(os.path.join(self.base_dir, n))
+            )
+        return sorted(names)
+
+    def stats(self):
+        """Solo recuentos: los nombres identifican sesiones y API keys."""
+        with self._lock:
+            controllers = list(self._controllers.values())
+            loaded = [c for c in controllers if c.readiness()["embeddings_loaded"]]
+            memory = sum(c.memory_bytes() for c in loaded)
+            busy = sum(1 for c in controllers if c.busy)
+        return {
+            "max_memory_mb": round(self.max_memory_bytes / (1024 * 1024), 1),
+            "max_active": self.max_active,
+            "memory_mb": round(memory / (1024 * 1024), 2),
+            "in_memory": len(controllers),
+            "loaded": len(loaded),
+            "busy": busy,
+            "evictions": self.evictions,
+            "ttl_seconds": self.ttl_seconds,
+            "expired": self.expired,
+        }
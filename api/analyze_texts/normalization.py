@@ -0,0 +1,129 @@
+# analyze_texts/normalization.py
+"""
+Normalización de texto en una sola pasada, compartida por la ingesta y las
+preguntas (sustituye a los clean_text con regex de controller y agent_response):
+
+1. Unicode NFKC: ligaduras de PDF (ﬁ -> fi), espacios raros, anchos completos.
+2. split/join: cualquier espacio Unicode (saltos de línea, tabuladores, NBSP)
+   pasa a un solo " ".
+3. Solo si queda algún carácter no imprimible (str.isprintable, en C): una
+   pasada de str.translate con una tabla precalculada que quita controles,
+   caracteres de formato (guion blando, ancho cero), uso privado y no
+   asignados. Todo lo demás se conserva (à, ç, comillas tipográficas...).
+
+    python -m analyze_texts.normalization [archivo]   # micro-benchmark (temp/*.pdf por defecto)
+"""
+import re
+import time
+import unicodedata
+
+_DROP_CATEGORIES = ("Cc", "Cf", "Co", "Cs", "Cn")
+
+
+class _TranslateTable(dict):
+    """
+    Tabla de str.translate: precalculada para Latin-1 y la puntuación general,
+    el resto de code points se resuelve por categoría la primera vez que aparece.
+    """
+
+    def __missing__(self, codepoint):
+        char = chr(codepoint)
+        if char.isspace():
+            value = " "
+        elif unicodedata.category(char) in _DROP_CATEGORIES:
+            value = None
+        else:
+            value = codepoint
+        self[codepoint] = value
+        return value
+
+
+_TABLE = _TranslateTable()
+for _cp in list(range(0x100)) + list(range(0x2000, 0x2070)):
+    _TABLE[_cp]
+
+
+def normalize_text(text):
+    """Texto normalizado (NFKC, sin caracteres de control y con espacios simples)."""
+    if not text:
+        return ""
+    text = " ".join(unicodedata.normalize("NFKC", text).split())
+    if not text.isprintable():
+        # caso raro: str.translate carácter a carácter es más lento que split/join
+        text = " ".join(text.translate(_TABLE).split())
+    return text
+
+
+# ------------------------------------------------------------
+# Micro-benchmark frente al clean_text anterior
+# ------------------------------------------------------------
+def _legacy_clean_text(text):
+    # copia del clean_text que había en controller.py y agent_response.py
+    text = re.sub(r'[^\x20-\x7EáéíóúÁÉÍÓÚñÑüÜ.,;:()\-–\[\]{}¿?¡!\\n ]+', '', text)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*\n\s*', '. ', text)
+    return text.strip()
+
+
+def _load_pages(path):
+    if path.lower().endswith(".pdf"):
+        from analyze_texts.extractor import Extractor
+        extractor = Extractor(max_workers=1)
+        try:
+            return [text for _, text in extractor.iter_pages(path)]
+        finally:
+            extractor.shutdown()
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        return [f.read()]
+
+
+def benchmark(path, repeat=5, chunk_size=800, overlap=150):
+    """
+    Compara clean_text con normalize_text haciendo el mismo trabajo en los dos
+    caminos: cada página y una vez cada chunk. El PDF se lee con PyMuPDF
+    (Extractor); sin él, pasa un .txt.
+    """
+    from analyze_texts.chunker import Chunker
+
+    pages = _load_pages(path)
+    n_chars = sum(len(p) for p in pages)
+    # los cortes del chunker se calculan aparte: se mide solo la normalización
+    chunker = Chunker(chunk_size=chunk_size, overlap=overlap)
+    chunks = [text for text, _, _ in chunker.iter_chunks(enumerate(normalize_text(p) for p in pages))]
+
+    def run(clean):
+        for page in pages:
+            clean(page)
+        for text in chunks:
+            clean(text)
+
+    report = {"file": path, "pages": len(pages), "chars": n_chars, "chunks": len(chunks)}
+    for name, clean in (("legacy_clean_text", _legacy_clean_text), ("normalize_text", normalize_text)):
+        run(clean)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            run(clean)
+        seconds = (time.perf_counter() - start) / repeat
+        report[f"{name}_mb_per_s"] = round(n_chars / seconds / 1e6, 2)
+    report["speedup"] = round(report["normalize_text_mb_per_s"] / report["legacy_clean_text_mb_per_s"], 2)
+
+    # caracteres que el filtro anterior borraba (sin contar espacios)
+    legacy_kept = sum(len(_legacy_clean_text(p).replace(" ", "")) for p in pages)
+    new_kept = sum(len(normalize_text(p).replace(" ", "")) for p in pages)
+    report["chars_recovered"] = new_kept - legacy_kept
+    return report
+
+
+if __name__ == "__main__":
+    import glob
+    import json
+    import sys
+
+    if len(sys.argv) > 1:
+        target = sys.argv[1]
+    else:
+        pdfs = sorted(glob.glob("temp/*.pdf") + glob.glob("../temp/*.pdf"))
+        if not pdfs:
+            sys.exit("No hay PDF en temp/: pasa la ruta de un archivo")
+        target = pdfs[0]
+    print(json.dumps(benchmark(target), ensure_ascii=False))
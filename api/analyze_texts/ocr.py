@@ -0,0 +1,129 @@
+# analyze_texts/ocr.py
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+class OCREngine:
+    """
+    OCR con Tesseract: render a DPI configurable, conversión opcional a
+    escala de grises, llamadas concurrentes con un pool acotado y caché en
+    disco por hash de los píxeles + idioma + DPI.
+    """
+
+    def __init__(self, lang="spa+eng", dpi=200, grayscale=True, max_workers=2, cache_dir=None):
+        self.lang = lang
+        self.dpi = dpi
+        self.grayscale = grayscale
+        self.max_workers = max(1, max_workers)
+        if cache_dir is None:
+            cache_dir = os.environ.get("OCR_CACHE_DIR", "ocr_cache")
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+
+    def config(self):
+        """Parámetros para reconstruir el motor dentro de un worker."""
+        return {
+            "lang": self.lang,
+            "dpi": self.dpi,
+            "grayscale": self.grayscale,
+            "max_workers": self.max_workers,
+            "cache_dir": self.cache_dir,
+        }
+
+    # ------------------------------------------------------------
+    # Render y preparación de imágenes
+    # ------------------------------------------------------------
+    def render_page(self, page):
+        """Renderiza una página fitz a una imagen PIL con el DPI configurado."""
+        import fitz
+        from PIL import Image
+        colorspace = fitz.csGRAY if self.grayscale else fitz.csRGB
+        pix = page.get_pixmap(dpi=self.dpi, colorspace=colorspace, alpha=False)
+        mode = "L" if pix.n == 1 else "RGB"
+        return Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+
+    def prepare_image(self, img):
+        if self.grayscale and img.mode != "L":
+            return img.convert("L")
+        if not self.grayscale and img.mode not in ("L", "RGB"):
+            return img.convert("RGB")
+        return img
+
+    # ------------------------------------------------------------
+    # Caché en disco
+    # ------------------------------------------------------------
+    def cache_key(self, img):
+        h = hashlib.sha256()
+        h.update(f"{img.mode}:{img.size[0]}x{img.size[1]}:{self.lang}:{self.dpi}".encode())
+        h.update(img.tobytes())
+        return h.hexdigest()
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt")
+
+    def _cache_get(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._cache_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"⚠️ Error leyendo caché OCR {path}: {e}")
+            return None
+
+    def _cache_put(self, key, text):
+        if not self.cache_dir:
+            return
+        path = self._cache_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"⚠️ Error guardando caché OCR {path}: {e}")
+
+    # ------------------------------------------------------------
+    # OCR
+    # ------------------------------------------------------------
+    def ocr_image(self, img):
+        img = self.prepare_image(img)
+        key = self.cache_key(img)
+        cached = self._cache_get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        import pytesseract
+        self.misses += 1
+        text = pytesseract.image_to_string(img, lang=self.lang)
+        self._cache_put(key, text)
+        return text
+
+    def ocr_many(self, images):
+        """
+        OCR concurrente de una lista de imágenes; devuelve los textos en el
+        mismo orden. Una imagen que falla devuelve "".
+        """
+        def run(img):
+            try:
+                return self.ocr_image(img)
+            except Exception as e:
+                print(f"Error during OCR: {e}")
+                return ""
+
+        if len(images) <= 1 or self.max_workers == 1:
+            return [run(img) for img in images]
+
+        # pytesseract lanza un subproceso por llamada, así que basta con hilos
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(run, images))
+
+    def stats(self):
+        return {"ocr_cache_hits": self.hits, "ocr_cache_misses": self.misses}
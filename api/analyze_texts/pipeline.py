@@ -0,0 +1,192 @@
+# analyze_texts/pipeline.py
+import os
+import time
+from analyze_texts.dedup import NearDuplicateFilter, provenance
+
+
+class IngestionPipeline:
+    """
+    Ingesta en streaming con memoria acotada:
+    páginas -> normalización -> Chunker -> deduplicado -> lotes de embeddings -> índice.
+
+    Nunca se tiene el texto completo de un documento ni todos sus chunks en
+    memoria: el pico lo marca batch_size, no el tamaño del documento.
+    """
+
+    def __init__(self, extractor, chunker, emb_manager, normalize, batch_size=64, min_chunk_chars=20,
+                 dedup=None):
+        self.extractor = extractor
+        self.chunker = chunker
+        self.emb_manager = emb_manager
+        self.normalize = normalize
+        self.batch_size = batch_size
+        self.min_chunk_chars = min_chunk_chars
+        # DEDUP=0 desactiva el filtro de casi duplicados
+        if dedup is None:
+            dedup = os.environ.get("DEDUP", "1") == "1"
+        self.dedup = dedup
+
+    # ------------------------------------------------------------
+    # Etapas (generadores)
+    # ------------------------------------------------------------
+    def pages(self, file_path, stats):
+        # las etapas se intercalan: solo se cuenta el tiempo dentro del extractor
+        pages = self.extractor.iter_pages(file_path, stats=stats)
+        while True:
+            start = time.perf_counter()
+            page = next(pages, None)
+            stats["seconds"] += time.perf_counter() - start
+            if page is None:
+                return
+            yield page
+
+    def normalized(self, pages):
+        for page_num, text in pages:
+            text = self.normalize(text)
+            if text:
+                yield page_num, text
+
+    def chunks(self, source, pages):
+        # las páginas ya llegan normalizadas: los chunks solo se recortan
+        for text, char_offset, page in self.chunker.iter_chunks(pages):
+            text = text.strip()
+            if text and len(text) > self.min_chunk_chars:
+                yield {"text": text, "source": source, "page": page, "char_offset": char_offset}
+
+    def deduplicated(self, chunks, dup_filter):
+        """
+        Descarta los casi duplicados de chunks ya vistos en el mismo documento
+        (cabeceras y pies repetidos en cada página); su procedencia se guarda
+        en el chunk conservado. No se deduplica entre archivos: una v2 casi
+        igual a la v1 perdería sus chunks, que pasarían a depender de la v1.
+        """
+        for chunk in chunks:
+            original = dup_filter.check(chunk)
+            if original is None:
+                yield chunk
+                continue
+            location = provenance(chunk)
+            if isinstance(original, dict):
+                # el original sigue en el lote pendiente: se guarda con él
+                original.setdefault("duplicates", []).append(location)
+            else:
+                # el original ya está en el índice (chunk_id)
+                self.emb_manager.add_duplicates(original, [location])
+
+    def batches(self, chunks):
+        batch = []
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    # ------------------------------------------------------------
+    # Ejecución
+    # ------------------------------------------------------------
+    def run(self, file_paths, replace=False, progress=None):
+        """
+        Indexa los archivos lote a lote. replace=True borra antes la versión
+        anterior de cada archivo. `progress(evento)` se llama tras cada lote.
+        """
+        start = time.perf_counter()
+        stats = {"pages": 0, "seconds": 0.0, "ocr_cache_hits": 0, "ocr_cache_misses": 0}
+        embedding_seconds = 0.0
+        cache = {"hits": 0, "misses": 0}
+        dedup_totals = {"chunks_seen": 0, "duplicates_removed": 0}
+        dedup_threshold = None
+        processed_files = []
+        total_chunks = 0
+        batches = 0
+
+        for i, fp in enumerate(file_paths, 1):
+            source = os.path.basename(fp)
+            print(f"\n📄 Archivo {i}/{len(file_paths)}: {source}")
+            if replace:
+                self.emb_manager.remove_document(source, save=False)
+
+            file_chunks = 0
+            # un filtro por documento (ver deduplicated)
+            dup_filter = NearDuplicateFilter() if self.dedup else None
+            try:
+                pages = self.normalized(self.pages(fp, stats))
+                chunks = self.chunks(source, pages)
+                if dup_filter is not None:
+                    chunks = self.deduplicated(chunks, dup_filter)
+                for batch in self.batches(chunks):
+                    embed_start = time.perf_counter()
+                    ids = self.emb_manager.create_embeddings(batch, save=False)
+                    embedding_seconds += time.perf_counter() - embed_start
+                    if dup_filter is not None:
+                        for chunk, chunk_id in zip(batch, ids):
+                            dup_filter.embedded(chunk, chunk_id)
+                    cache["hits"] += self.emb_manager.last_cache_stats["hits"]
+                    cache["misses"] += self.emb_manager.last_cache_stats["misses"]
+                    file_chunks += len(batch)
+                    total_chunks += len(batch)
+                    batches += 1
+                    event = {
+                        "file": source,
+                        "file_index": i,
+                        "files_total": len(file_paths),
+                        "batch": batches,
+                        "pages_extracted": stats["pages"],
+                        "chunks_embedded": total_chunks,
+                    }
+                    print(f"  📦 Lote {batches}: {total_chunks} chunks, {stats['pages']} páginas")
+                    if progress:
+                        progress(event)
+            except Exception as e:
+                print(f"❌ Error procesando {fp}: {e}")
+                # no dejar un documento a medio indexar
+                self.emb_manager.remove_document(source, save=False)
+                continue
+            finally:
+                if dup_filter is not None:
+                    dedup_totals["chunks_seen"] += dup_filter.seen
+                    dedup_totals["duplicates_removed"] += dup_filter.removed
+                    dedup_threshold = dup_filter.threshold
+
+            if file_chunks:
+                print(f"  ✅ {file_chunks} chunks indexados")
+                processed_files.append(source)
+            else:
+                print(f"⚠️ Archivo vacío o muy corto: {fp}")
+
+        self.emb_manager.save_index()
+
+        dedup_stats = None
+        if self.dedup:
+            seen = dedup_totals["chunks_seen"]
+            dedup_stats = {
+                **dedup_totals,
+                "removed_fraction": round(dedup_totals["duplicates_removed"] / seen, 4) if seen else 0.0,
+                "threshold": dedup_threshold,
+            }
+        if dedup_stats and dedup_stats["duplicates_removed"]:
+            print(f"✂️ Casi duplicados descartados: {dedup_stats['duplicates_removed']} de "
+                  f"{dedup_stats['chunks_seen']} chunks ({dedup_stats['removed_fraction']:.1%})")
+
+        elapsed = time.perf_counter() - start
+        extraction_seconds = stats["seconds"]
+        return {
+            "files_processed": processed_files,
+            "total_chunks": total_chunks,
+            "batches": batches,
+            "seconds": round(elapsed, 3),
+            "embedding_seconds": round(embedding_seconds, 3),
+            "extraction": {
+                "files": len(file_paths),
+                "pages": stats["pages"],
+                "seconds": round(extraction_seconds, 3),
+                "pages_per_second": (round(stats["pages"] / extraction_seconds, 2)
+                                     if extraction_seconds > 0 else 0.0),
+                "workers": self.extractor.max_workers,
+                "ocr_cache_hits": stats["ocr_cache_hits"],
+                "ocr_cache_misses": stats["ocr_cache_misses"],
+            },
+            "embedding_cache": cache,
+            "dedup": dedup_stats,
+        }
@@ -0,0 +1,340 @@
+# analyze_texts/slim.py
+"""
+Modo ligero de solo consulta (SLIM_RUNTIME=1), pensado para Vercel:
+sin torch, sin sentence-transformers y sin FAISS, solo NumPy.
+
+- StaticEncoder: tabla estática token -> vector destilada de MiniLM
+  (vectores int8 por token de WordPiece + proyección lineal ajustada sobre
+  los chunks del corpus). Las preguntas se codifican con NumPy.
+- SlimRetriever: carga el chunk store y vectors.f32 ya construidos y busca
+  por producto interno exacto; misma interfaz que EmbeddingsManager para
+  ResponseAgent y el controlador.
+
+La ingesta sigue en el camino pesado, en local con las dependencias completas
+(el build de Vercel solo instala requirements-vercel.txt). `build` deja en
+slim_bundle/ el chunk store compactado y static_model.npz, que se suben al
+repositorio y se despliegan con la función (includeFiles en vercel.json).
+SLIM_RUNTIME=1 se activa en el proyecto de Vercel solo cuando el bundle ya
+está en el repositorio: sin él, la primera consulta falla al no encontrar
+static_model.npz. Desde api/:
+
+    python -m analyze_texts.slim build      # genera slim_bundle/ y mide
+    python -m analyze_texts.slim measure    # arranque en frío, tamaño y acuerdo
+"""
+import itertools
+import os
+import re
+import shutil
+import time
+import unicodedata
+import numpy as np
+from analyze_texts.chunk_store import ChunkStore, document_id
+from analyze_texts.vector_file import FullVectorFile
+
+EMBEDDING_DIM = 384
+# artefactos del despliegue ligero, generados con `build`
+SLIM_BUNDLE_DIR = os.environ.get("SLIM_BUNDLE_DIR", "slim_bundle")
+SLIM_STORE_PATH = os.path.join(SLIM_BUNDLE_DIR, "chunkstore")
+STATIC_MODEL_PATH = os.environ.get("STATIC_MODEL_PATH", os.path.join(SLIM_BUNDLE_DIR, "static_model.npz"))
+
+_versions = itertools.count(1)
+
+
+# ------------------------------------------------------------
+# Tokenizador WordPiece (BERT uncased) en Python puro
+# ------------------------------------------------------------
+def _strip_accents(text):
+    return "".join(c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn")
+
+
+_SPLIT = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def basic_tokenize(text):
+    """Minúsculas, sin acentos y separando la puntuación (como BertTokenizer uncased)."""
+    return _SPLIT.findall(_strip_accents(text.lower()))
+
+
+def wordpiece(word, vocab, max_chars=100):
+    """Segmentación greedy de prefijo más largo; None si no se puede segmentar."""
+    if len(word) > max_chars:
+        return None
+    pieces = []
+    start = 0
+    while start < len(word):
+        end = len(word)
+        piece = None
+        while start < end:
+            candidate = word[start:end] if start == 0 else "##" + word[start:end]
+            if candidate in vocab:
+                piece = candidate
+                break
+            end -= 1
+        if piece is None:
+            return None
+        pieces.append(piece)
+        start = end
+    return pieces
+
+
+class StaticEncoder:
+    """Codificador NumPy: media de vectores por token -> proyección -> L2."""
+
+    device = "cpu"
+
+    def __init__(self, path=STATIC_MODEL_PATH):
+        data = np.load(path, allow_pickle=False)
+        self.tokens = [str(t) for t in data["tokens"]]
+        self.vocab = {t: i for i, t in enumerate(self.tokens)}
+        # int8 con una escala por fila: ~4x menos que float32
+        self.codes = data["codes"]
+        self.scales = data["scales"].astype(np.float32)
+        self.projection = data["projection"].astype(np.float32)
+        self.path = path
+
+    def token_ids(self, text):
+        ids = []
+        for word in basic_tokenize(text):
+            pieces = wordpiece(word, self.vocab)
+            if pieces:
+                ids.extend(self.vocab[p] for p in pieces)
+        return ids
+
+    def _embed(self, text):
+        ids = self.token_ids(text)
+        if not ids:
+            # ancho de los vectores por token (build_static_model aún no tiene projection)
+            return np.zeros(self.codes.shape[1], dtype=np.float32)
+        rows = self.codes[ids].astype(np.float32) * (self.scales[ids, None] / 127.0)
+        return rows.mean(axis=0)
+
+    def encode(self, texts, batch_size=None, show_progress_bar=False, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+        raw = np.vstack([self._embed(t) for t in texts]) if texts else np.zeros((0, EMBEDDING_DIM), np.float32)
+        projected = raw @ self.projection
+        norms = np.clip(np.linalg.norm(projected, axis=1, keepdims=True), 1e-12, None)
+        return (projected / norms).astype(np.float32)
+
+
+def build_static_model(emb_manager, out_path=STATIC_MODEL_PATH, ridge=1.0, always_ids=2000):
+    """
+    Destila la tabla estática del modelo completo (paso de build, necesita torch):
+    vector de cada token del vocabulario que aparece en el corpus (más los
+    especiales y piezas de un carácter), y una proyección lineal ajustada por
+    mínimos cuadrados para que media(tokens) @ W aproxime el embedding real
+    de cada chunk.
+    """
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(emb_manager.model_name)
+    full_vocab = tokenizer.get_vocab()
+    chunk_ids = list(emb_manager.metadata)
+    texts = [emb_manager.metadata[i]["text"] for i in chunk_ids]
+
+    used = {t for t, i in full_vocab.items() if i < always_ids}
+    for text in texts:
+        used.update(tokenizer.tokenize(text))
+    tokens = sorted(used, key=lambda t: full_vocab[t])
+    print(f"🔤 Vocabulario estático: {len(tokens)} de {len(full_vocab)} tokens")
+
+    token_vectors = np.asarray(emb_manager.model.encode(
+        [t[2:] if t.startswith("##") else t for t in tokens], batch_size=256
+    ), dtype=np.float32)
+    scales = np.clip(np.abs(token_vectors).max(axis=1), 1e-12, None)
+    codes = np.round(token_vectors / scales[:, None] * 127).astype(np.int8)
+
+    # proyección: X (media de tokens) -> Y (embedding del modelo completo)
+    encoder = StaticEncoder.__new__(StaticEncoder)
+    encoder.tokens, encoder.vocab = tokens, {t: i for i, t in enumerate(tokens)}
+    encoder.codes, encoder.scales = codes, scales.astype(np.float32)
+    X = np.vstack([encoder._embed(t) for t in texts]) if texts else np.zeros((0, EMBEDDING_DIM))
+    Y = emb_manager.full_vectors.get(chunk_ids) if chunk_ids else np.zeros((0, EMBEDDING_DIM))
+    projection = np.linalg.solve(X.T @ X + ridge * np.eye(X.shape[1]), X.T @ Y) if len(X) else np.eye(EMBEDDING_DIM)
+
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    np.savez_compressed(out_path, tokens=np.array(tokens), codes=codes,
+                        scales=scales.astype(np.float16), projection=projection.astype(np.float16))
+    print(f"💾 Modelo estático guardado: {out_path} ({os.path.getsize(out_path) / 1024 / 1024:.2f} MB)")
+    return out_path
+
+
+def export_store(emb_manager, out_path=SLIM_STORE_PATH):
+    """Copia el chunk store (con vectors.f32) a out_path, compactado: sin los chunks borrados."""
+    if os.path.isdir(out_path):
+        shutil.rmtree(out_path)
+    shutil.copytree(emb_manager.metadata.path, out_path)
+    store = ChunkStore(out_path)
+    store.compact()
+    print(f"📦 Chunk store exportado: {out_path} ({len(store)} chunks)")
+    store.close()
+    return out_path
+
+
+# ------------------------------------------------------------
+# Recuperación sin FAISS
+# ------------------------------------------------------------
+class SlimRetriever:
+    """
+    Solo lectura: ChunkStore + vectors.f32 (memory-mapped) + StaticEncoder.
+    Búsqueda exacta por producto interno con NumPy; los ids borrados se ignoran.
+    No escribe nada en disco (el sistema de archivos de Vercel es de solo lectura).
+    """
+
+    def __init__(self, store_path=SLIM_STORE_PATH, static_model_path=STATIC_MODEL_PATH):
+        start = time.perf_counter()
+        self.model_name = "static"
+        self.metadata = ChunkStore(store_path, read_only=True)
+        self.full_vectors = FullVectorFile(os.path.join(store_path, "vectors.f32"), EMBEDDING_DIM,
+                                           read_only=True)
+        self.model = StaticEncoder(static_model_path)
+        self.query_encoder = self.model
+        self.version = next(_versions)
+
+        self._ids = np.array(list(self.metadata), dtype="int64")
+        self._ids = self._ids[self._ids < self.full_vectors.n_rows]
+        self.load_stats = {"index_load_ms": round((time.perf_counter() - start) * 1000, 1),
+                           "first_query_ms": None}
+
+    # interfaz de EmbeddingsManager usada por ResponseAgent / controlador
+    def vector_count(self):
+        return len(self._ids)
+
+    def index_info(self):
+        return {"configured": "slim", "loaded": True, "mmap": True,
+                "vectors": self.vector_count(), "index_type": "numpy-flat", **self.load_stats}
+
+    def memory_bytes(self):
+        return 0
+
+    def list_documents(self):
+        return [
+            {"doc_id": document_id(source), "source": source, "chunks": count}
+            for source, count in self.metadata.documents().items()
+        ]
+
+    def encode_query(self, question):
+        return self.model.encode([question])
+
+    def encode_queries(self, questions, batch_size=None):
+        return self.model.encode(questions)
+
+    def vectors(self, hits):
+        return self.full_vectors.get([h["id"] for h in hits])
+
+    def search_many(self, q_embs, top_k=3, sources=None, pages=None):
+        start = time.perf_counter()
+        ids = self._ids
+        if sources is not None or pages is not None:
+            ids = np.intersect1d(ids, self.metadata.live_ids(self.metadata.select(sources, pages)))
+        if len(ids) == 0 or len(q_embs) == 0:
+            return [[] for _ in range(len(q_embs))]
+        k = min(top_k, len(ids))
+        scores = np.asarray(q_embs, dtype=np.float32) @ self.full_vectors.get(ids).T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+        results = []
+        for row, cand in zip(scores, top):
+            order = cand[np.argsort(-row[cand])]
+            hits = []
+            for pos in order:
+                chunk = self.metadata.get(int(ids[pos]))
+                if chunk is not None:
+                    hits.append({**chunk, "id": int(ids[pos]), "score": round(float(row[pos]), 4)})
+            results.append(hits)
+        if self.load_stats["first_query_ms"] is None:
+            self.load_stats["first_query_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return results
+
+    def query(self, question, top_k=3, q_emb=None, sources=None, pages=None):
+        if q_emb is None:
+            q_emb = self.encode_query(question)
+        return [{k: v for k, v in h.items() if k not in ("id", "score")}
+                for h in self.search_many(q_emb, top_k, sources, pages)[0]]
+
+    def _read_only(self, *args, **kwargs):
+        raise RuntimeError("Modo ligero (SLIM_RUNTIME=1): la ingesta se hace en el build")
+
+    create_embeddings = add_document = replace_document = remove_document = _read_only
+    reset_index = save_index = _read_only
+
+
+# ------------------------------------------------------------
+# Mediciones: arranque en frío, tamaño del paquete y acuerdo con el modelo
+# ------------------------------------------------------------
+_COLD_START = """
+import json, sys, time
+sys.modules["torch"] = None  # falla si algo intenta importar torch
+start = time.perf_counter()
+from analyze_texts.slim import SlimRetriever
+r = SlimRetriever({store!r}, {model!r})
+r.query("prueba de arranque", top_k=3)
+print(json.dumps({{"seconds": time.perf_counter() - start,
+                   "heavy": [m for m in ("faiss", "sentence_transformers") if m in sys.modules]}}))
+"""
+
+
+def cold_start(store_path=SLIM_STORE_PATH, static_model_path=STATIC_MODEL_PATH):
+    import json
+    import subprocess
+    import sys
+    api_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run(
+        [sys.executable, "-c", _COLD_START.format(store=os.path.abspath(store_path),
+                                                  model=os.path.abspath(static_model_path))],
+        cwd=api_dir, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip())
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def package_size(store_path=SLIM_STORE_PATH, static_model_path=STATIC_MODEL_PATH):
+    data = sum(
+        os.path.getsize(os.path.join(store_path, f)) for f in os.listdir(store_path)
+    ) + os.path.getsize(static_model_path)
+    return round(data / (1024 * 1024), 2)
+
+
+def agreement(emb_manager, slim, questions, k=5):
+    """Solapamiento top-k (y coseno de la pregunta) entre el modelo completo y el estático."""
+    full_q = emb_manager.encode_queries(questions)
+    slim_q = slim.encode_queries(questions)
+    full_hits = emb_manager.search_many(full_q, top_k=k)
+    slim_hits = slim.search_many(slim_q, top_k=k)
+    overlap = [
+        len({h["id"] for h in f} & {h["id"] for h in s}) / max(1, len(f))
+        for f, s in zip(full_hits, slim_hits)
+    ]
+    top1 = [bool(f and s and f[0]["id"] == s[0]["id"]) for f, s in zip(full_hits, slim_hits)]
+    return {
+        "questions": len(questions),
+        f"overlap_at_{k}": round(float(np.mean(overlap)), 4) if overlap else None,
+        "top1_agreement": round(float(np.mean(top1)), 4) if top1 else None,
+        "query_cosine_mean": round(float((full_q * slim_q).sum(axis=1).mean()), 4) if len(questions) else None,
+    }
+
+
+def sample_questions(emb_manager, n=200, seed=0):
+    """Preguntas sintéticas: la primera frase de chunks al azar."""
+    ids = list(emb_manager.metadata)
+    rng = np.random.default_rng(seed)
+    chosen = rng.choice(ids, size=min(n, len(ids)), replace=False) if ids else []
+    return [re.split(r"(?<=[.!?])\s", emb_manager.metadata[int(i)]["text"])[0][:200] for i in chosen]
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+    from analyze_texts.controller import MultiAgentController
+
+    controller = MultiAgentController()
+    emb_manager = controller.emb_manager
+    if (sys.argv[1] if len(sys.argv) > 1 else "build") == "build":
+        export_store(emb_manager)
+        build_static_model(emb_manager)
+
+    slim = SlimRetriever()
+    print(json.dumps({"cold_start": cold_start()}))
+    print(json.dumps({"package_mb": package_size()}))
+    print(json.dumps({"agreement": agreement(emb_manager, slim, sample_questions(emb_manager))}))
@@ -0,0 +1,140 @@
+# analyze_texts/snapshots.py
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo se serializan los hilos del proceso
+    fcntl = None
+
+
+class SnapshotStore:
+    """
+    Versiones del índice + chunk store en carpetas separadas:
+
+        snapshots/<versión>/faiss.index
+        snapshots/<versión>/chunkstore/
+        snapshots/CURRENT   -> nombre de la versión publicada
+
+    Un reindexado completo se construye en una versión nueva mientras la
+    actual sigue sirviendo consultas; al terminar se publica reescribiendo
+    CURRENT con un rename atómico. Las versiones viejas se borran pasado el
+    periodo de retención (las consultas en curso pueden seguir usándolas).
+
+    Las escrituras (ingesta, borrado de documentos) se serializan entre
+    procesos con write_lock(): un flock sobre snapshots/WRITE.lock, así dos
+    workers de gunicorn no escriben a la vez en la misma colección.
+    """
+
+    POINTER = "CURRENT"
+    LOCK = "WRITE.lock"
+
+    def __init__(self, root="snapshots", retention_seconds=None):
+        if retention_seconds is None:
+            retention_seconds = float(os.environ.get("SNAPSHOT_RETENTION_SECONDS", 3600))
+        self.root = root
+        self.retention_seconds = retention_seconds
+        self._pointer_path = os.path.join(root, self.POINTER)
+        # versiones en construcción en este proceso (gc no las toca)
+        self._building = set()
+        self._thread_lock = threading.RLock()
+
+    @contextmanager
+    def write_lock(self):
+        """Exclusión mutua de las escrituras entre hilos y procesos."""
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self.root, exist_ok=True)
+            with open(os.path.join(self.root, self.LOCK), "a") as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def current(self):
+        """Ruta de la versión publicada o None si todavía no hay ninguna."""
+        try:
+            with open(self._pointer_path, "r", encoding="utf-8") as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return None
+        path = os.path.join(self.root, name)
+        return path if name and os.path.isdir(path) else None
+
+    def pointer_mtime(self):
+        try:
+            return os.path.getmtime(self._pointer_path)
+        except OSError:
+            return None
+
+    def create(self):
+        """Crea la carpeta de una versión nueva (sin publicarla)."""
+        name = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+        path = os.path.join(self.root, name)
+        os.makedirs(path)
+        self._building.add(name)
+        return path
+
+    def publish(self, path):
+        """Publica la versión de forma atómica (rename del puntero)."""
+        os.makedirs(self.root, exist_ok=True)
+        previous = self.current()
+        tmp = f"{self._pointer_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(os.path.basename(path))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._pointer_path)
+        self._building.discard(os.path.basename(path))
+        if previous and previous != path:
+            # la retención de la versión retirada cuenta desde ahora
+            os.utime(previous)
+        print(f"🔀 Snapshot publicado: {os.path.basename(path)}")
+
+    def discard(self, path):
+        self._building.discard(os.path.basename(path))
+        shutil.rmtree(path, ignore_errors=True)
+
+    def versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if os.path.isdir(os.path.join(self.root, name))
+        )
+
+    def gc(self):
+        """Borra las versiones no publicadas más antiguas que la retención."""
+        current = self.current()
+        current_name = os.path.basename(current) if current else None
+        now = time.time()
+        removed = []
+        for name in self.versions():
+            if name == current_name or name in self._building:
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                age = now - os.path.getmtime(path)
+            except OSError:
+                continue
+            if age > self.retention_seconds:
+                shutil.rmtree(path, ignore_errors=True)
+                removed.append(name)
+        if removed:
+            print(f"🧹 Snapshots antiguos eliminados: {len(removed)}")
+        return removed
+
+    def stats(self):
+        current = self.current()
+        return {
+            "current": os.path.basename(current) if current else None,
+            "versions": len(self.versions()),
+            "retention_seconds": self.retention_seconds,
+        }
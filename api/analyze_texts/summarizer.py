@@ -0,0 +1,284 @@
+# analyze_texts/summarizer.py
+"""
+Análisis map-reduce de todo el corpus con el LLM:
+
+- map:    los chunks se agrupan (por documento, hasta group_tokens) y cada
+          grupo se resume en paralelo, con concurrencia acotada.
+- reduce: los resúmenes parciales se vuelven a agrupar y resumir hasta que
+          caben en un prompt, y de ahí sale el análisis final.
+
+Cada llamada reintenta los rate limits / errores transitorios con backoff
+exponencial con jitter; los resúmenes de grupo se cachean por hash del
+contenido, así un reindexado incremental solo resume los grupos nuevos.
+
+    python tests/bench_summarizer.py   # stub local: speedup y fallos
+"""
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from analyze_texts.context_packer import TokenCounter
+
+PROMPT_VERSION = "1"
+
+MAP_PROMPT = """
+Resume el siguiente fragmento de un documento ({source}).
+Conserva datos concretos: nombres, fechas, cifras y conclusiones.
+
+Fragmento:
+{text}
+
+Resumen (máximo 150 palabras):
+"""
+
+REDUCE_PROMPT = """
+Combina estos resúmenes parciales en un único resumen, sin repetir información
+y conservando los datos concretos.
+
+Resúmenes:
+{text}
+
+Resumen combinado (máximo 250 palabras):
+"""
+
+FINAL_PROMPT = """
+Analiza el siguiente contenido extraído de varios documentos.
+
+Contenido:
+{text}
+
+Genera:
+1. Resumen general
+2. Temas principales
+3. Tipo de contenido
+4. Puntos relevantes
+"""
+
+RETRYABLE_STATUS = (408, 409, 429, 500, 502, 503, 504)
+
+
+def is_retryable(error):
+    """Rate limits, timeouts y errores 5xx (por status_code o tipo, sin importar groq)."""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError", "RateLimitError",
+                                    "InternalServerError", "TimeoutError", "ConnectionError")
+
+
+def _retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def with_retries(fn, max_retries=4, base_delay=0.5, max_delay=20.0, sleep=time.sleep):
+    """
+    Llama a fn() reintentando los errores transitorios: espera aleatoria en
+    [0, min(max_delay, base_delay * 2^intento)] ("full jitter"), o el
+    Retry-After del servidor si lo manda. Devuelve (resultado, reintentos).
+    """
+    attempt = 0
+    while True:
+        try:
+            return fn(), attempt
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            delay = _retry_after(e)
+            if delay is None:
+                delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            attempt += 1
+            print(f"⏳ Reintento {attempt}/{max_retries} en {delay:.2f}s ({type(e).__name__})")
+            sleep(delay)
+
+
+class SummaryCache:
+    """Caché persistente hash(grupo de chunks + modelo + prompt) -> resumen (SQLite)."""
+
+    def __init__(self, cache_dir=None):
+        if cache_dir is None:
+            cache_dir = os.environ.get("ANALYSIS_CACHE_DIR", "analysis_cache")
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "summaries.sqlite")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            " key TEXT PRIMARY KEY, summary TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, summary):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, summary, created_at) VALUES (?, ?, ?)",
+                (key, summary, time.time()),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class MapReduceSummarizer:
+    """
+    client: cliente con la interfaz chat.completions.create de Groq/OpenAI.
+    group_tokens: tokens de texto por llamada (map y reduce).
+    """
+
+    def __init__(self, client, model_name, group_tokens=None, max_concurrency=None,
+                 max_retries=None, cache=None, counter=None):
+        if group_tokens is None:
+            group_tokens = int(os.environ.get("ANALYSIS_GROUP_TOKENS", 3000))
+        if max_concurrency is None:
+            max_concurrency = int(os.environ.get("LLM_MAX_CONCURRENCY", 4))
+        if max_retries is None:
+            max_retries = int(os.environ.get("LLM_MAX_RETRIES", 4))
+        # los reintentos los hace with_retries: sin los del SDK no se multiplican
+        if hasattr(client, "with_options"):
+            client = client.with_options(max_retries=0)
+        self.client = client
+        self.model_name = model_name
+        self.group_tokens = group_tokens
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.cache = cache
+        self.counter = counter or TokenCounter()
+        self.last_stats = {}
+        self._stats_lock = threading.Lock()
+
+    # ------------------------------------------------------------
+    # Agrupado
+    # ------------------------------------------------------------
+    def groups(self, chunks, clean=None):
+        """
+        Agrupa chunks consecutivos del mismo documento hasta group_tokens.
+        Devuelve [(source, texto)]; un chunk más largo que el límite va solo.
+        """
+        groups = []
+        source, parts, tokens = None, [], 0
+        for chunk in chunks:
+            text = clean(chunk["text"]) if clean else chunk["text"]
+            if not text:
+                continue
+            n = self.counter.count(text)
+            if parts and (chunk["source"] != source or tokens + n > self.group_tokens):
+                groups.append((source, " ".join(parts)))
+                parts, tokens = [], 0
+            source = chunk["source"]
+            parts.append(text)
+            tokens += n
+        if parts:
+            groups.append((source, " ".join(parts)))
+        return groups
+
+    def _key(self, kind, text):
+        raw = f"{PROMPT_VERSION}\0{self.model_name}\0{kind}\0{text}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # ------------------------------------------------------------
+    # Llamadas al LLM
+    # ------------------------------------------------------------
+    def _complete(self, prompt, max_tokens):
+        def call():
+            completion = self.client.chat.completions.create(
+                model=self.model_name,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.3,
+                max_completion_tokens=max_tokens
+            )
+            return completion.choices[0].message.content
+
+        answer, retries = with_retries(call, self.max_retries)
+        with self._stats_lock:
+            self.last_stats["llm_calls"] += 1
+            self.last_stats["retries"] += retries
+        return answer
+
+    def _summarize(self, kind, prompt, text):
+        """Resumen de un grupo (map o reduce), desde la caché si ya se hizo."""
+        key = self._key(kind, text)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                with self._stats_lock:
+                    self.last_stats["cache_hits"] += 1
+                return cached
+        summary = self._complete(prompt, max_tokens=400)
+        if self.cache is not None and summary:
+            self.cache.put(key, summary)
+        return summary
+
+    def _parallel(self, kind, items):
+        """
+        Resume items [(prompt, texto)] en paralelo. Los grupos que fallan tras
+        los reintentos se omiten (quedan en last_stats); devuelve los resúmenes.
+        """
+        def run(item):
+            prompt, text = item
+            try:
+                return self._summarize(kind, prompt, text), None
+            except Exception as e:
+                return None, e
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(items))) as pool:
+            results = list(pool.map(run, items))
+
+        errors = [e for _, e in results if e is not None]
+        self.last_stats["failed_groups"] += len(errors)
+        if errors and len(errors) == len(items):
+            raise errors[0]
+        for e in errors[:3]:
+            print(f"⚠️ Grupo omitido en el {kind}: {e}")
+        return [summary for summary, _ in results if summary]
+
+    # ------------------------------------------------------------
+    # Map-reduce
+    # ------------------------------------------------------------
+    def summarize(self, chunks, clean=None):
+        """Análisis final de `chunks` (iterable de dicts con 'text' y 'source')."""
+        start = time.perf_counter()
+        self.last_stats = {"groups": 0, "llm_calls": 0, "retries": 0, "cache_hits": 0,
+                           "failed_groups": 0, "reduce_rounds": 0}
+        groups = self.groups(chunks, clean)
+        self.last_stats["groups"] = len(groups)
+        if not groups:
+            return None
+        print(f"🗺️ Map: {len(groups)} grupos, hasta {self.max_concurrency} llamadas en paralelo")
+
+        if len(groups) == 1:
+            # todo cabe en un prompt: directo al análisis final
+            summaries = [groups[0][1]]
+        else:
+            summaries = self._parallel("map", [
+                (MAP_PROMPT.format(source=source, text=text), text) for source, text in groups
+            ])
+
+        # reduce jerárquico hasta que los resúmenes caben en un solo prompt
+        while len(summaries) > 1 and self.counter.count("\n\n".join(summaries)) > self.group_tokens:
+            batches = self.groups([{"text": s, "source": ""} for s in summaries])
+            if len(batches) >= len(summaries):
+                # cada resumen llena un grupo: emparejarlos para que la ronda avance
+                batches = [("", " ".join(summaries[i:i + 2])) for i in range(0, len(summaries), 2)]
+            self.last_stats["reduce_rounds"] += 1
+            print(f"🧩 Reduce: {len(summaries)} resúmenes -> {len(batches)}")
+            summaries = self._parallel("reduce", [
+                (REDUCE_PROMPT.format(text=text), text) for _, text in batches
+            ])
+
+        analysis = self._complete(FINAL_PROMPT.format(text="\n\n".join(summaries)), max_tokens=1500)
+        self.last_stats["seconds"] = round(time.perf_counter() - start, 2)
+        print(f"✅ Análisis map-reduce: {self.last_stats}")
+        return analysis
@@ -0,0 +1,76 @@
+# analyze_texts/vector_file.py
+import os
+import numpy as np
+
+
+class FullVectorFile:
+    """
+    Vectores float32 completos en disco, una fila por chunk_id (memory-mapped).
+    Permiten guardar el índice con códigos comprimidos (sq8 / pq / ivfpq) y
+    re-rankear solo los mejores candidatos con el producto interno exacto:
+    en memoria quedan los códigos y del disco se leen unas pocas filas.
+    """
+
+    def __init__(self, path, dim, read_only=False):
+        self.path = path
+        self.dim = dim
+        self._row_bytes = dim * 4
+        self.read_only = read_only
+        if not read_only and not os.path.exists(path):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            open(path, "wb").close()
+        self._mm = None
+
+    @property
+    def n_rows(self):
+        if not os.path.exists(self.path):
+            return 0
+        return os.path.getsize(self.path) // self._row_bytes
+
+    def _map(self):
+        if self._mm is None and self.n_rows:
+            self._mm = np.memmap(self.path, dtype="<f4", mode="r", shape=(self.n_rows, self.dim))
+        return self._mm
+
+    def append(self, ids, vectors):
+        """Escribe vectors en las filas `ids` (crecientes y contiguos, como en el ChunkStore)."""
+        if self.read_only:
+            raise RuntimeError(f"FullVectorFile de solo lectura: {self.path}")
+        ids = np.asarray(ids, dtype="int64")
+        if len(ids) == 0:
+            return
+        vectors = np.ascontiguousarray(vectors, dtype="<f4")
+        first = int(ids[0])
+        if first < self.n_rows:
+            raise ValueError("Los ids de FullVectorFile deben ser crecientes")
+        with open(self.path, "ab") as f:
+            gap = first - self.n_rows
+            if gap:
+                # ids sin vector (p. ej. índices migrados): filas a cero
+                f.write(np.zeros((gap, self.dim), dtype="<f4").tobytes())
+            if np.array_equal(ids, np.arange(first, first + len(ids))):
+                f.write(vectors.tobytes())
+            else:
+                rows = np.zeros((int(ids[-1]) - first + 1, self.dim), dtype="<f4")
+                rows[ids - first] = vectors
+                f.write(rows.tobytes())
+        self._mm = None
+
+    def covers(self, ids):
+        return len(ids) == 0 or int(np.max(ids)) < self.n_rows
+
+    def get(self, ids):
+        mm = self._map()
+        return np.asarray(mm[np.asarray(ids, dtype="int64")], dtype="float32")
+
+    def clear(self):
+        if self.read_only:
+            raise RuntimeError(f"FullVectorFile de solo lectura: {self.path}")
+        self._mm = None
+        # archivo nuevo: el anterior puede estar enlazado desde otros snapshots
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        open(self.path, "wb").close()
+
+    def size_bytes(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
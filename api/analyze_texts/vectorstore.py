@@ -2,40 +2,67 @@ import faiss
 import numpy as np
 import pickle
 import os
+from analyze_texts import index_factory
 
 class VectorStore:
-    def __init__(self, dim=384, index_path="temp/faiss_index"):
+    def __init__(self, dim=384, index_path="temp/faiss_index", index_type="flat", rerank_factor=4):
         """
         :param dim: dimensión de los embeddings
         :param index_path: ruta para guardar el índice FAISS
+        :param index_type: flat / hnsw / sq8 (int8); pq / ivf / ivfpq se entrenan
+                           con el primer lote de add_embeddings
+        :param rerank_factor: con índices comprimidos, candidatos extra que se
+                              re-ordenan con los vectores completos (1 = sin re-rank)
         """
         self.dim = dim
         self.index_path = index_path
         self.metadata_path = f"{index_path}_meta.pkl"
+        self.vectors_path = f"{index_path}_vectors.npy"
+        self.index_type = index_type
+        self.rerank_factor = rerank_factor
+        # vectores completos, solo si el índice guarda códigos comprimidos
+        self.vectors = None
 
         # Si existe índice previo, cargar
         if os.path.exists(index_path):
             self.index = faiss.read_index(index_path)
             with open(self.metadata_path, "rb") as f:
                 self.metadata = pickle.load(f)
+            if os.path.exists(self.vectors_path):
+                self.vectors = np.load(self.vectors_path, mmap_mode="r")
+        elif index_type in ("pq", "ivf", "ivfpq"):
+            self.index = None
+            self.metadata = []
         else:
-            self.index = faiss.IndexFlatL2(dim)  # índice plano L2
+            # producto interno sobre vectores normalizados (similitud coseno)
+            self.index = index_factory.build_index(index_type, dim)
             self.metadata = []
 
+    @property
+    def compressed(self):
+        return self.index_type in index_factory.COMPRESSED_KINDS
+
     def add_embeddings(self, embeddings, metadatas):
         """
         Agrega embeddings y sus metadatos (ej. chunk de texto)
         :param embeddings: np.array de shape (n, dim)
         :param metadatas: lista de strings o dicts con info de cada embedding
         """
-        embeddings = np.array(embeddings).astype("float32")
-        self.index.add(embeddings)
+        embeddings = index_factory.normalize(embeddings)
+        if self.index is None:
+            self.index = index_factory.build_index(self.index_type, self.dim, train_vectors=embeddings)
+        ids = np.arange(len(self.metadata), len(self.metadata) + len(embeddings), dtype="int64")
+        self.index.add_with_ids(embeddings, ids)
         self.metadata.extend(metadatas)
+        if self.compressed:
+            self.vectors = embeddings if self.vectors is None else np.vstack([self.vectors, embeddings])
 
     def save(self):
         faiss.write_index(self.index, self.index_path)
         with open(self.metadata_path, "wb") as f:
             pickle.dump(self.metadata, f)
+        if self.vectors is not None:
+            np.save(self.vectors_path, np.asarray(self.vectors))
 
     def query(self, query_embedding, top_k=3):
         """
@@ -43,10 +70,18 @@ class VectorStore:
         :param query_embedding: vector np.array (1, dim)
         :return: lista de tuples (score, metadata)
         """
-        query_embedding = np.array(query_embedding).astype("float32").reshape(1, -1)
-        distances, indices = self.index.search(query_embedding, top_k)
+        query_embedding = index_factory.normalize(np.array(query_embedding).reshape(1, -1))
+        if self.index is None or self.index.ntotal == 0:
+            return []
+        if self.vectors is not None and self.rerank_factor > 1:
+            _, candidates = self.index.search(query_embedding, min(top_k * self.rerank_factor, self.index.ntotal))
+            distances, indices = index_factory.rerank(
+                query_embedding, candidates, lambda ids: np.asarray(self.vectors[ids]), top_k
+            )
+        else:
+            distances, indices = self.index.search(query_embedding, top_k)
         results = []
         for dist, idx in zip(distances[0], indices[0]):
-            if idx < len(self.metadata):
+            if 0 <= idx < len(self.metadata):
                 results.append((dist, self.metadata[idx]))
         return results
@@ -1,23 +1,130 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
+import json
 import os
+import shutil
+import tempfile
 
 # cargar .env
 load_dotenv()
 
-# crear temp si no existe
-os.makedirs("temp", exist_ok=True)
+# crear temp si no existe (en modo ligero el sistema de archivos es de solo lectura)
+if os.environ.get("SLIM_RUNTIME", "0") != "1":
+    os.makedirs("temp", exist_ok=True)
 
 # inicializar Flask
 app = Flask(__name__)
 CORS(app)
 
-from analyze_texts.controller import MultiAgentController
-from analyze_texts.agent_response import ResponseAgent
+from analyze_texts.namespaces import InvalidNamespace, NamespaceRegistry, namespace_name
+from analyze_texts.model_registry import memory_stats, model_stats
+from analyze_texts.concurrency import thread_stats
+from analyze_texts.jobs import JobManager
+from analyze_texts.agent_response import StreamStats
+
+# una colección (índice + subidas) por sesión o API key; la colección
+# "default" usa faiss.index y temp/ como siempre
+namespaces = NamespaceRegistry()
+controller = namespaces.get()
+
+# el modelo se carga en segundo plano; /health responde desde el arranque
+if os.environ.get("EMBEDDINGS_WARMUP", "1") == "1":
+    controller.warmup()
+
+
+def request_namespace():
+    """Colección de la petición (X-Namespace, ?namespace o X-API-Key)."""
+    return namespace_name(
+        request.headers.get("X-Namespace") or request.args.get("namespace"),
+        api_key=request.headers.get("X-API-Key")
+    )
+
+
+def current_controller():
+    return namespaces.get(request_namespace())
+
+
+@app.before_request
+def reject_reserved_namespace():
+    # key-* y st-* solo se asignan en el servidor (API keys y sesiones)
+    try:
+        request_namespace()
+    except InvalidNamespace as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+# modo ligero (SLIM_RUNTIME=1): solo consultas; la indexación se hace en el build
+INDEXING_ENDPOINTS = {"index_texts", "add_documents", "replace_document", "delete_document"}
+
+
+@app.before_request
+def reject_indexing_in_slim_mode():
+    if controller.slim and request.endpoint in INDEXING_ENDPOINTS:
+        return jsonify({
+            "status": "error",
+            "message": "Este despliegue es de solo consulta (SLIM_RUNTIME=1): indexa en el build"
+        }), 503
+
+
+# indexado en segundo plano: las subidas devuelven un job_id al instante
+jobs = JobManager()
+
+
+def index_job(job, controller, file_paths, upload_dir, reset, analyze):
+    try:
+        return run_indexing(job, controller, file_paths, reset, analyze)
+    finally:
+        # las subidas de este trabajo ya no hacen falta (el texto está en el índice)
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+
+def run_indexing(job, controller, file_paths, reset, analyze):
+    job.update(stage="indexing", files_total=len(file_paths), pages_extracted=0, chunks_embedded=0)
+
+    def progress(event):
+        job.update(
+            stage="indexing",
+            current_file=event["file"],
+            files_done=event["file_index"] - 1,
+            pages_extracted=event["pages_extracted"],
+            chunks_embedded=event["chunks_embedded"],
+            batches=event["batch"],
+        )
+
+    result = controller.process_files(file_paths, reset=reset, progress=progress, analyze=False)
+    job.update(files_done=len(file_paths))
+
+    # el análisis con el LLM es una etapa opcional, fuera del camino crítico
+    if analyze and result.get("status") == "success":
+        job.update(stage="analyzing")
+        result["analysis"] = controller.analyze()
+    job.update(stage="done")
+    namespaces.enforce_limits()
+    return result
+
+
+def start_indexing(controller, files, reset):
+    """
+    Por defecto encola el trabajo y responde 202 con el job_id.
+    ?wait=1 mantiene el comportamiento síncrono anterior (con análisis);
+    ?analyze=1 añade el análisis con el LLM al trabajo en segundo plano.
+    """
+    upload_dir, file_paths = save_uploads(controller, files)
+    if request.args.get("wait") == "1":
+        try:
+            return jsonify(controller.process_files(file_paths, reset=reset))
+        finally:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+
+    analyze = request.args.get("analyze") == "1"
+    job_id = jobs.submit("index", index_job, controller, file_paths, upload_dir, reset, analyze,
+                         namespace=request_namespace())
+    return jsonify({
+        "status": "accepted",
+        "job_id": job_id,
+        "status_url": f"/jobs/{job_id}"
+    }), 202
 
-# Modo A: reset automático cada vez que se indexan nuevos archivos
-controller = MultiAgentController()  # ❌ quitar auto_reset si da error
 
 @app.route("/index-texts", methods=["POST"])
 def index_texts():
@@ -26,30 +133,129 @@ def index_texts():
         if not files:
             return jsonify({"status": "error", "message": "No se enviaron archivos"}), 400
 
-        # 🔥 Reiniciar FAISS antes de procesar nuevos archivos
-        print("🧹 Reiniciando índice FAISS...")
-        controller.emb_manager.reset_index()
-        controller.response_agent = ResponseAgent(faiss_index_path="faiss.index")
-
-        # limpiar carpeta temp
-        for f in os.listdir("temp"):
-            fp = os.path.join("temp", f)
-            if os.path.isfile(fp):
-                os.remove(fp)
-
-        file_paths = []
-        for f in files:
-            dst = os.path.join("temp", f.filename)
-            f.save(dst)
-            file_paths.append(dst)
-
-        result = controller.process_files(file_paths)
-        # result es un dict con analysis y metadata
-        return jsonify(result)
+        # el índice se reinicia dentro del trabajo; las subidas de otros
+        # trabajos en cola siguen en sus propias carpetas
+        # result es un dict con analysis y metadata (o el job_id)
+        return start_indexing(current_controller(), files, reset=True)
     except Exception as e:
         print("❌ Error en /index-texts:", e)
         return jsonify({"status": "error", "message": str(e)}), 500
 
+
+@app.route("/jobs", methods=["GET"])
+def list_jobs():
+    # solo los trabajos de la colección de la petición
+    return jsonify({"status": "ok", "jobs": jobs.list(namespace=request_namespace())})
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    # un trabajo de otra colección responde igual que uno inexistente
+    job = jobs.get(job_id, namespace=request_namespace())
+    if job is None:
+        return jsonify({"status": "error", "message": f"Trabajo no encontrado: {job_id}"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route("/analyze", methods=["POST"])
+def analyze():
+    controller = current_controller()
+    if controller.slim:
+        # modo ligero: sistema de archivos de solo lectura, sin estado de trabajos en jobs/
+        return jsonify({"status": "success", "analysis": controller.analyze()})
+
+    def analyze_job(job):
+        job.update(stage="analyzing")
+        analysis = controller.analyze()
+        job.update(stage="done")
+        return {"status": "success", "analysis": analysis}
+
+    job_id = jobs.submit("analyze", analyze_job, namespace=request_namespace())
+    return jsonify({"status": "accepted", "job_id": job_id, "status_url": f"/jobs/{job_id}"}), 202
+
+
+def save_uploads(controller, files):
+    """
+    Guarda las subidas en una carpeta propia del trabajo dentro de upload_dir
+    y devuelve (carpeta, rutas). El trabajo la borra al terminar.
+    """
+    upload_dir = tempfile.mkdtemp(prefix="job-", dir=controller.upload_dir)
+    file_paths = []
+    for f in files:
+        dst = os.path.join(upload_dir, os.path.basename(f.filename))
+        f.save(dst)
+        file_paths.append(dst)
+    return upload_dir, file_paths
+
+
+# ------------------------------------------------------------
+# Indexado incremental por documento
+# ------------------------------------------------------------
+@app.route("/documents", methods=["GET"])
+def list_documents():
+    return jsonify({"status": "ok", "documents": current_controller().list_files()})
+
+
+@app.route("/documents", methods=["POST"])
+def add_documents():
+    try:
+        files = request.files.getlist("files")
+        if not files:
+            return jsonify({"status": "error", "message": "No se enviaron archivos"}), 400
+
+        return start_indexing(current_controller(), files, reset=False)
+    except Exception as e:
+        print("❌ Error en /documents:", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/documents/<path:source>", methods=["PUT"])
+def replace_document(source):
+    try:
+        f = request.files.get("file")
+        if not f:
+            return jsonify({"status": "error", "message": "No se envió archivo"}), 400
+
+        # el archivo se guarda con el nombre del documento que reemplaza
+        f.filename = os.path.basename(source)
+        return start_indexing(current_controller(), [f], reset=False)
+    except Exception as e:
+        print("❌ Error en /documents:", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/documents/<path:source>", methods=["DELETE"])
+def delete_document(source):
+    try:
+        controller = current_controller()
+        removed = controller.remove_file(source)
+        if not removed:
+            return jsonify({"status": "error", "message": f"Documento no encontrado: {source}"}), 404
+        return jsonify({"status": "ok", "removed_chunks": removed})
+    except Exception as e:
+        print("❌ Error en /documents:", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+def search_filter(data):
+    """
+    Filtro opcional de la búsqueda: "sources" (nombre o lista de documentos)
+    y "pages" (número o lista de páginas, empezando en 1 como en las citas
+    "pág. N" de las respuestas). None si no se indica.
+    """
+    sources = data.get("sources")
+    pages = data.get("pages")
+    if isinstance(sources, str):
+        sources = [sources]
+    if isinstance(pages, int):
+        pages = [pages]
+    if sources is not None:
+        sources = [os.path.basename(str(s)) for s in sources]
+    if pages is not None:
+        # el índice guarda las páginas desde 0
+        pages = [int(p) - 1 for p in pages]
+    return sources, pages
+
+
 @app.route("/query", methods=["POST"])
 def query():
     try:
@@ -58,19 +264,90 @@ def query():
         if not question:
             return jsonify({"status": "error", "message": "No se proporcionó pregunta"}), 400
 
-        answer = controller.answer_question(question)
+        # ?stream=1 o Accept: text/event-stream -> respuesta token a token (SSE)
+        wants_stream = (
+            request.args.get("stream") == "1"
+            or data.get("stream") is True
+            or "text/event-stream" in request.headers.get("Accept", "")
+        )
+        controller = current_controller()
+        sources, pages = search_filter(data)
+        if wants_stream:
+            return Response(
+                stream_with_context(sse_answer(controller, question, sources, pages)),
+                mimetype="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+
+        answer = controller.answer_question(question, sources=sources, pages=pages)
         return jsonify({"status": "ok", "answer": answer})
     except Exception as e:
         print("❌ Error en /query:", e)
         return jsonify({"status": "error", "message": str(e)}), 500
 
+
+@app.route("/query-batch", methods=["POST"])
+def query_batch():
+    try:
+        data = request.get_json() or {}
+        questions = data.get("questions") or []
+        if not isinstance(questions, list) or not questions:
+            return jsonify({"status": "error", "message": "No se proporcionaron preguntas"}), 400
+
+        sources, pages = search_filter(data)
+        results = current_controller().answer_questions(
+            [str(q) for q in questions],
+            top_k=int(data.get("top_k", 5)),
+            retrieval_only=bool(data.get("retrieval_only", False)),
+            sources=sources,
+            pages=pages
+        )
+        return jsonify({"status": "ok", "results": results})
+    except Exception as e:
+        print("❌ Error en /query-batch:", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+def sse_event(data, event=None):
+    payload = f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return f"event: {event}\n{payload}" if event else payload
+
+
+def sse_answer(controller, question, sources=None, pages=None):
+    try:
+        # las métricas llegan como último elemento del propio stream
+        stats = {}
+        for token in controller.answer_question_stream(question, sources=sources, pages=pages):
+            if isinstance(token, StreamStats):
+                stats = token
+                continue
+            yield sse_event({"token": token})
+        yield sse_event(stats, event="done")
+    except Exception as e:
+        print("❌ Error en /query (stream):", e)
+        yield sse_event({"message": str(e)}, event="error")
+
 @app.route("/health", methods=["GET"])
 def health():
+    controller = current_controller()
+    readiness = controller.readiness()
+    # no forzar la carga del modelo desde /health
+    emb_manager = controller.emb_manager if readiness["embeddings_loaded"] else None
     meta = {
-        "status": "ok",
-        "total_vectors": controller.emb_manager.index.ntotal if controller.emb_manager and controller.emb_manager.index else 0,
-        "total_chunks": len(controller.emb_manager.metadata) if controller.emb_manager and hasattr(controller.emb_manager, "metadata") else 0,
-        "groq_configured": bool(os.environ.get("GROQ_API_KEY"))
+        "status": "ok" if readiness["ready"] else "starting",
+        "readiness": readiness,
+        "total_vectors": emb_manager.vector_count() if emb_manager else 0,
+        "total_chunks": len(emb_manager.metadata) if emb_manager and hasattr(emb_manager, "metadata") else 0,
+        "index": emb_manager.index_info() if emb_manager else None,
+        "snapshots": controller.snapshots.stats(),
+        "worker": {"pid": os.getpid(), **memory_stats(), "threads": thread_stats()},
+        "groq_configured": bool(os.environ.get("GROQ_API_KEY")),
+        "embedding_models": model_stats(),
+        "answer_cache": (
+            controller.response_agent.answer_cache.stats()
+            if readiness["llm_client_ready"] and controller.response_agent.answer_cache else None
+        ),
+        "namespaces": namespaces.stats()
     }
     return jsonify(meta)
 
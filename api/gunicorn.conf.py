@@ -0,0 +1,14 @@
+# gunicorn.conf.py — gunicorn -c gunicorn.conf.py app:app
+import os
+
+# cada worker carga su propio modelo; los hilos comparten el índice (RWLock).
+# Entre workers: las escrituras se serializan con un flock por colección
+# (SnapshotStore.write_lock) y el estado de los trabajos vive en JOBS_DIR.
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+worker_class = "gthread"
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+
+# analyze_texts.concurrency reparte los núcleos entre los workers
+os.environ["WEB_CONCURRENCY"] = str(workers)
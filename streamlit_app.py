@@ -4,6 +4,7 @@ import sys
 import tempfile
 from pathlib import Path
 import time
+import uuid
 # Add this at the top of the file, right after the imports
 from dotenv import load_dotenv
 import os
@@ -26,8 +27,9 @@ for path in [current_dir, api_dir]:
         sys.path.insert(0, path)
 
 try:
-    from analyze_texts.controller import MultiAgentController
-    from analyze_texts.agent_response import ResponseAgent
+    from analyze_texts.namespaces import NamespaceRegistry
+    from analyze_texts.model_registry import model_stats
+    from analyze_texts.agent_response import StreamStats
 except ImportError as e:
     st.error(f"Error importing modules: {e}")
     st.error(f"Current sys.path: {sys.path}")
@@ -102,18 +104,24 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Inicializar el controlador
+# Registro de colecciones compartido; cada sesión tiene la suya
 @st.cache_resource
-def get_controller():
-    return MultiAgentController()
+def get_namespaces():
+    namespaces = NamespaceRegistry()
+    # el modelo se carga en segundo plano mientras se dibuja la interfaz
+    namespaces.get().warmup()
+    return namespaces
 
-controller = get_controller()
+namespaces = get_namespaces()
 
 # Inicializar el estado de la sesión para los mensajes
 if 'messages' not in st.session_state:
     st.session_state.messages = []
     st.session_state.documents_processed = False
     st.session_state.show_upload = True
+    st.session_state.namespace = f"st-{uuid.uuid4().hex[:12]}"
+
+controller = namespaces.get(st.session_state.namespace)
 
 # Sidebar para subir archivos
 with st.sidebar:
@@ -127,20 +135,22 @@ with st.sidebar:
                 accept_multiple_files=True,
                 label_visibility="collapsed"
             )
+            replace_all = st.checkbox("Reemplazar todos los documentos indexados", value=False)
             
             if st.form_submit_button("Procesar documentos", type="primary"):
                 if uploaded_files:
                     with st.spinner("Procesando documentos..."):
                         # Crear directorio temporal si no existe
-                        temp_dir = Path("temp")
+                        temp_dir = Path(controller.upload_dir)
                         temp_dir.mkdir(exist_ok=True)
                         
-                        # Limpiar archivos temporales anteriores
-                        for f in temp_dir.glob("*"):
-                            try:
-                                f.unlink()
-                            except Exception as e:
-                                st.error(f"Error al limpiar archivos temporales: {e}")
+                        # Limpiar archivos temporales anteriores solo si se reemplaza todo
+                        if replace_all:
+                            for f in temp_dir.glob("*"):
+                                try:
+                                    f.unlink()
+                                except Exception as e:
+                                    st.error(f"Error al limpiar archivos temporales: {e}")
                         
                         # Guardar archivos subidos
                         file_paths = []
@@ -152,18 +162,37 @@ with st.sidebar:
                         
                         # Procesar archivos
                         try:
-                            controller.emb_manager.reset_index()
-                            controller.response_agent = ResponseAgent(faiss_index_path="faiss.index")
-                            result = controller.process_files(file_paths)
+                            if replace_all:
+                                result = controller.process_files(file_paths)
+                            else:
+                                result = controller.add_files(file_paths)
                             st.session_state.documents_processed = True
                             st.session_state.show_upload = False
                             st.session_state.messages.append({"role": "assistant", "content": "¡Documentos procesados exitosamente! ¿En qué puedo ayudarte?"})
+                            namespaces.enforce_limits()
                             st.rerun()
                         except Exception as e:
                             st.error(f"Error al procesar documentos: {str(e)}")
                 else:
                     st.warning("Por favor, sube al menos un archivo para procesar.")
 
+    # Documentos indexados (borrado individual); no bloquear mientras carga el modelo
+    model_ready = controller.readiness()["embeddings_loaded"] or model_stats()["loaded_models"] > 0
+    indexed_docs = controller.list_files() if model_ready else []
+    for doc in indexed_docs:
+        col_name, col_del = st.columns([5, 1])
+        col_name.markdown(f"📄 {doc['source']} ({doc['chunks']} chunks)")
+        if col_del.button("🗑️", key=f"del-{doc['doc_id']}"):
+            controller.remove_file(doc["source"])
+            st.rerun()
+
+    # Limitar las preguntas a algunos documentos (vacío = todos)
+    selected_sources = st.multiselect(
+        "Buscar solo en:",
+        [doc["source"] for doc in indexed_docs],
+        placeholder="Todos los documentos"
+    ) if indexed_docs else []
+
 # Contenedor principal de la aplicación
 st.markdown("""
     <div style='text-align: center; margin-bottom: 2rem;'>
@@ -172,23 +201,19 @@ st.markdown("""
     </div>
 """, unsafe_allow_html=True)
 
+def message_html(role, content):
+    avatar = "👤" if role == "user" else "🤖"
+    return f"""
+        <div class='chat-message {role}'>
+            <div class='message-avatar'>{avatar}</div>
+            <div class='message-content'>{content}</div>
+        </div>
+    """
+
 # Mostrar mensajes del chat
 for message in st.session_state.messages:
     with st.container():
-        if message["role"] == "user":
-            st.markdown(f"""
-                <div class='chat-message user'>
-                    <div class='message-avatar'>👤</div>
-                    <div class='message-content'>{message["content"]}</div>
-                </div>
-            """, unsafe_allow_html=True)
-        else:
-            st.markdown(f"""
-                <div class='chat-message assistant'>
-                    <div class='message-avatar'>🤖</div>
-                    <div class='message-content'>{message["content"]}</div>
-                </div>
-            """, unsafe_allow_html=True)
+        st.markdown(message_html(message["role"], message["content"]), unsafe_allow_html=True)
 
 # Formulario para enviar preguntas
 with st.form("question-form", clear_on_submit=True):
@@ -207,10 +232,19 @@ if submit_btn and question.strip():
     # Agregar pregunta al historial
     st.session_state.messages.append({"role": "user", "content": question})
     
-    # Obtener respuesta
+    st.markdown(message_html("user", question), unsafe_allow_html=True)
+
+    # Obtener respuesta, mostrándola a medida que llegan los tokens
     with st.spinner("Pensando..."):
         try:
-            answer = controller.answer_question(question)
+            placeholder = st.empty()
+            answer = ""
+            for token in controller.answer_question_stream(question, sources=selected_sources or None):
+                if isinstance(token, StreamStats):
+                    continue
+                answer += token
+                placeholder.markdown(message_html("assistant", answer + " ▌"), unsafe_allow_html=True)
+            placeholder.markdown(message_html("assistant", answer), unsafe_allow_html=True)
             st.session_state.messages.append({"role": "assistant", "content": answer})
             st.rerun()
         except Exception as e:
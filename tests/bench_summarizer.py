@@ -0,0 +1,56 @@
+# tests/bench_summarizer.py
+"""
+Benchmark del análisis map-reduce con el stub local de chat.completions
+(sin red): speedup por concurrencia y comportamiento con rate limits.
+
+    python tests/bench_summarizer.py
+"""
+import json
+import random
+import time
+
+import conftest  # noqa: F401  (api/ en sys.path)
+from analyze_texts.summarizer import MapReduceSummarizer
+from stubs import StubCompletions, StubRateLimit, client_for
+
+
+def benchmark(n_chunks=200, latency=0.2, concurrency=(1, 4, 8), failure_rate=0.2):
+    words = "contrato factura cliente proveedor fecha importe pago informe riesgo".split()
+    rng = random.Random(0)
+    chunks = [
+        {"text": " ".join(rng.choice(words) for _ in range(140)), "source": f"doc{i // 20}.pdf"}
+        for i in range(n_chunks)
+    ]
+
+    report = []
+    baseline = None
+    for workers in concurrency:
+        stub = StubCompletions(latency)
+        summarizer = MapReduceSummarizer(client_for(stub), "stub", max_concurrency=workers)
+        start = time.perf_counter()
+        summarizer.summarize(chunks)
+        seconds = time.perf_counter() - start
+        baseline = baseline or seconds
+        report.append({"max_concurrency": workers, "seconds": round(seconds, 2),
+                       "speedup": round(baseline / seconds, 2), **summarizer.last_stats})
+
+    # rate limits simulados: se reintentan con backoff y el análisis termina igual
+    stub = StubCompletions(latency, failure_rate=failure_rate, seed=1)
+    summarizer = MapReduceSummarizer(client_for(stub), "stub", max_concurrency=max(concurrency), max_retries=6)
+    summarizer.summarize(chunks)
+    report.append({"failure_rate": failure_rate, **summarizer.last_stats})
+
+    # sin reintentos algunos grupos fallan: se omiten y el análisis sigue
+    stub = StubCompletions(latency, failure_rate=failure_rate, seed=3)
+    summarizer = MapReduceSummarizer(client_for(stub), "stub", max_concurrency=max(concurrency), max_retries=0)
+    try:
+        summarizer.summarize(chunks)
+        report.append({"failure_rate": failure_rate, "max_retries": 0, **summarizer.last_stats})
+    except StubRateLimit as e:
+        report.append({"failure_rate": failure_rate, "max_retries": 0, "error": str(e)})
+    return report
+
+
+if __name__ == "__main__":
+    for row in benchmark():
+        print(json.dumps(row))
@@ -0,0 +1,8 @@
+# tests/conftest.py
+import os
+import sys
+
+# El paquete vive en api/ (igual que al arrancar la app desde allí)
+API_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api")
+if API_DIR not in sys.path:
+    sys.path.insert(0, API_DIR)
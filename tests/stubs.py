@@ -0,0 +1,54 @@
+# tests/stubs.py
+"""Dobles de chat.completions para los tests y el benchmark (sin red)."""
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+
+class StubRateLimit(Exception):
+    status_code = 429
+
+
+class StubCompletions:
+    """
+    Imita chat.completions.create: latencia fija y una fracción de 429.
+    Con stream=True la latencia es la del primer token y el resto llega cada
+    token_latency segundos.
+    """
+
+    def __init__(self, latency=0.2, failure_rate=0.0, seed=0, token_latency=0.0,
+                 stream_text="respuesta generada por el stub en streaming"):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.token_latency = token_latency
+        self.stream_text = stream_text
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def create(self, model, messages, **kwargs):
+        with self._lock:
+            self.calls += 1
+            fail = self._rng.random() < self.failure_rate
+        if kwargs.get("stream"):
+            if fail:
+                raise StubRateLimit("429 Too Many Requests (stub)")
+            return self._stream()
+        time.sleep(self.latency)
+        if fail:
+            raise StubRateLimit("429 Too Many Requests (stub)")
+        content = f"resumen de {len(messages[0]['content'])} caracteres"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    def _stream(self):
+        time.sleep(self.latency)
+        for i, word in enumerate(self.stream_text.split()):
+            if i:
+                time.sleep(self.token_latency)
+            delta = SimpleNamespace(content=word if not i else " " + word)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+def client_for(completions):
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
@@ -0,0 +1,83 @@
+# tests/test_chunk_store.py
+import os
+
+import numpy as np
+import pytest
+
+from analyze_texts.chunk_store import ChunkStore, link_store
+from analyze_texts.vector_file import FullVectorFile
+
+
+def _chunk(i):
+    return {"text": f"chunk {i}", "source": "a.txt", "doc_id": "a", "page": 0, "char_offset": i}
+
+
+def test_read_only_store_creates_nothing(tmp_path):
+    path = str(tmp_path / "chunkstore")
+    store = ChunkStore(path, read_only=True)
+    vectors = FullVectorFile(os.path.join(path, "vectors.f32"), 4, read_only=True)
+
+    assert len(store) == 0 and vectors.n_rows == 0
+    assert not os.path.exists(path)
+    with pytest.raises(RuntimeError):
+        store.append([0], [_chunk(0)])
+    with pytest.raises(RuntimeError):
+        vectors.append([0], np.zeros((1, 4)))
+
+
+def test_read_only_store_reads_existing(tmp_path):
+    path = str(tmp_path / "chunkstore")
+    store = ChunkStore(path)
+    store.append([0, 1], [_chunk(0), _chunk(1)])
+    store.close()
+
+    store = ChunkStore(path, read_only=True)
+    assert store[1]["text"] == "chunk 1"
+    with pytest.raises(RuntimeError):
+        store.delete([0])
+
+
+def test_compact_keeps_vectors(tmp_path):
+    path = str(tmp_path / "chunkstore")
+    store = ChunkStore(path)
+    vectors = FullVectorFile(os.path.join(path, "vectors.f32"), 4)
+    store.append([0, 1, 2], [_chunk(i) for i in range(3)])
+    vectors.append([0, 1, 2], np.eye(3, 4))
+    store.delete([1])
+    store.compact()
+
+    assert list(store) == [0, 2]
+    np.testing.assert_array_equal(vectors.get([2]), np.eye(3, 4)[[2]])
+
+
+def test_linked_store_shares_files_and_keeps_old_view(tmp_path):
+    old_path, new_path = str(tmp_path / "old"), str(tmp_path / "new")
+    old = ChunkStore(old_path)
+    old.append([0, 1], [_chunk(0), _chunk(1)])
+    old.seal()
+
+    link_store(old_path, new_path)
+    assert os.path.samefile(os.path.join(old_path, "records.bin"), os.path.join(new_path, "records.bin"))
+    new = ChunkStore(new_path)
+    new.append([2], [_chunk(2)])
+    new.delete([0])
+    new.seal()
+
+    assert list(new) == [1, 2]
+    # los appends llegan al mismo inode, pero el snapshot anterior no los ve
+    assert list(ChunkStore(old_path, read_only=True)) == [0, 1]
+
+
+def test_link_store_copies_files_grown_past_the_seal(tmp_path):
+    old_path = str(tmp_path / "old")
+    old = ChunkStore(old_path)
+    old.append([0], [_chunk(0)])
+    old.seal()
+    # escritura descartada sobre los archivos compartidos
+    link_store(old_path, str(tmp_path / "discarded"))
+    ChunkStore(str(tmp_path / "discarded")).append([1], [_chunk(1)])
+
+    link_store(old_path, str(tmp_path / "new"))
+    new = ChunkStore(str(tmp_path / "new"))
+    new.append([1], [_chunk(1)])
+    assert list(new) == [0, 1] and new[1]["text"] == "chunk 1"
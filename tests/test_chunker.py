@@ -0,0 +1,33 @@
+# tests/test_chunker.py
+import random
+
+import pytest
+
+from analyze_texts.chunker import Chunker
+from analyze_texts.extractor import Extractor
+from analyze_texts.normalization import normalize_text
+
+
+@pytest.mark.parametrize("chunk_size,overlap", [(800, 150), (50, 10), (10, 0)])
+def test_iter_chunks_matches_chunk_text(chunk_size, overlap):
+    rng = random.Random(0)
+    chunker = Chunker(chunk_size=chunk_size, overlap=overlap)
+    for _ in range(30):
+        segments = [(page, "".join(rng.choice("ab c") for _ in range(rng.randint(0, 300))))
+                    for page in range(rng.randint(0, 20))]
+        chunks = [text for text, _, _ in chunker.iter_chunks(segments)]
+        assert chunks == chunker.chunk_text(" ".join(text for _, text in segments if text))
+
+
+def test_txt_blocks_normalize_like_whole_file(tmp_path):
+    rng = random.Random(1)
+    text = "".join(f"palabra{rng.randint(0, 500)}" + rng.choice([" ", "\n", "  \t"]) for _ in range(5000))
+    path = tmp_path / "doc.txt"
+    path.write_text(text, encoding="utf-8")
+
+    extractor = Extractor(max_workers=1)
+    blocks = list(extractor.iter_txt(str(path), block_chars=1000))
+    assert len(blocks) > 1
+    assert "".join(blocks) == text
+    normalized = [normalize_text(b) for b in blocks]
+    assert " ".join(b for b in normalized if b) == normalize_text(text)
@@ -0,0 +1,44 @@
+# tests/test_context_packer.py
+from concurrent.futures import ThreadPoolExecutor
+
+from analyze_texts.context_packer import ContextPacker
+
+
+def hit(text, source="a.pdf", char_offset=0, score=1.0, page=0):
+    return {"text": text, "source": source, "char_offset": char_offset, "score": score, "page": page}
+
+
+def test_overlapping_chunks_are_merged():
+    packer = ContextPacker(token_budget=500)
+    first = "El contrato se firmó en marzo. El pago es mensual."
+    second = "El pago es mensual. La garantía dura dos años."
+    context, stats = packer.pack([hit(first), hit(second, char_offset=first.index("El pago"), score=0.9)])
+
+    assert stats["merged"] == 1
+    assert context.count("El pago es mensual.") == 1
+
+
+def test_context_stays_within_budget():
+    packer = ContextPacker(token_budget=40)
+    hits = [hit(f"Frase número {i} sobre el contrato. " * 5, source=f"{i}.pdf", score=1 - i / 10)
+            for i in range(6)]
+    _, stats = packer.pack(hits)
+    assert stats["context_tokens"] <= 40
+    assert stats["blocks"] >= 1
+
+
+def test_concurrent_packs_return_their_own_stats():
+    packer = ContextPacker(token_budget=1000)
+
+    def pack(n):
+        hits = [hit(f"documento {n} bloque {i}.", source=f"{n}-{i}.pdf") for i in range(n)]
+        return n, packer.pack(hits)[1]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        for n, stats in pool.map(pack, range(1, 30)):
+            assert stats["candidates"] == n
+
+
+def test_citations_show_pages_from_one():
+    context, _ = ContextPacker(token_budget=500).pack([hit("Primera página del informe.", page=0)])
+    assert context.startswith("[a.pdf, pág. 1]")
@@ -0,0 +1,92 @@
+# tests/test_dedup.py
+from analyze_texts.chunker import Chunker
+from analyze_texts.dedup import NearDuplicateFilter
+from analyze_texts.pipeline import IngestionPipeline
+
+FOOTER = "Documento confidencial de uso interno, prohibida su copia o difusión sin autorización expresa."
+
+
+class PagesExtractor:
+    max_workers = 1
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    def iter_pages(self, file_path, stats=None):
+        for page, text in enumerate(self.documents[file_path]):
+            stats["pages"] += 1
+            yield page, text
+
+
+class RecordingIndex:
+    """Lo mínimo de EmbeddingsManager que usa la ingesta."""
+
+    def __init__(self):
+        self.chunks = []
+        self.duplicates = {}
+        self.last_cache_stats = {"hits": 0, "misses": 0}
+
+    def create_embeddings(self, batch, save=True):
+        ids = list(range(len(self.chunks), len(self.chunks) + len(batch)))
+        self.chunks.extend(batch)
+        return ids
+
+    def add_duplicates(self, chunk_id, locations):
+        self.duplicates.setdefault(chunk_id, []).extend(locations)
+
+    def remove_document(self, source, save=True):
+        return 0
+
+    def save_index(self):
+        pass
+
+
+def run(documents):
+    index = RecordingIndex()
+    pipeline = IngestionPipeline(PagesExtractor(documents), Chunker(chunk_size=len(FOOTER) + 1, overlap=0),
+                                 index, normalize=str.strip, dedup=True)
+    return pipeline.run(list(documents)), index
+
+
+def test_near_duplicate_filter():
+    dup_filter = NearDuplicateFilter()
+    original = {"text": FOOTER, "source": "a.pdf"}
+    assert dup_filter.check(original) is None
+    assert dup_filter.check({"text": FOOTER.replace("copia", "copia,"), "source": "a.pdf"}) is original
+    assert dup_filter.check({"text": "Un texto completamente distinto sobre facturas.", "source": "a.pdf"}) is None
+
+
+def test_repeated_footer_is_deduplicated_within_a_document():
+    stats, index = run({"informe.pdf": [FOOTER] * 4})
+    assert stats["dedup"]["duplicates_removed"] == 3
+    assert len(index.chunks) == 1
+    assert [d["page"] for d in index.chunks[0]["duplicates"]] == [1, 2, 3]
+
+
+def test_new_version_of_a_document_keeps_its_chunks():
+    pages = [FOOTER, "Cláusula primera: el proveedor entrega el servicio cada mes en la sede del cliente."]
+    stats, index = run({"contrato_v1.pdf": pages, "contrato_v2.pdf": pages})
+    assert stats["dedup"]["duplicates_removed"] == 0
+    assert {c["source"] for c in index.chunks} == {"contrato_v1.pdf", "contrato_v2.pdf"}
+
+
+def test_filter_keeps_only_the_id_of_embedded_chunks():
+    dup_filter = NearDuplicateFilter()
+    original = {"text": FOOTER, "source": "a.pdf"}
+    assert dup_filter.check(original) is None
+    dup_filter.embedded(original, 42)
+
+    assert dup_filter.check({"text": FOOTER, "source": "a.pdf"}) == 42
+    assert dup_filter.check({"text": FOOTER.replace("copia", "copia,"), "source": "a.pdf"}) == 42
+    assert not any(isinstance(kept, dict) for _, kept in dup_filter._kept)
+
+
+def test_duplicates_of_an_embedded_chunk_go_to_the_index():
+    # lotes de un chunk: el original ya tiene id cuando llegan sus duplicados
+    index = RecordingIndex()
+    pipeline = IngestionPipeline(PagesExtractor({"informe.pdf": [FOOTER] * 3}),
+                                 Chunker(chunk_size=len(FOOTER) + 1, overlap=0),
+                                 index, normalize=str.strip, batch_size=1, dedup=True)
+    pipeline.run(["informe.pdf"])
+    assert len(index.chunks) == 1
+    assert [d["page"] for d in index.duplicates[0]] == [1, 2]
@@ -0,0 +1,17 @@
+# tests/test_import_budget.py
+import importlib.util
+
+import pytest
+
+from conftest import API_DIR
+from analyze_texts import import_budget
+
+
+@pytest.mark.parametrize("module", import_budget.DEFAULT_MODULES)
+def test_cold_import_within_budget(module):
+    if module == "app" and importlib.util.find_spec("flask") is None:
+        pytest.skip("Flask no está instalado")
+    ok, report = import_budget.check([module], cwd=API_DIR)
+    row = report[0]
+    assert not row["heavy_imported"], f"{module} importa al arrancar: {row['heavy_imported']}"
+    assert ok, f"{module} tarda {row['seconds']}s (presupuesto {row['budget']}s)"
@@ -0,0 +1,20 @@
+# tests/test_index_factory.py
+import numpy as np
+
+from analyze_texts import index_factory
+
+
+def test_sq8_is_not_trained_on_a_single_ingestion_batch():
+    assert index_factory.min_train_vectors("sq8", 64) == index_factory.SQ8_MIN_TRAIN_VECTORS
+    assert index_factory.SQ8_MIN_TRAIN_VECTORS > 64
+    assert index_factory.min_train_vectors("flat", 64) == 0
+
+
+def test_sq8_trained_on_enough_vectors_keeps_neighbours():
+    rng = np.random.default_rng(0)
+    vectors = index_factory.normalize(rng.standard_normal((index_factory.SQ8_MIN_TRAIN_VECTORS, 32)))
+    ids = np.arange(len(vectors), dtype="int64")
+    index = index_factory.build_index("sq8", 32, train_vectors=vectors)
+    index.add_with_ids(vectors, ids)
+    _, found = index.search(vectors[:20], 1)
+    assert (found[:, 0] == ids[:20]).mean() >= 0.9
@@ -0,0 +1,64 @@
+# tests/test_jobs.py
+import threading
+
+from analyze_texts.jobs import Job, JobManager
+
+
+def test_job_status_is_visible_from_another_manager(tmp_path):
+    # dos JobManager sobre la misma carpeta = dos workers de gunicorn
+    started, release = threading.Event(), threading.Event()
+
+    def work(job, value):
+        job.update(stage="indexing", chunks_embedded=3)
+        started.set()
+        release.wait(10)
+        return {"value": value}
+
+    owner = JobManager(jobs_dir=str(tmp_path))
+    other = JobManager(jobs_dir=str(tmp_path))
+    job_id = owner.submit("index", work, 7)
+    try:
+        assert started.wait(10)
+        running = other.get(job_id).to_dict()
+        assert running["status"] == "running"
+        assert running["progress"]["chunks_embedded"] == 3
+    finally:
+        release.set()
+        owner.shutdown()
+
+    done = other.get(job_id).to_dict()
+    assert done["status"] == "done"
+    assert done["result"] == {"value": 7}
+    assert [j["job_id"] for j in other.list()] == [job_id]
+
+
+def test_unknown_or_malformed_ids(tmp_path):
+    jobs = JobManager(jobs_dir=str(tmp_path))
+    assert jobs.get("0" * 32) is None
+    assert jobs.get("../../etc/passwd") is None
+    jobs.shutdown()
+
+
+def test_job_of_dead_worker_is_reported_as_error(tmp_path):
+    job = Job("index")
+    job.path = str(tmp_path / f"{job.id}.json")
+    job.status = "running"
+    job.pid = 2 ** 22 + 12345  # pid que no existe
+    job.save()
+
+    loaded = Job.load(job.path)
+    assert loaded.status == "error"
+
+
+def test_jobs_are_scoped_to_their_namespace(tmp_path):
+    jobs = JobManager(jobs_dir=str(tmp_path))
+    job_id = jobs.submit("analyze", lambda job: {"analysis": "privado"}, namespace="st-a")
+    jobs.shutdown()
+
+    other = JobManager(jobs_dir=str(tmp_path))
+    assert other.get(job_id, namespace="st-a").to_dict()["result"] == {"analysis": "privado"}
+    assert other.get(job_id, namespace="st-b") is None
+    assert other.get(job_id) is None
+    assert [j["job_id"] for j in other.list(namespace="st-a")] == [job_id]
+    assert other.list(namespace="st-b") == []
+    other.shutdown()
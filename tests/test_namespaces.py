@@ -0,0 +1,39 @@
+# tests/test_namespaces.py
+import os
+import time
+
+import pytest
+
+from analyze_texts.namespaces import InvalidNamespace, NamespaceRegistry, namespace_name
+
+
+@pytest.mark.parametrize("raw", ["st-1234", "key-abcdef", "KEY-abcdef", "--st-x"])
+def test_client_cannot_pick_reserved_namespaces(raw):
+    with pytest.raises(InvalidNamespace):
+        namespace_name(raw)
+
+
+def test_namespace_names():
+    assert namespace_name(None) == "default"
+    assert namespace_name("equipo legal") == "equipo-legal"
+    assert namespace_name("st-x", api_key="secreta").startswith("key-")
+
+
+def test_idle_session_namespaces_expire(tmp_path):
+    registry = NamespaceRegistry(base_dir=str(tmp_path), ttl_seconds=60)
+    old = registry.get("st-old")
+    registry.get("st-new")
+    registry.get("equipo")
+    past = time.time() - 120
+    for name in ("st-old", "equipo"):
+        os.utime(tmp_path / name, (past, past))
+    old.last_used = past
+
+    registry.cleanup()
+
+    assert sorted(os.listdir(tmp_path)) == ["equipo", "st-new"]
+    stats = registry.stats()
+    assert stats["expired"] == 1
+    assert stats["in_memory"] == 2
+    # /health solo expone recuentos
+    assert "namespaces" not in stats
@@ -0,0 +1,118 @@
+# tests/test_query_stream.py
+from types import SimpleNamespace
+
+import numpy as np
+
+from analyze_texts.agent_response import ResponseAgent, StreamStats
+from stubs import StubCompletions
+
+
+class FakeEmbeddings:
+    """Recuperación mínima con la interfaz de EmbeddingsManager que usa ResponseAgent."""
+    version = 1
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def encode_query(self, question):
+        vector = np.ones((1, 8), dtype="float32")
+        return vector / np.linalg.norm(vector)
+
+    def search_many(self, q_embs, top_k=5, sources=None, pages=None):
+        hits = [{**c, "id": i, "score": 1.0 - i / 100} for i, c in enumerate(self.chunks)]
+        return [hits[:top_k]]
+
+    def vectors(self, results):
+        return np.eye(len(results), 8, dtype="float32")
+
+
+def make_agent(stub, chunks=None):
+    chunks = chunks if chunks is not None else [
+        {"text": "El contrato vence en marzo.", "source": "a.pdf", "page": 0, "char_offset": 0},
+        {"text": "La factura se paga a 30 días.", "source": "b.pdf", "page": 2, "char_offset": 0},
+    ]
+    client = SimpleNamespace(chat=SimpleNamespace(completions=stub))
+    return ResponseAgent(emb_manager=FakeEmbeddings(chunks), client=client)
+
+
+def consume(stream):
+    items = list(stream)
+    assert isinstance(items[-1], StreamStats)
+    assert not any(isinstance(item, StreamStats) for item in items[:-1])
+    return "".join(items[:-1]), items[-1]
+
+
+def test_stream_measures_ttft_before_total():
+    stub = StubCompletions(latency=0.05, token_latency=0.02)
+    answer, stats = consume(make_agent(stub).query_stream("¿Cuándo vence el contrato?"))
+
+    assert answer == stub.stream_text
+    assert stats["cached"] is False
+    assert stats["chunks"] == len(stub.stream_text.split())
+    assert stats["ttft_ms"] >= 50
+    # el resto de tokens llega después del primero
+    assert stats["total_ms"] - stats["ttft_ms"] >= 0.02 * 1000 * (stats["chunks"] - 1) * 0.8
+    assert stats["context_tokens"] > 0
+
+
+def test_second_stream_is_served_from_cache():
+    stub = StubCompletions(latency=0.01)
+    agent = make_agent(stub)
+    first, _ = consume(agent.query_stream("¿Cuándo vence el contrato?"))
+    second, stats = consume(agent.query_stream("¿Cuándo vence el contrato?"))
+
+    assert second == first
+    assert stats["cached"] is True
+    assert stub.calls == 1
+
+
+def test_llm_error_falls_back_to_context():
+    stub = StubCompletions(latency=0.0, failure_rate=1.0)
+    answer, stats = consume(make_agent(stub).query_stream("¿Cuándo vence el contrato?"))
+
+    assert "El contrato vence en marzo." in answer
+    assert stats["ttft_ms"] is None
+    assert "429" in stats["error"]
+    # una respuesta fallida no se cachea
+    _, again = consume(make_agent(stub).query_stream("¿Cuándo vence el contrato?"))
+    assert again["cached"] is False
+
+
+def test_interleaved_streams_keep_their_own_stats():
+    stub = StubCompletions(latency=0.0)
+    agent = make_agent(stub)
+    first_stream = agent.query_stream("¿Cuándo vence el contrato?")
+    first_token = next(first_stream)
+    # otra respuesta completa del mismo agente mientras la primera sigue abierta
+    _, second_stats = consume(agent.query_stream("¿Y la factura?"))
+    rest, first_stats = consume(first_stream)
+
+    assert first_token + rest == stub.stream_text
+    assert first_stats is not second_stats
+    assert first_stats["chunks"] == second_stats["chunks"] == len(stub.stream_text.split())
+
+
+def test_no_results_still_reports_stats():
+    answer, stats = consume(make_agent(StubCompletions(), chunks=[]).query_stream("nada"))
+    assert answer.startswith("No encontré")
+    assert stats["chunks"] == 0
+
+
+def test_answer_is_cached_under_the_version_it_was_retrieved_from():
+    stub = StubCompletions(latency=0.0)
+    agent = make_agent(stub)
+    embeddings = agent.emb_manager
+    create = stub.create
+
+    def reindex_during_completion(*args, **kwargs):
+        # un swap de snapshot mientras el LLM responde
+        embeddings.version += 1
+        return create(*args, **kwargs)
+
+    stub.create = reindex_during_completion
+    agent.query("¿Cuándo vence el contrato?")
+    stub.create = create
+    agent.query("¿Cuándo vence el contrato?")
+
+    # la primera respuesta salió del índice anterior: no se sirve como fresca
+    assert stub.calls == 2
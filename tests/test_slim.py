@@ -0,0 +1,15 @@
+# tests/test_slim.py
+import numpy as np
+
+from analyze_texts.slim import EMBEDDING_DIM, StaticEncoder
+
+
+def test_text_without_known_tokens_before_projection_exists():
+    # así lo arma build_static_model antes de ajustar la proyección
+    encoder = StaticEncoder.__new__(StaticEncoder)
+    encoder.tokens, encoder.vocab = ["hola"], {"hola": 0}
+    encoder.codes = np.ones((1, EMBEDDING_DIM), dtype=np.int8)
+    encoder.scales = np.ones(1, dtype=np.float32)
+
+    assert not encoder._embed("zzzz qqqq").any()
+    assert encoder._embed("hola").shape == (EMBEDDING_DIM,)
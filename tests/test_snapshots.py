@@ -0,0 +1,37 @@
+# tests/test_snapshots.py
+import multiprocessing
+import time
+
+from analyze_texts.snapshots import SnapshotStore
+
+
+def _hold_lock(root, ready, seconds):
+    with SnapshotStore(root).write_lock():
+        ready.set()
+        time.sleep(seconds)
+
+
+def test_write_lock_excludes_other_processes(tmp_path):
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Event()
+    holder = ctx.Process(target=_hold_lock, args=(str(tmp_path), ready, 0.5))
+    holder.start()
+    try:
+        assert ready.wait(30)
+        start = time.perf_counter()
+        with SnapshotStore(str(tmp_path)).write_lock():
+            waited = time.perf_counter() - start
+    finally:
+        holder.join()
+    assert waited > 0.2
+
+
+def test_publish_moves_current(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    assert store.current() is None
+    first = store.create()
+    store.publish(first)
+    second = store.create()
+    store.publish(second)
+    assert store.current() == second
+    assert store.stats()["versions"] == 2
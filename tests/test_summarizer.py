@@ -0,0 +1,130 @@
+# tests/test_summarizer.py
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from analyze_texts.summarizer import MapReduceSummarizer, SummaryCache, with_retries
+from stubs import StubCompletions, StubRateLimit, client_for
+
+
+def corpus(n_docs, words=60):
+    # un chunk por documento: cada uno es un grupo del map
+    return [{"text": f"doc{i} " + " ".join(["contrato"] * words), "source": f"doc{i}.pdf"}
+            for i in range(n_docs)]
+
+
+class FailingSource(StubCompletions):
+    """Stub que falla siempre (sin reintento posible) para un documento."""
+
+    def __init__(self, source, **kwargs):
+        super().__init__(**kwargs)
+        self.source = source
+
+    def create(self, model, messages, **kwargs):
+        if f"({self.source})" in messages[0]["content"]:
+            raise ValueError(f"fallo en {self.source}")
+        return super().create(model, messages, **kwargs)
+
+
+def test_map_runs_in_parallel():
+    latency = 0.1
+    stub = StubCompletions(latency=latency)
+    summarizer = MapReduceSummarizer(client_for(stub), "stub", max_concurrency=8)
+
+    start = time.perf_counter()
+    assert summarizer.summarize(corpus(8))
+    elapsed = time.perf_counter() - start
+
+    serial = stub.calls * latency
+    assert summarizer.last_stats["groups"] == 8
+    assert stub.calls == 9  # 8 grupos + análisis final
+    assert elapsed < serial / 2
+
+
+def test_with_retries_retries_transient_errors():
+    calls, sleeps = [], []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise StubRateLimit("429")
+        return "ok"
+
+    result, retries = with_retries(flaky, max_retries=4, sleep=sleeps.append)
+    assert (result, retries) == ("ok", 2)
+    assert len(sleeps) == 2
+    assert all(0 <= s <= 0.5 * 2 ** i for i, s in enumerate(sleeps))
+
+
+def test_with_retries_gives_up():
+    calls, sleeps = [], []
+
+    def always_limited():
+        calls.append(1)
+        raise StubRateLimit("429")
+
+    with pytest.raises(StubRateLimit):
+        with_retries(always_limited, max_retries=3, sleep=sleeps.append)
+    assert len(calls) == 4
+    assert len(sleeps) == 3
+
+
+def test_with_retries_does_not_retry_other_errors():
+    calls = []
+
+    def broken():
+        calls.append(1)
+        raise ValueError("prompt inválido")
+
+    with pytest.raises(ValueError):
+        with_retries(broken, sleep=lambda s: pytest.fail("no debería esperar"))
+    assert len(calls) == 1
+
+
+def test_with_retries_honours_retry_after():
+    error = StubRateLimit("429")
+    error.response = SimpleNamespace(headers={"retry-after": "1.5"})
+    sleeps = []
+
+    def once():
+        if not sleeps:
+            raise error
+        return "ok"
+
+    assert with_retries(once, sleep=sleeps.append) == ("ok", 1)
+    assert sleeps == [1.5]
+
+
+def test_failed_map_group_is_skipped():
+    stub = FailingSource("doc2.pdf", latency=0.0)
+    summarizer = MapReduceSummarizer(client_for(stub), "stub", max_concurrency=4, max_retries=0)
+
+    assert summarizer.summarize(corpus(4))
+    assert summarizer.last_stats["failed_groups"] == 1
+
+
+def test_all_map_groups_failing_raises():
+    stub = StubCompletions(latency=0.0, failure_rate=1.0)
+    summarizer = MapReduceSummarizer(client_for(stub), "stub", max_concurrency=4, max_retries=0)
+
+    with pytest.raises(StubRateLimit):
+        summarizer.summarize(corpus(4))
+    assert summarizer.last_stats["failed_groups"] == 4
+
+
+def test_summary_cache_hits_on_second_run(tmp_path):
+    cache = SummaryCache(cache_dir=str(tmp_path))
+    try:
+        stub = StubCompletions(latency=0.0)
+        summarizer = MapReduceSummarizer(client_for(stub), "stub", max_concurrency=4, cache=cache)
+        summarizer.summarize(corpus(5))
+        assert summarizer.last_stats["cache_hits"] == 0
+        assert summarizer.last_stats["llm_calls"] == 6
+
+        summarizer.summarize(corpus(5))
+        assert summarizer.last_stats["cache_hits"] == 5
+        # solo el análisis final vuelve al LLM
+        assert summarizer.last_stats["llm_calls"] == 1
+    finally:
+        cache.close()